@@ -33,12 +33,48 @@ __author__ = 'fatih'
 __date__ = '21/06/14'
 __version__ = ''
 
+import os
+import sys
+
 from app import Statistics
-import tests
 
 if __name__ == "__main__":
+    # Unit tests are only run on request, importing them loads every engine
+    if "--test" in sys.argv[1:]:
+        import tests
+        tests.run()
+        sys.exit(0)
     statistics = Statistics()
-    tests.run()
     print "Process started..."
-    if statistics.run():
+    if "--watch" in sys.argv[1:]:
+        def progress(result):
+            if result["ok"]:
+                print "%s written in %.3fs after %s changed." % (
+                    statistics.target_file, result["seconds"],
+                    ", ".join(os.path.basename(name) for name in result["changed"]))
+            else:
+                print "Update skipped: %s" % result["error"]
+        print "Watching %s and %s." % (statistics.host_file, statistics.instance_file)
+        statistics.watch(progress=progress)
+    elif "--serve" in sys.argv[1:]:
+        statistics.serve()
+    elif "--diff" in sys.argv[1:]:
+        # Previous hosts and instances files follow --diff
+        position = sys.argv.index("--diff")
+        print "\n".join(statistics.diff(*sys.argv[position + 1:position + 3]))
+    elif "--batch" in sys.argv[1:]:
+        def progress(finished, total, result):
+            print "[%d/%d] %s: %s in %.3fs" % (
+                finished, total, result["name"], "written" if result["ok"] else "failed, %s" % result["error"],
+                result["seconds"])
+        results = statistics.batch(progress=progress) or []
+        print "%d of %d regions have been written successfully." % (
+            sum(result["ok"] for result in results), len(results))
+    elif "--history" in sys.argv[1:]:
+        # Data center id, -1 for the whole fleet, and number of days follow --history
+        position = sys.argv.index("--history")
+        print "\n".join(statistics.history(int(sys.argv[position + 1]), float(sys.argv[position + 2])))
+    elif "--rebalance" in sys.argv[1:]:
+        print "\n".join(statistics.rebalance() or [])
+    elif statistics.run():
         print "Statistics.txt has been created successfully."
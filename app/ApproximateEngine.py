@@ -0,0 +1,292 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import math
+import heapq
+
+from app.Fractions import is_larger
+from app.ColumnParser import ColumnParser, WINDOW_SIZE
+from app.VectorEngine import numpy
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class SpaceSaving(object):
+    """
+    SpaceSaving keeps at most capacity counters of the heaviest keys of a weighted stream. A key which, does not have
+    a counter takes the counter of the smallest one and inherits its count as its error, so a count exceeds the
+    true count by at most total weight / capacity.
+    """
+
+    def __init__(self, capacity):
+        """
+        Constructor of SpaceSaving class
+        @param capacity maximum number of counters
+        @return instance
+        """
+        super(SpaceSaving, self).__init__()
+        self.capacity = capacity
+
+        # key => [count, error], heap of (count, key) entries which, are skipped when their count is outdated
+        self.counters = {}
+        self.heap = []
+
+    def add(self, key, weight=1):
+        """
+        Add weight of a key
+        @param key
+        @param weight
+        @return void
+        """
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) < self.capacity:
+                counter = self.counters[key] = [0, 0]
+            else:
+                # Find the smallest counter, outdated heap entries are dropped on the way
+                while True:
+                    count, smallest = heapq.heappop(self.heap)
+                    if smallest in self.counters and self.counters[smallest][0] == count:
+                        break
+                del self.counters[smallest]
+                counter = self.counters[key] = [count, count]
+        counter[0] += weight
+        heapq.heappush(self.heap, (counter[0], key))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(count, key) for key, (count, error) in self.counters.iteritems()]
+            heapq.heapify(self.heap)
+
+    def items(self):
+        """
+        Counted keys
+        @return list of (key, count, error) tuples
+        """
+        return [(key, count, error) for key, (count, error) in self.counters.iteritems()]
+
+
+class ApproximateEngine(object):
+    """
+    ApproximateEngine finds HostClustering and DatacentreClustering candidates in a single pass over instances file
+    with memory which, does not depend on the number of customers. Instances are parsed window by window.
+    Customers of every data center are counted by a SpaceSaving summary of ceil(1 / epsilon) counters, so a data
+    center fraction is overestimated by at most epsilon. Every host keeps host_counters SpaceSaving counters in
+    fixed arrays, so a host fraction is overestimated by at most used slots / (host_counters * slots) and a customer
+    which, holds more than that share of a host is never missed. Used slots of every host are counted exactly,
+    AvailableHosts is exact.
+    """
+
+    def __init__(self, host_file, instance_file, epsilon=0.001, host_counters=2, candidates=10,
+                 window_size=WINDOW_SIZE):
+        """
+        Constructor of ApproximateEngine class, it raises ImportError if numpy is not available
+        @param host_file source file to provide host list
+        @param instance_file source file to provide instance list
+        @param epsilon error bound of data center fractions
+        @param host_counters number of counters of a host
+        @param candidates number of host and data center candidates to report
+        @param window_size number of bytes of instances file parsed at once
+        @return instance
+        """
+        super(ApproximateEngine, self).__init__()
+        if numpy is None:
+            raise ImportError("numpy is required by approximate engine")
+        self.host_file = host_file
+        self.instance_file = instance_file
+        self.epsilon = epsilon
+        self.host_counters = host_counters
+        self.candidates = candidates
+        self.window_size = window_size
+
+        self.host_ids = self.host_slots = self.host_centers = self.host_used = None
+        self.center_ids = self.center_slots = None
+        self.summaries = []
+
+        # Counters of hosts, counters of a host are host_counters consecutive items. Customer -1 is an empty counter
+        self.counter_customers = self.counter_counts = self.counter_errors = None
+
+        self.instances = 0
+        self.orphans = 0
+
+    def load_hosts(self):
+        """
+        Load hosts file into numpy columns
+        @return void
+        """
+        host_ids, slots, center_ids = [numpy.frombuffer(column, dtype="i%d" % column.itemsize).astype(numpy.int64)
+                                       for column in ColumnParser(self.host_file).parse()]
+        # Data centers are numbered in order of their first appearance like the other engines do
+        unique, first, centers = numpy.unique(center_ids, return_index=True, return_inverse=True)
+        order = numpy.argsort(first, kind="mergesort")
+        rank = numpy.empty(len(order), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(order))
+        self.host_ids, self.host_slots, self.host_centers = host_ids, slots, rank[centers]
+        self.center_ids = unique[order]
+        self.center_slots = numpy.bincount(self.host_centers, weights=slots, minlength=len(order)).astype(numpy.int64)
+        self.host_used = numpy.zeros(len(host_ids), dtype=numpy.int64)
+        self.summaries = [SpaceSaving(int(math.ceil(1 / self.epsilon))) for _ in xrange(len(order))]
+
+        size = len(host_ids) * self.host_counters
+        self.counter_customers = numpy.empty(size, dtype=numpy.int64)
+        self.counter_customers.fill(-1)
+        self.counter_counts = numpy.zeros(size, dtype=numpy.int64)
+        self.counter_errors = numpy.zeros(size, dtype=numpy.int64)
+
+    def load(self):
+        """
+        Count instances of instances file window by window
+        @return void
+        """
+        self.load_hosts()
+        order = numpy.argsort(self.host_ids, kind="mergesort")
+        sorted_ids = self.host_ids[order]
+        number_of_hosts, number_of_centers = len(self.host_ids), len(self.center_ids)
+        for instance_ids, customer_ids, host_ids in ColumnParser(self.instance_file, self.window_size).chunks():
+            positions = numpy.minimum(numpy.searchsorted(sorted_ids, host_ids), number_of_hosts - 1)
+            known = sorted_ids[positions] == host_ids
+            self.orphans += int(len(known) - known.sum())
+            rows, customers = order[positions[known]], customer_ids[known].astype(numpy.int64)
+            self.instances += len(rows)
+            self.host_used += numpy.bincount(rows, minlength=number_of_hosts)
+
+            # Customer ids are used in keys as they are unless they may overflow, then they are replaced with dense
+            # codes of the window like VectorEngine does
+            codes = None
+            if len(customers) and int(customers.max()) * max(number_of_hosts, number_of_centers) >= 2 ** 62:
+                codes, customers = numpy.unique(customers, return_inverse=True)
+                customers = customers.astype(numpy.int64)
+            base = int(customers.max()) + 1 if len(customers) else 1
+
+            keys, counts = numpy.unique(rows * base + customers, return_counts=True)
+            self.count_hosts(keys, counts, base, codes)
+
+            keys, counts = numpy.unique(customers * number_of_centers + self.host_centers[rows], return_counts=True)
+            centers, customers = keys % number_of_centers, keys // number_of_centers
+            if codes is not None:
+                customers = codes[customers]
+            for center, customer_id, count in zip(centers.tolist(), customers.tolist(), counts.tolist()):
+                self.summaries[center].add(customer_id, count)
+
+    def count_hosts(self, keys, counts, base, codes=None):
+        """
+        Add (host, customer) counts of a window into counters of hosts
+        @param keys numpy array of distinct host row * base + customer id keys
+        @param counts numpy array of counts of the keys
+        @param base multiplier of host rows in keys
+        @param codes numpy array of customer ids of dense codes if keys have codes instead of customer ids
+        @return void
+        """
+        size = self.host_counters
+        rows, customer_ids = keys // base, keys % base
+        if codes is not None:
+            customer_ids = codes[customer_ids]
+
+        # Only counters of the hosts a window touches are converted and written back, so a window costs as much as
+        # its number of keys instead of the number of all counters
+        touched = numpy.unique(rows)
+        indices = (touched[:, numpy.newaxis] * size + numpy.arange(size)).ravel()
+        customers, numbers, errors = (self.counter_customers[indices].tolist(), self.counter_counts[indices].tolist(),
+                                      self.counter_errors[indices].tolist())
+        for position, customer_id, count in zip(numpy.searchsorted(touched, rows).tolist(), customer_ids.tolist(),
+                                                counts.tolist()):
+            start = position * size
+            counters = xrange(start, start + size)
+            for counter in counters:
+                if customers[counter] == customer_id:
+                    numbers[counter] += count
+                    break
+            else:
+                # An empty counter has no count, so it is taken before the smallest one
+                counter = min(counters, key=numbers.__getitem__)
+                customers[counter] = customer_id
+                errors[counter] = numbers[counter]
+                numbers[counter] += count
+        self.counter_customers[indices] = customers
+        self.counter_counts[indices] = numbers
+        self.counter_errors[indices] = errors
+
+    def hosts(self):
+        """
+        Host candidates, from the largest fraction
+        @return list of dictionaries including "customer_id", "id" of the host, "fraction" and "error" which, is the
+         largest amount the fraction may exceed the exact one
+        """
+        rows = numpy.repeat(numpy.arange(len(self.host_ids)), self.host_counters)
+        slots = self.host_slots[rows]
+        kept = numpy.flatnonzero((self.counter_customers >= 0) & (slots > 0))
+        fractions = self.counter_counts[kept] / slots[kept]
+        # Candidates are ordered by fraction and then by customer id like is_larger does
+        top = kept[numpy.lexsort((self.counter_customers[kept], -fractions))[:self.candidates]]
+        return [{"customer_id": customer_id, "id": host_id, "fraction": count / slot, "error": error / slot}
+                for customer_id, host_id, count, error, slot in zip(
+                    self.counter_customers[top].tolist(), self.host_ids[rows[top]].tolist(),
+                    self.counter_counts[top].tolist(), self.counter_errors[top].tolist(), slots[top].tolist())]
+
+    def centers(self):
+        """
+        Data center candidates, from the largest fraction
+        @return list of dictionaries including "customer_id", "id" of the data center, "fraction" and "error" which,
+         is the largest amount the fraction may exceed the exact one
+        """
+        candidates = []
+        for center, summary in enumerate(self.summaries):
+            slots = int(self.center_slots[center])
+            if slots:
+                candidates.extend({"customer_id": customer_id, "id": int(self.center_ids[center]),
+                                   "fraction": count / slots, "error": error / slots}
+                                  for customer_id, count, error in summary.items())
+        candidates.sort(key=lambda candidate: (-candidate["fraction"], candidate["customer_id"]))
+        return candidates[:self.candidates]
+
+    def calculate(self):
+        """
+        Calculate estimated largest host and data center fractions and exact available hosts
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        result = {}
+        for key, candidates in (("host", self.hosts()), ("center", self.centers())):
+            result[key] = {"fraction": 0, "customer_id": None}
+            for candidate in candidates:
+                if is_larger(candidate["fraction"], candidate["customer_id"], result[key]):
+                    result[key] = {"fraction": candidate["fraction"], "customer_id": candidate["customer_id"]}
+        available = numpy.flatnonzero(self.host_slots - self.host_used > 0)
+        available = available[numpy.argsort(self.host_centers[available], kind="mergesort")]
+        result["available_hosts"] = self.host_ids[available].tolist()
+        return result
+
+    def nbytes(self):
+        """
+        Memory used by counters of hosts and data centers, columns of hosts are not included
+        @return number of bytes
+        """
+        counters = sum(len(summary.counters) + len(summary.heap) for summary in self.summaries)
+        # A counter of a data center is a dictionary entry and a list of two integers, a heap entry is a tuple
+        return self.counter_customers.nbytes * 3 + counters * 100
@@ -0,0 +1,200 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import copy
+import time
+import logging
+import traceback
+import multiprocessing
+
+from helper.Metrics import Metrics
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Statistics whose settings are copied for every region by the worker processes. Workers are forked after it is
+# set so they share parsed config instead of parsing it again
+statistics = None
+
+
+def share_statistics(template):
+    """
+    Set the statistics of a worker process
+    @param template Statistics which, is configured for the batch
+    @return void
+    """
+    global statistics
+    statistics = template
+
+
+class RegionLog(logging.Handler):
+    """
+    RegionLog keeps messages logged while a region runs. Utilities.log exits after an error and handlers which, catch
+    every exception log that exit again, so the first message is the reason of the failure
+    """
+
+    def __init__(self):
+        """
+        Constructor of RegionLog class
+        @return instance
+        """
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        """
+        Keep a logged message
+        @param record LogRecord
+        @return void
+        """
+        lines = record.getMessage().strip().splitlines()
+        self.messages.append(lines[-1] if lines else "")
+
+
+def run_region(job):
+    """
+    Run statistics of a region in a worker process, a failure of the region is returned instead of raised
+    @param job tuple of (position, region) where region is a dictionary which includes "name", "host_file",
+     "instance_file" and "target_file"
+    @return tuple of (position, dictionary which includes "name", "ok", "seconds" and "error")
+    """
+    position, region = job
+    started = time.time()
+    log = RegionLog()
+    logging.getLogger().addHandler(log)
+    try:
+        ok = bool(region_statistics(region).run())
+        error = None if ok else "Run failed."
+    except SystemExit:
+        # Utilities.log exits after it logs an error, it only ends this region
+        ok, error = False, log.messages[0] if log.messages else "Run exited."
+    except BaseException:
+        ok, error = False, traceback.format_exc().strip().splitlines()[-1]
+    finally:
+        logging.getLogger().removeHandler(log)
+    return position, {"name": region["name"], "ok": ok, "seconds": time.time() - started, "error": error}
+
+
+def region_statistics(region):
+    """
+    Copy the statistics of the batch for a region, files next to the target file are named after it so regions do
+    not overwrite each other
+    @param region see run_region
+    @return Statistics
+    """
+    region_copy = copy.copy(statistics)
+    region_copy.host_file = region["host_file"]
+    region_copy.instance_file = region["instance_file"]
+    region_copy.target_file = region["target_file"]
+    stem = os.path.splitext(region["target_file"])[0]
+    if statistics.metrics.enabled:
+        region_copy.metrics = Metrics()
+        if statistics.metrics_file:
+            region_copy.metrics_file = stem + ".metrics.json"
+    region_copy.report_file = "%s-%s" % (stem, os.path.basename(statistics.report_file))
+    region_copy.database = stem + ".db"
+    # Regions keep their own history, their runs are neither mixed nor appended by two processes at once
+    if statistics.history_directory:
+        region_copy.history_directory = os.path.join(statistics.history_directory, region["name"])
+    # Worker processes of the batch can not start processes of their own, the batch pool is the only pool
+    region_copy.decode_workers = 1
+    if region_copy.engine == "parallel":
+        region_copy.engine = "columnar"
+    return region_copy
+
+
+class BatchRunner(object):
+    """
+    BatchRunner runs statistics of many regions in a single invocation. Regions share a bounded pool of worker
+    processes which, are forked once with parsed config, and a region which fails is reported while the others go on.
+    """
+
+    def __init__(self, template, regions, workers=0):
+        """
+        Constructor of BatchRunner class
+        @param template Statistics which, is configured for the batch, its files are replaced by the ones of regions
+        @param regions list of dictionaries which include "name", "host_file", "instance_file" and "target_file"
+        @param workers number of worker processes, number of CPUs is used if it is 0
+        @return instance
+        """
+        super(BatchRunner, self).__init__()
+        self.template = template
+        self.regions = regions
+        self.workers = workers or multiprocessing.cpu_count()
+
+    @staticmethod
+    def read_manifest(manifest_file):
+        """
+        Read regions of a manifest, a line per region: name,host_file,instance_file,target_file. Relative paths are
+        relative to the manifest, empty lines and lines which, start with # are skipped
+        @param manifest_file path of the manifest
+        @return list of regions
+        """
+        directory = os.path.dirname(manifest_file)
+        regions = []
+        with open(manifest_file, "rb") as h_file:
+            for number, line in enumerate(h_file, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                fields = [field.strip() for field in line.split(",")]
+                if len(fields) != 4 or not all(fields):
+                    raise SyntaxError("Region loaded from %s is malformed at line %d: %r" % (
+                        manifest_file, number, line[:80]), (manifest_file, number, None, line[:80]))
+                regions.append({
+                    "name": fields[0],
+                    "host_file": os.path.join(directory, fields[1]),
+                    "instance_file": os.path.join(directory, fields[2]),
+                    "target_file": os.path.join(directory, fields[3])
+                })
+        return regions
+
+    def run(self, progress=None):
+        """
+        Run every region
+        @param progress callable which, is called with number of finished regions, number of regions and the result
+         of a region as soon as it finishes
+        @return list of results in order of regions, see run_region
+        """
+        results = [None] * len(self.regions)
+        if not self.regions:
+            return results
+        pool = multiprocessing.Pool(min(self.workers, len(self.regions)), initializer=share_statistics,
+                                    initargs=(self.template,))
+        try:
+            for finished, (position, result) in enumerate(
+                    pool.imap_unordered(run_region, list(enumerate(self.regions))), 1):
+                results[position] = result
+                if progress is not None:
+                    progress(finished, len(self.regions), result)
+        finally:
+            pool.terminate()
+        return results
@@ -0,0 +1,290 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+from array import array
+from itertools import izip
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from app.ColumnParser import ColumnParser
+from app.Fractions import is_larger
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class ClusterModel(object):
+    """
+    ClusterModel keeps hosts and instances in typed integer columns instead of a dictionary per host and instance.
+    Rows of a column are related by their position:
+     hosts: host_ids, host_slots, host_centers (row of the data center in center_ids)
+     instances: instance_ids, instance_customers, instance_hosts (row of the host in host_ids)
+    Instances are grouped by host through host_offsets & host_instances, hosts are grouped by data center through
+    center_offsets & center_hosts, etc: instances of host row h are host_instances[host_offsets[h]:host_offsets[h + 1]]
+    """
+
+    # Names of all columns of a model
+    columns = ("center_ids", "host_ids", "host_slots", "host_centers", "instance_ids", "instance_customers",
+               "instance_hosts", "host_offsets", "host_instances", "center_offsets", "center_hosts")
+
+    def __init__(self):
+        """
+        Constructor of ClusterModel class
+        @return instance
+        """
+        super(ClusterModel, self).__init__()
+
+        # Data centers in order of their first appearance in hosts file
+        self.center_ids = array("l")
+
+        # Host columns in order of hosts file
+        self.host_ids = array("l")
+        self.host_slots = array("l")
+        self.host_centers = array("i")
+
+        # Instance columns in order of instances file
+        self.instance_ids = array("l")
+        self.instance_customers = array("l")
+        self.instance_hosts = array("i")
+
+        # Offset arrays to group rows
+        self.host_offsets = array("i")
+        self.host_instances = array("i")
+        self.center_offsets = array("i")
+        self.center_hosts = array("i")
+
+        # Number of instances which, are placed on a host that hosts file does not include
+        self.orphans = 0
+
+    @classmethod
+    def load(cls, host_file, instance_file, workers=0):
+        """
+        Load hosts and instances files into a new model
+        @param host_file source file to provide host list
+        @param instance_file source file to provide instance list
+        @param workers number of processes which, decompress and parse shards, see ColumnParser.parse_shards
+        @return ClusterModel
+        """
+        model = cls()
+        model.load_hosts(izip(*ColumnParser(host_file, workers=workers).parse()))
+        model.load_instance_columns(*ColumnParser(instance_file, workers=workers).parse())
+        model.group()
+        return model
+
+    def load_hosts(self, rows):
+        """
+        Append host rows into host columns
+        @param rows iterable of (host_id, number_of_slots, data_center_id) fields
+        @return void
+        """
+        centers = dict((center_id, row) for row, center_id in enumerate(self.center_ids))
+        for host_id, number_of_slots, center_id in rows:
+            center_id = int(center_id)
+            if center_id not in centers:
+                centers[center_id] = len(self.center_ids)
+                self.center_ids.append(center_id)
+            self.host_ids.append(int(host_id))
+            self.host_slots.append(int(number_of_slots))
+            self.host_centers.append(centers[center_id])
+
+    def load_instances(self, rows):
+        """
+        Append instance rows into instance columns, instances of an unknown host are skipped as they can not be
+        attached to any data center
+        @param rows iterable of (instance_id, customer_id, host_id) fields
+        @return void
+        """
+        hosts = self.host_index()
+        for instance_id, customer_id, host_id in rows:
+            host = hosts.get(int(host_id))
+            if host is None:
+                self.orphans += 1
+                continue
+            self.instance_ids.append(int(instance_id))
+            self.instance_customers.append(int(customer_id))
+            self.instance_hosts.append(host)
+
+    def load_instance_columns(self, instance_ids, customer_ids, host_ids):
+        """
+        Append parsed instance columns into instance columns, see load_instances
+        @param instance_ids array of instance ids
+        @param customer_ids array of customer ids
+        @param host_ids array of host ids
+        @return void
+        """
+        if numpy is None or not len(self.host_ids):
+            self.load_instances(izip(instance_ids, customer_ids, host_ids))
+            return
+
+        # Find host rows by a binary search over sorted host ids instead of a dictionary lookup per instance
+        hosts = numpy.frombuffer(self.host_ids, dtype="i%d" % self.host_ids.itemsize)
+        order = numpy.argsort(hosts, kind="mergesort")
+        instance_hosts = numpy.frombuffer(host_ids, dtype="i%d" % host_ids.itemsize)
+        positions = numpy.minimum(numpy.searchsorted(hosts[order], instance_hosts), len(hosts) - 1)
+        known = hosts[order][positions] == instance_hosts
+        self.orphans += int(len(known) - known.sum())
+        if known.all():
+            self.instance_ids.extend(instance_ids)
+            self.instance_customers.extend(customer_ids)
+        else:
+            self.instance_ids.fromstring(numpy.frombuffer(instance_ids, dtype=instance_hosts.dtype)[known].tostring())
+            self.instance_customers.fromstring(
+                numpy.frombuffer(customer_ids, dtype=instance_hosts.dtype)[known].tostring())
+        self.instance_hosts.fromstring(order[positions[known]].astype("i%d" % self.instance_hosts.itemsize).tostring())
+
+    def host_index(self):
+        """
+        Map host ids to their rows
+        @return dictionary of host id => row
+        """
+        return dict((host_id, row) for row, host_id in enumerate(self.host_ids))
+
+    def group(self):
+        """
+        Build offset arrays by a counting sort, rows keep their file order inside a group
+        @return void
+        """
+        self.host_offsets, self.host_instances = self.counting_sort(self.instance_hosts, len(self.host_ids))
+        self.center_offsets, self.center_hosts = self.counting_sort(self.host_centers, len(self.center_ids))
+
+    @staticmethod
+    def counting_sort(keys, number_of_groups):
+        """
+        Group row numbers by their keys
+        @param keys column which, keeps a group number for every row
+        @param number_of_groups number of distinct groups
+        @return tuple of offsets (number_of_groups + 1 items) and rows ordered by group
+        """
+        if numpy is not None:
+            # A stable sort keeps file order inside a group like the counting sort below does
+            groups = numpy.frombuffer(keys, dtype="i%d" % keys.itemsize) if len(keys) else numpy.zeros(0, "i4")
+            counts = numpy.zeros(number_of_groups + 1, dtype=numpy.int64)
+            counts[1:] = numpy.bincount(groups, minlength=number_of_groups)
+            offsets, rows = array("i"), array("i")
+            offsets.fromstring(numpy.cumsum(counts).astype("i%d" % offsets.itemsize).tostring())
+            rows.fromstring(numpy.argsort(groups, kind="mergesort").astype("i%d" % rows.itemsize).tostring())
+            return offsets, rows
+
+        offsets = array("i", [0]) * (number_of_groups + 1)
+        for key in keys:
+            offsets[key + 1] += 1
+        for group in xrange(number_of_groups):
+            offsets[group + 1] += offsets[group]
+        positions = array("i", offsets)
+        rows = array("i", [0]) * len(keys)
+        for row, key in enumerate(keys):
+            rows[positions[key]] = row
+            positions[key] += 1
+        return offsets, rows
+
+    def nbytes(self):
+        """
+        Memory used by the columns
+        @return number of bytes
+        """
+        return sum(getattr(self, name).buffer_info()[1] * getattr(self, name).itemsize for name in self.columns)
+
+    def calculate(self):
+        """
+        Calculate the largest host and data center fractions and available hosts over the columns
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        max_host = {"fraction": 0, "customer_id": None}
+        max_center = {"fraction": 0, "customer_id": None}
+        available_hosts = []
+
+        for center in xrange(len(self.center_ids)):
+            partial = self.calculate_hosts(
+                self.center_hosts[self.center_offsets[center]:self.center_offsets[center + 1]])
+            if is_larger(partial["host"]["fraction"], partial["host"]["customer_id"], max_host):
+                max_host = partial["host"]
+            available_hosts.extend(partial["available_hosts"])
+            center_record = self.largest_center(partial["number_of_instance"], partial["number_of_slots"])
+            if is_larger(center_record["fraction"], center_record["customer_id"], max_center):
+                max_center = center_record
+
+        return {"host": max_host, "center": max_center, "available_hosts": available_hosts}
+
+    def calculate_hosts(self, hosts):
+        """
+        Calculate partial values of a group of hosts which, belong to the same data center
+        @param hosts host rows
+        @return dictionary which includes "host" record, "available_hosts" list of host ids, "number_of_instance"
+         dictionary of customer id => number of instances and "number_of_slots" total of the hosts
+        """
+        max_host = {"fraction": 0, "customer_id": None}
+        available_hosts = []
+        number_of_slots = 0
+        number_of_instance = {}
+        for host in hosts:
+            slots = self.host_slots[host]
+            start, end = self.host_offsets[host], self.host_offsets[host + 1]
+            if slots - (end - start) > 0:
+                available_hosts.append(self.host_ids[host])
+
+            # Count instances of every customer on this host and in this data center
+            number_of_host_instance = {}
+            for instance in self.host_instances[start:end]:
+                customer_id = self.instance_customers[instance]
+                number_of_host_instance[customer_id] = number_of_host_instance.get(customer_id, 0) + 1
+                number_of_instance[customer_id] = number_of_instance.get(customer_id, 0) + 1
+            if slots:
+                for customer_id, count in number_of_host_instance.iteritems():
+                    fraction = count / slots
+                    if is_larger(fraction, customer_id, max_host):
+                        max_host = {"fraction": fraction, "customer_id": customer_id}
+            number_of_slots += slots
+
+        return {
+            "host": max_host,
+            "available_hosts": available_hosts,
+            "number_of_instance": number_of_instance,
+            "number_of_slots": number_of_slots
+        }
+
+    @staticmethod
+    def largest_center(number_of_instance, number_of_slots):
+        """
+        Find the largest fraction of a data center
+        @param number_of_instance dictionary of customer id => number of instances in the data center
+        @param number_of_slots total number of slots in the data center
+        @return dictionary including "fraction" and "customer_id"
+        """
+        max_center = {"fraction": 0, "customer_id": None}
+        if number_of_slots:
+            for customer_id, count in number_of_instance.iteritems():
+                fraction = count / number_of_slots
+                if is_larger(fraction, customer_id, max_center):
+                    max_center = {"fraction": fraction, "customer_id": customer_id}
+        return max_center
@@ -0,0 +1,169 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import csv
+import heapq
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class ClusteringReport(object):
+    """
+    ClusteringReport calculates fractions of every customer on every host and in every data center of a ClusterModel
+    in a single pass. It keeps the top most concentrated (customer, host) and (customer, data center) pairs in
+    bounded heaps and the largest host and data center fractions of every customer.
+    """
+
+    # Columns of the customer table
+    header = ("customer_id", "instances", "host_id", "host_fraction", "data_centre_id", "data_centre_fraction")
+
+    def __init__(self, model, top=10):
+        """
+        Constructor of ClusteringReport class
+        @param model ClusterModel to report
+        @param top number of most concentrated pairs to keep
+        @return instance
+        """
+        super(ClusteringReport, self).__init__()
+        self.model = model
+        self.top = top
+
+        # Heaps of (fraction, -customer id, group id), the smallest kept pair is at the top to be replaced
+        self.top_hosts = []
+        self.top_centers = []
+
+        # customer id => [number of instances, host fraction, host id, data center fraction, data center id]
+        self.customers = {}
+
+    def calculate(self):
+        """
+        Walk data centers and hosts once and fill heaps and customer table
+        @return self
+        """
+        model = self.model
+        for center in xrange(len(model.center_ids)):
+            center_id = model.center_ids[center]
+            number_of_slots = 0
+            number_of_instance = {}
+            for host in model.center_hosts[model.center_offsets[center]:model.center_offsets[center + 1]]:
+                slots = model.host_slots[host]
+                number_of_slots += slots
+                number_of_host_instance = {}
+                for instance in model.host_instances[model.host_offsets[host]:model.host_offsets[host + 1]]:
+                    customer_id = model.instance_customers[instance]
+                    number_of_host_instance[customer_id] = number_of_host_instance.get(customer_id, 0) + 1
+                    number_of_instance[customer_id] = number_of_instance.get(customer_id, 0) + 1
+                for customer_id, count in number_of_host_instance.iteritems():
+                    customer = self.customer(customer_id)
+                    customer[0] += count
+                    if slots:
+                        self.record(self.top_hosts, customer, 1, count / slots, customer_id, model.host_ids[host])
+            if number_of_slots:
+                for customer_id, count in number_of_instance.iteritems():
+                    self.record(self.top_centers, self.customer(customer_id), 3, count / number_of_slots,
+                                customer_id, center_id)
+        return self
+
+    def customer(self, customer_id):
+        """
+        Get the row of a customer in customer table
+        @param customer_id
+        @return list of [number of instances, host fraction, host id, data center fraction, data center id]
+        """
+        customer = self.customers.get(customer_id)
+        if customer is None:
+            customer = self.customers[customer_id] = [0, 0, None, 0, None]
+        return customer
+
+    def record(self, heap, customer, column, fraction, customer_id, group_id):
+        """
+        Record fraction of a (customer, group) pair into the customer table and top heap
+        @param heap top_hosts or top_centers
+        @param customer row of the customer
+        @param column position of the fraction in the row, group id follows it
+        @param fraction
+        @param customer_id
+        @param group_id host or data center id
+        @return void
+        """
+        if fraction > customer[column]:
+            customer[column] = fraction
+            customer[column + 1] = group_id
+        entry = (fraction, -customer_id, group_id)
+        if len(heap) < self.top:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    @staticmethod
+    def ranked(heap):
+        """
+        List a top heap from the most concentrated pair
+        @param heap top_hosts or top_centers
+        @return list of dictionaries including "customer_id", "id" of the host or data center and "fraction"
+        """
+        return [{"customer_id": -customer_id, "id": group_id, "fraction": fraction}
+                for fraction, customer_id, group_id in sorted(heap, reverse=True)]
+
+    def hosts(self):
+        """
+        Most concentrated (customer, host) pairs
+        @return list of dictionaries, see ranked
+        """
+        return self.ranked(self.top_hosts)
+
+    def centers(self):
+        """
+        Most concentrated (customer, data center) pairs
+        @return list of dictionaries, see ranked
+        """
+        return self.ranked(self.top_centers)
+
+    def rows(self):
+        """
+        Iterate rows of customer table in order of customer ids
+        @return generator of tuples, see header
+        """
+        for customer_id in sorted(self.customers):
+            instances, host_fraction, host_id, center_fraction, center_id = self.customers[customer_id]
+            yield (customer_id, instances, host_id, "%.4f" % host_fraction, center_id, "%.4f" % center_fraction)
+
+    def write_csv(self, report_file):
+        """
+        Stream customer table into a CSV file row by row
+        @param report_file path of the CSV file
+        @return void
+        """
+        with open(report_file, "wb") as h_file:
+            writer = csv.writer(h_file)
+            writer.writerow(self.header)
+            writer.writerows(self.rows())
@@ -0,0 +1,312 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import re
+import mmap
+import string
+import multiprocessing
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from app.StateReader import StateReader
+from app.Shards import is_plain, expand, read_shard
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Size of a window of a mapped file which, is parsed at once by numpy, windows end at a line break
+WINDOW_SIZE = 64 * 1024 * 1024
+
+# Longest integer which, fits into a column without overflow
+MAX_DIGITS = 18
+
+# Byte values of separators
+COMMA, CARRIAGE_RETURN, LINE_FEED, ZERO = ord(","), ord("\r"), ord("\n"), ord("0")
+
+# Translation table which, replaces separators with spaces
+SEPARATORS = string.maketrans(",\r\n", "   ")
+
+
+class ColumnParser(object):
+    """
+    ColumnParser memory maps a state file and turns its comma separated integers directly into three integer columns
+    without creating a string for every line. numpy validates windows of the mapped file with vectorized operations
+    and converts a whole window at once, a regular expression over the mapped file is used without numpy. Files
+    which, can not be mapped such as empty files or pipes are read by StateReader.
+
+    Parsing does not report where a file is malformed, a malformed file is read again by StateReader which, raises
+    SyntaxError with line number and byte offset of the malformed line.
+    """
+
+    # Pattern of a single line when numpy is not available
+    pattern = re.compile("([0-9]+),([0-9]+),([0-9]+)(?:\\r?\\n|\\r?\\Z)")
+
+    def __init__(self, file_name, window_size=WINDOW_SIZE, workers=0):
+        """
+        Constructor of ColumnParser class
+        @param file_name path of the state file to parse, a glob pattern or a manifest of shards, see app/Shards.py
+        @param window_size number of bytes numpy parses at once
+        @param workers number of processes which, decompress and parse shards, 0 means number of CPUs
+        @return instance
+        """
+        super(ColumnParser, self).__init__()
+        self.file_name = file_name
+        self.window_size = window_size
+        self.workers = workers or multiprocessing.cpu_count()
+
+        # How the last file is parsed: "numpy", "regex" or "stream", and its size
+        self.method = None
+        self.bytes_read = 0
+
+    def parse(self):
+        """
+        Parse the file
+        @return tuple of three array columns, etc: (instance ids, customer ids, host ids)
+        """
+        if not is_plain(self.file_name):
+            return self.parse_shards()
+        with open(self.file_name, "rb") as h_file:
+            try:
+                mapped = mmap.mmap(h_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (mmap.error, ValueError, EnvironmentError):
+                mapped = None
+            if mapped is not None:
+                try:
+                    columns = self.parse_numpy(mapped) if numpy is not None else self.parse_regex(mapped)
+                    self.bytes_read = len(mapped)
+                finally:
+                    mapped.close()
+                if columns is not None:
+                    return columns
+        return self.parse_stream()
+
+    def parse_shards(self):
+        """
+        Decompress and parse shards in worker processes, columns of the shards are joined in shard order
+        @return tuple of three array columns
+        """
+        shards = expand(self.file_name)
+        if len(shards) == 1 or self.workers == 1:
+            parsed = [parse_shard(shard) for shard in shards]
+        else:
+            pool = multiprocessing.Pool(min(self.workers, len(shards)))
+            try:
+                parsed = pool.map(parse_shard, shards)
+            finally:
+                pool.terminate()
+
+        self.method = "shards"
+        self.bytes_read = 0
+        columns = (array("l"), array("l"), array("l"))
+        for values, bytes_read in parsed:
+            for column, value in zip(columns, values):
+                column.fromstring(value)
+            self.bytes_read += bytes_read
+        if not columns[0]:
+            raise SyntaxError("Content loaded from %s is empty." % self.file_name)
+        return columns
+
+    def parse_content(self, content):
+        """
+        Parse the content of a file which, is already in memory such as a decompressed shard
+        @param content string
+        @return tuple of three array columns or None if content is malformed
+        """
+        columns = self.parse_numpy(content) if numpy is not None else self.parse_regex(content)
+        self.bytes_read = len(content)
+        return columns
+
+    def parse_stream(self):
+        """
+        Parse the file line by line, it is also used to report where a malformed file is malformed
+        @return tuple of three array columns
+        """
+        self.method = "stream"
+        columns = (array("l"), array("l"), array("l"))
+        reader = StateReader(self.file_name)
+        for fields in reader:
+            for column, field in zip(columns, fields):
+                column.append(int(field))
+        self.bytes_read = reader.offset
+        return columns
+
+    def parse_regex(self, mapped):
+        """
+        Parse a mapped file by a regular expression
+        @param mapped mmap of the file or content of the file as a string
+        @return tuple of three array columns or None if file is malformed
+        """
+        self.method = "regex"
+        columns = (array("l"), array("l"), array("l"))
+        first, second, third = [column.append for column in columns]
+        position = 0
+        for matched in self.pattern.finditer(mapped):
+            # Matches have to follow each other, anything between them is malformed
+            if matched.start() != position:
+                return None
+            position = matched.end()
+            first(int(matched.group(1)))
+            second(int(matched.group(2)))
+            third(int(matched.group(3)))
+        if position != len(mapped) or not position:
+            return None
+        return columns
+
+    def parse_numpy(self, mapped):
+        """
+        Parse a mapped file window by window by numpy
+        @param mapped mmap of the file or content of the file as a string
+        @return tuple of three array columns or None if file is malformed
+        """
+        self.method = "numpy"
+        columns = (array("l"), array("l"), array("l"))
+        dtype = "i%d" % columns[0].itemsize
+        for values in self.windows(mapped):
+            if values is None:
+                return None
+            for column, position in zip(columns, range(3)):
+                column.fromstring(values[position::3].astype(dtype).tostring())
+        return columns if len(mapped) else None
+
+    def windows(self, mapped):
+        """
+        Parse a mapped file window by window by numpy
+        @param mapped mmap of the file or content of the file as a string
+        @return generator of numpy arrays of all integers of a window, None is generated for a malformed window and
+         nothing follows it
+        """
+        start = 0
+        size = len(mapped)
+        while start < size:
+            end = min(start + self.window_size, size)
+            if end < size:
+                # Window ends after its last line break, a line longer than a window is malformed
+                end = mapped.rfind("\n", start, end) + 1
+                if end <= start:
+                    yield None
+                    return
+            values = self.parse_window(
+                numpy.frombuffer(mapped, dtype=numpy.uint8, count=end - start, offset=start), mapped[start:end])
+            yield values
+            if values is None:
+                return
+            start = end
+
+    def chunks(self):
+        """
+        Parse the file window by window without keeping columns of the whole file, it requires numpy
+        @return generator of tuples of three numpy columns of a window, etc: (instance ids, customer ids, host ids)
+        """
+        mapped = None
+        if is_plain(self.file_name):
+            with open(self.file_name, "rb") as h_file:
+                try:
+                    mapped = mmap.mmap(h_file.fileno(), 0, access=mmap.ACCESS_READ)
+                except (mmap.error, ValueError, EnvironmentError):
+                    pass
+        if mapped is None:
+            # Shards and files which, can not be mapped are parsed at once
+            yield tuple(numpy.frombuffer(column, dtype="i%d" % column.itemsize) for column in self.parse())
+            return
+        self.method = "numpy"
+        try:
+            for values in self.windows(mapped):
+                if values is None:
+                    self.parse_stream()
+                    raise SyntaxError("Content loaded from %s is malformed." % self.file_name)
+                yield values[0::3], values[1::3], values[2::3]
+        finally:
+            mapped.close()
+
+    @staticmethod
+    def parse_window(window, content):
+        """
+        Validate and parse a window of complete lines
+        @param window numpy array of bytes of the window
+        @param content the same window as a string
+        @return numpy array of all integers of the window or None if window is malformed
+        """
+        # Integers start and end where a digit follows a non digit or vice versa
+        digits = (window >= ZERO) & (window <= ZERO + 9)
+        boundaries = numpy.flatnonzero(digits[1:] != digits[:-1]) + 1
+        if not len(window) or not digits[0]:
+            return None
+        starts = numpy.concatenate(([0], boundaries[1::2]))
+        ends = boundaries[0::2]
+        if digits[-1]:
+            ends = numpy.concatenate((ends, [len(window)]))
+
+        # Every line has three integers which, fit into a column and a window ends with an optional line break
+        if len(starts) % 3 or (ends - starts).max() > MAX_DIGITS:
+            return None
+        if content[ends[-1]:] not in ("", "\n", "\r\n"):
+            return None
+
+        # Exactly one comma between integers of a line and exactly one line break between lines
+        gaps = starts[1:] - ends[:-1]
+        separators = window[ends[:-1]]
+        commas = numpy.ones(len(gaps), dtype=numpy.bool_)
+        commas[2::3] = False
+        if not ((gaps[commas] == 1) & (separators[commas] == COMMA)).all():
+            return None
+        line_ends = ends[:-1][~commas]
+        gaps = gaps[~commas]
+        separators = separators[~commas]
+        feeds = (gaps == 1) & (separators == LINE_FEED)
+        returns = (gaps == 2) & (separators == CARRIAGE_RETURN)
+        if returns.any():
+            returns[returns] = window[line_ends[returns] + 1] == LINE_FEED
+        if not (feeds | returns).all():
+            return None
+
+        # Window is well formed, separators are replaced with spaces and numpy converts integers in C
+        return numpy.fromstring(content.translate(SEPARATORS), dtype=numpy.int64, sep=" ")
+
+
+def parse_shard(shard):
+    """
+    Decompress and parse a single shard, it runs in a worker process of ColumnParser.parse_shards
+    @param shard file name
+    @return tuple of three column strings and number of decompressed bytes, raw strings are cheaper to send back than
+     arrays
+    """
+    content = read_shard(shard)
+    if not content:
+        return ("", "", ""), 0
+    parser = ColumnParser(shard)
+    columns = parser.parse_content(content)
+    if columns is None:
+        # A malformed shard is read again line by line to raise SyntaxError which, points the malformed line
+        columns = parser.parse_stream()
+    return tuple(column.tostring() for column in columns), parser.bytes_read
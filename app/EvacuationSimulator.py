@@ -0,0 +1,227 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import multiprocessing
+
+from app.IncrementalEngine import IncrementalEngine
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Simulator of the worker processes. Workers are forked after it is set so they share the counters of the parent
+# process, every worker changes and restores its own copy
+simulator = None
+
+
+def share_simulator(evacuation_simulator):
+    """
+    Set the simulator of a worker process
+    @param evacuation_simulator EvacuationSimulator
+    @return void
+    """
+    global simulator
+    simulator = evacuation_simulator
+
+
+def simulate_scenario(scenario):
+    """
+    Simulate a scenario in a worker process
+    @param scenario tuple of (host ids, data center ids) to drain
+    @return see EvacuationSimulator.simulate
+    """
+    return simulator.simulate(*scenario)
+
+
+class EvacuationSimulator(object):
+    """
+    EvacuationSimulator answers what HostClustering, DatacentreClustering and free capacity would be if hosts or data
+    centers were drained. Instances of drained hosts are moved into free slots of the remaining hosts, hosts of the
+    same data center first, by the events of an IncrementalEngine, so only the counters of touched hosts and data
+    centers are updated. The moves are undone after every scenario, so scenarios do not parse or calculate the
+    fleet again and cost time in proportion to the instances they move.
+    """
+
+    def __init__(self, model):
+        """
+        Constructor of EvacuationSimulator class
+        @param model ClusterModel of the fleet
+        @return instance
+        """
+        super(EvacuationSimulator, self).__init__()
+        self.engine = IncrementalEngine.from_model(model)
+
+        # data center id => host ids in file order and host id => instance ids placed on it
+        self.center_hosts = {}
+        self.host_instances = dict((host_id, []) for host_id in self.engine.hosts)
+        # Data center ids in file order
+        self.center_order = sorted(self.engine.centers, key=lambda center_id: self.engine.centers[center_id][1])
+        for host_id in sorted(self.engine.hosts, key=lambda host_id: self.engine.hosts[host_id][3]):
+            self.center_hosts.setdefault(self.engine.hosts[host_id][1], []).append(host_id)
+        for instance_id, (customer_id, host_id) in self.engine.instances.iteritems():
+            self.host_instances[host_id].append(instance_id)
+
+        # data center id => host ids which, have an empty slot, drained hosts only take slots away so other hosts
+        # can never be a target
+        self.free_hosts = dict(
+            (center_id, [host_id for host_id in host_ids if host_id in self.engine.free_hosts])
+            for center_id, host_ids in self.center_hosts.iteritems())
+
+        # Total slots and instances of the fleet, free capacity of a scenario is derived from them
+        self.number_of_slots = sum(host[0] for host in self.engine.hosts.itervalues())
+        self.number_of_instances = len(self.engine.instances)
+
+        # Statistics of the fleet without any drained host
+        self.baseline = self.summary([], [], set())
+
+    def drained_hosts(self, host_ids=(), center_ids=()):
+        """
+        Expand drained hosts and data centers to the set of drained host ids
+        @param host_ids ids of drained hosts
+        @param center_ids ids of drained data centers
+        @return set of host ids
+        """
+        drained = set()
+        for host_id in host_ids:
+            self.engine.host(host_id)
+            drained.add(host_id)
+        for center_id in center_ids:
+            if center_id not in self.center_hosts:
+                raise KeyError("There is no data center %s." % center_id)
+            drained.update(self.center_hosts[center_id])
+        return drained
+
+    def targets(self, center_id, drained, taken):
+        """
+        Walk the hosts which, have an empty slot and are not drained, hosts of given data center first
+        @param center_id data center of the evacuated host
+        @param drained set of drained host ids
+        @param taken dictionary of host id => number of slots taken by the scenario, it is updated for yielded hosts
+        @return generator of host ids, a host is yielded once for every empty slot
+        """
+        hosts = self.engine.hosts
+        for center in [center_id] + [center for center in self.center_order if center != center_id]:
+            for host_id in self.free_hosts[center]:
+                if host_id not in drained:
+                    number_of_slots, center, used, order = hosts[host_id]
+                    while number_of_slots - used - taken.get(host_id, 0) > 0:
+                        taken[host_id] = taken.get(host_id, 0) + 1
+                        yield host_id
+
+    def simulate(self, host_ids=(), center_ids=()):
+        """
+        Drain hosts and data centers, calculate statistics and restore the fleet
+        @param host_ids ids of drained hosts
+        @param center_ids ids of drained data centers
+        @return dictionary which includes "host" and "center" records, "free_slots" and "free_hosts" counts of the
+         remaining hosts, "drained" number of drained hosts, "moved" number of moved instances and "unplaced" number
+         of instances which, did not fit into the remaining free slots
+        """
+        drained = self.drained_hosts(host_ids, center_ids)
+        engine = self.engine
+        # Lists of (instance id, host id, target host id) of moved instances and (instance id, customer id, host id)
+        # of removed ones to undo
+        moved, unplaced = [], []
+        # Drained hosts as (host id, number of slots, data center id, order) to add them back
+        removed = []
+        try:
+            targets, taken = {}, {}
+            for host_id in sorted(drained, key=lambda host_id: engine.hosts[host_id][3]):
+                center_id = engine.hosts[host_id][1]
+                if center_id not in targets:
+                    targets[center_id] = self.targets(center_id, drained, taken)
+                for instance_id in self.host_instances[host_id]:
+                    target = next(targets[center_id], None)
+                    if target is None:
+                        unplaced.append((instance_id, engine.instances[instance_id][0], host_id))
+                        engine.remove(instance_id)
+                    else:
+                        moved.append((instance_id, host_id, target))
+            # Instances are moved at once so counters of a customer are changed once per host
+            engine.move_many((instance_id, target) for instance_id, host_id, target in moved)
+            for host_id in drained:
+                number_of_slots, center_id, used, order = engine.hosts[host_id]
+                engine.remove_host(host_id)
+                removed.append((host_id, number_of_slots, center_id, order))
+            return self.summary(moved, unplaced, removed)
+        finally:
+            self.restore(moved, unplaced, removed)
+
+    def summary(self, moved, unplaced, removed):
+        """
+        Calculate statistics of the current state of the engine
+        @param moved list of moved instances
+        @param unplaced list of removed instances
+        @param removed list of removed hosts
+        @return see simulate
+        """
+        return {
+            "host": self.engine.host_clustering(),
+            "center": self.engine.center_clustering(),
+            "free_slots": (self.number_of_slots - sum(host[1] for host in removed) -
+                           self.number_of_instances + len(unplaced)),
+            "free_hosts": len(self.engine.free_hosts),
+            "drained": len(removed),
+            "moved": len(moved),
+            "unplaced": len(unplaced)
+        }
+
+    def restore(self, moved, unplaced, removed):
+        """
+        Undo a scenario, hosts get their order back so available hosts are listed as before
+        @param moved list of (instance id, host id, target host id) of moved instances
+        @param unplaced list of (instance id, customer id, host id) of removed instances
+        @param removed list of (host id, number of slots, data center id, order) of removed hosts
+        @return void
+        """
+        engine = self.engine
+        for host_id, number_of_slots, center_id, order in removed:
+            engine.add_host(host_id, number_of_slots, center_id)
+            engine.hosts[host_id][3] = order
+        for instance_id, customer_id, host_id in unplaced:
+            engine.add(instance_id, customer_id, host_id)
+        engine.move_many((instance_id, host_id) for instance_id, host_id, target in moved)
+
+    def evaluate(self, scenarios, workers=1):
+        """
+        Simulate many scenarios, in a pool of worker processes if more than one worker is given
+        @param scenarios iterable of (host ids, data center ids) tuples
+        @param workers number of worker processes, number of CPUs is used if it is 0
+        @return list of results in order of scenarios, see simulate
+        """
+        if workers == 1:
+            return [self.simulate(*scenario) for scenario in scenarios]
+        scenarios = list(scenarios)
+        workers = min(workers or multiprocessing.cpu_count(), len(scenarios)) or 1
+        pool = multiprocessing.Pool(workers, initializer=share_simulator, initargs=(self,))
+        try:
+            return pool.map(simulate_scenario, scenarios, max(len(scenarios) // (4 * workers), 1))
+        finally:
+            pool.terminate()
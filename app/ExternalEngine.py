@@ -0,0 +1,261 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import os
+import heapq
+import shutil
+import tempfile
+from array import array
+from collections import OrderedDict
+
+from app.StateReader import StateReader
+from app.Fractions import is_larger
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Approximate number of bytes a (customer, host) count takes in a dictionary, an integer key and an integer value
+ENTRY_SIZE = 100
+
+# Maximum number of runs merged at once
+MAX_FAN_IN = 64
+
+
+class ExternalEngine(object):
+    """
+    ExternalEngine calculates the statistics of an instances file which, does not fit in memory. Instances are streamed
+    in chunks and counted per (customer, host) pair. Whenever the counts exceed the memory budget they are sorted and
+    spilled into a temporary run file. Runs are merged at the end, so pairs of a customer arrive together and its data
+    center counts are summed from its host counts. Hosts file is kept in memory, it is far smaller than instances file.
+    """
+
+    def __init__(self, host_file, instance_file, memory_budget=256 * 1024 * 1024, directory=None):
+        """
+        Constructor of ExternalEngine class
+        @param host_file source file to provide host list
+        @param instance_file source file to provide instance list
+        @param memory_budget number of bytes counts may take before they are spilled
+        @param directory directory of run files, system temporary directory is used if it is not given
+        @return instance
+        """
+        super(ExternalEngine, self).__init__()
+        self.host_file = host_file
+        self.instance_file = instance_file
+        self.max_entries = max(1, memory_budget // ENTRY_SIZE)
+
+        # Number of records buffered per run, buffers of a merge pass take about the same memory as counts
+        self.buffer_size = max(1024, self.max_entries // MAX_FAN_IN)
+        self.directory = directory
+
+        # Host columns in file order, a host is referred by its row. Ids and counts are as wide as ClusterModel's,
+        # data center rows are small
+        self.host_ids = array("l")
+        self.host_slots = array("l")
+        self.host_centers = array("i")
+        self.host_instances = array("l")
+        self.center_ids = []
+
+        self.instances = 0
+        self.orphans = 0
+        self.runs = []
+        self.number_of_runs = 0
+        self.run_directory = None
+
+    def load(self):
+        """
+        Load hosts and count instances of instances file, counts are spilled into runs over the memory budget
+        @return void
+        """
+        # Runs already spilled are removed if instances file turns out to be malformed
+        try:
+            rows, centers = {}, OrderedDict()
+            for host_id, slots, center_id in StateReader(self.host_file):
+                center = centers.setdefault(int(center_id), len(centers))
+                rows[int(host_id)] = len(self.host_ids)
+                self.host_ids.append(int(host_id))
+                self.host_slots.append(int(slots))
+                self.host_centers.append(center)
+            self.center_ids = list(centers)
+            self.host_instances = array("l", [0]) * len(self.host_ids)
+
+            # A pair is a single integer key, sorting keys sorts pairs by customer and then by host row
+            number_of_hosts = len(self.host_ids)
+            counts = {}
+            for instance_id, customer_id, host_id in StateReader(self.instance_file):
+                row = rows.get(int(host_id))
+                if row is None:
+                    self.orphans += 1
+                    continue
+                key = int(customer_id) * number_of_hosts + row
+                counts[key] = counts.get(key, 0) + 1
+                self.host_instances[row] += 1
+                self.instances += 1
+                if len(counts) >= self.max_entries:
+                    self.spill(counts)
+                    counts = {}
+            if counts:
+                self.spill(counts)
+        except:
+            self.clear()
+            raise
+
+    def spill(self, counts):
+        """
+        Write counts into a run file sorted by their keys
+        @param counts dictionary of pair key => number of instances
+        @return void
+        """
+        number_of_hosts = len(self.host_ids)
+        self.runs.append(self.write_run(
+            (key // number_of_hosts, key % number_of_hosts, counts[key]) for key in sorted(counts)))
+
+    def write_run(self, records):
+        """
+        Write records into a new run file in blocks
+        @param records iterable of (customer id, host row, count) tuples in customer and host row order
+        @return path of run file
+        """
+        if self.run_directory is None:
+            self.run_directory = tempfile.mkdtemp(prefix="runs", dir=self.directory)
+        run = os.path.join(self.run_directory, "%d.run" % self.number_of_runs)
+        self.number_of_runs += 1
+        with open(run, "wb") as h_file:
+            block = array("l")
+            for record in records:
+                block.extend(record)
+                if len(block) >= self.buffer_size * 3:
+                    block.tofile(h_file)
+                    block = array("l")
+            block.tofile(h_file)
+        return run
+
+    def read_run(self, run):
+        """
+        Read records of a run file in blocks
+        @param run path of run file
+        @return generator of (customer id, host row, count) tuples in customer and host row order
+        """
+        with open(run, "rb") as h_file:
+            while True:
+                records = array("l")
+                try:
+                    records.fromfile(h_file, self.buffer_size * 3)
+                except EOFError:
+                    pass
+                if not records:
+                    break
+                for index in xrange(0, len(records), 3):
+                    yield records[index], records[index + 1], records[index + 2]
+
+    def merge_runs(self, runs):
+        """
+        Merge runs and sum counts of the same pair which, is spilled into more than one run
+        @param runs paths of run files
+        @return generator of (customer id, host row, count) tuples ordered by customer and host row
+        """
+        previous, total = None, 0
+        for customer_id, row, count in heapq.merge(*[self.read_run(run) for run in runs]):
+            if (customer_id, row) != previous:
+                if previous is not None:
+                    yield previous + (total,)
+                previous, total = (customer_id, row), 0
+            total += count
+        if previous is not None:
+            yield previous + (total,)
+
+    def merge(self):
+        """
+        Merge all runs, runs are merged in passes of MAX_FAN_IN files so open files and read buffers stay bounded
+        @return generator of (customer id, host row, count) tuples ordered by customer and host row
+        """
+        while len(self.runs) > MAX_FAN_IN:
+            runs, self.runs = self.runs[:MAX_FAN_IN], self.runs[MAX_FAN_IN:]
+            self.runs.append(self.write_run(self.merge_runs(runs)))
+            for run in runs:
+                os.remove(run)
+        return self.merge_runs(self.runs)
+
+    def calculate(self):
+        """
+        Calculate the largest host and data center fractions and available hosts over the merged runs
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        max_host = {"fraction": 0, "customer_id": None}
+        max_center = {"fraction": 0, "customer_id": None}
+        center_slots = [0] * len(self.center_ids)
+        for row, slots in enumerate(self.host_slots):
+            center_slots[self.host_centers[row]] += slots
+
+        def largest_center(customer_id, number_of_instance):
+            for center, count in number_of_instance.iteritems():
+                if center_slots[center]:
+                    fraction = count / center_slots[center]
+                    if is_larger(fraction, customer_id, max_center):
+                        max_center.update(fraction=fraction, customer_id=customer_id)
+
+        customer, number_of_instance = None, {}
+        try:
+            for customer_id, row, count in self.merge():
+                if customer_id != customer:
+                    largest_center(customer, number_of_instance)
+                    customer, number_of_instance = customer_id, {}
+                center = self.host_centers[row]
+                number_of_instance[center] = number_of_instance.get(center, 0) + count
+                slots = self.host_slots[row]
+                if slots and is_larger(count / slots, customer_id, max_host):
+                    max_host = {"fraction": count / slots, "customer_id": customer_id}
+            largest_center(customer, number_of_instance)
+        finally:
+            self.clear()
+
+        # Available hosts are listed by data center and then by file order like the other engines do
+        available_hosts = [[] for _ in self.center_ids]
+        for row, host_id in enumerate(self.host_ids):
+            if self.host_slots[row] - self.host_instances[row] > 0:
+                available_hosts[self.host_centers[row]].append(host_id)
+        return {"host": max_host, "center": max_center,
+                "available_hosts": [host_id for hosts in available_hosts for host_id in hosts]}
+
+    def clear(self):
+        """
+        Remove run files
+        @return void
+        """
+        if getattr(self, "run_directory", None) is not None:
+            shutil.rmtree(self.run_directory, ignore_errors=True)
+        self.runs, self.number_of_runs, self.run_directory = [], 0, None
+
+    def __del__(self):
+        """
+        Remove run files of an engine which, is discarded without being calculated
+        @return void
+        """
+        self.clear()
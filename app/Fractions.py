@@ -0,0 +1,47 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+def is_larger(fraction, customer_id, record):
+    """
+    Compare a fraction with the recorded maximum one, equal fractions are resolved by the smaller customer id so
+    every engine picks the same customer
+    @param fraction new fraction
+    @param customer_id customer who, owns the new fraction
+    @param record dictionary including recorded "fraction" and "customer_id"
+    @return Boolean True or False
+    """
+    if fraction != record["fraction"]:
+        return fraction > record["fraction"]
+    return record["customer_id"] is not None and int(customer_id) < int(record["customer_id"])
@@ -0,0 +1,330 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import heapq
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class FreeSlotIndex(object):
+    """
+    FreeSlotIndex buckets hosts which, have an empty slot by their number of free slots in every data center and
+    places new instances on them. Every bucket is a heap of (order, host id) so the first host of a bucket is found
+    in O(log n); a host moves to another bucket when an instance is placed or released and its old entry is dropped
+    when it reaches the top of the old bucket, heaps are rebuilt when stale entries are the majority. Hosts are
+    indexed under their data center and under None for placements which, may go to any data center.
+
+    Strategies:
+     first_fit: the first host in order of hosts file
+     best_fit: a host with the least free slots, fills hosts up before starting empty ones
+     spread: a host with the most free slots
+    A customer may be given for anti-affinity, hosts which, already have the least instances of the customer are
+    preferred before the strategy is applied.
+    """
+
+    strategies = ("first_fit", "best_fit", "spread")
+
+    def __init__(self):
+        """
+        Constructor of FreeSlotIndex class
+        @return instance
+        """
+        super(FreeSlotIndex, self).__init__()
+
+        # host id => [free slots, data center id, order]
+        self.hosts = {}
+        # host id => dictionary of customer id => number of instances
+        self.customers = {}
+        # data center id or None => dictionary of free slots => heap of (order, host id)
+        self.buckets = {None: {}}
+        # data center id or None => heap of (order, host id) of all hosts which, have a free slot
+        self.first = {None: []}
+        # Number of entries in buckets and first heaps, stale ones included
+        self.entries = 0
+        # customer id => data center id or None => dictionary of number of instances of the customer => number of
+        # hosts which, have a free slot and that many instances of it, hosts without instances of it are not counted
+        self.levels = {}
+
+    @classmethod
+    def from_data_centers(cls, data_centers):
+        """
+        Build index from data centers structure created by Statistics.fill_data_centers
+        @param data_centers
+        @return FreeSlotIndex
+        """
+        index = cls()
+        for center in data_centers:
+            for host in data_centers[center]:
+                index.add_host(
+                    host, int(data_centers[center][host]["number_of_slots"]), center,
+                    [instance["customer_id"] for instance in data_centers[center][host]["instances"]])
+        return index
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Build index from a ClusterModel
+        @param model
+        @return FreeSlotIndex
+        """
+        index = cls()
+        for host in xrange(len(model.host_ids)):
+            index.add_host(
+                model.host_ids[host], model.host_slots[host], model.center_ids[model.host_centers[host]],
+                [model.instance_customers[instance]
+                 for instance in model.host_instances[model.host_offsets[host]:model.host_offsets[host + 1]]])
+        return index
+
+    def add_host(self, host_id, number_of_slots, center_id, customers=()):
+        """
+        Add a host to the index
+        @param host_id
+        @param number_of_slots
+        @param center_id data center of the host
+        @param customers customer id of every instance on the host
+        @return void
+        """
+        counts = {}
+        for customer_id in customers:
+            counts[customer_id] = counts.get(customer_id, 0) + 1
+        self.hosts[host_id] = [number_of_slots - len(customers), center_id, len(self.hosts)]
+        self.customers[host_id] = counts
+        self.buckets.setdefault(center_id, {})
+        self.first.setdefault(center_id, [])
+        self.level(host_id, 1)
+        self.push(host_id, True)
+
+    def push(self, host_id, first=False):
+        """
+        Push host into the bucket of its free slots
+        @param host_id
+        @param first push host into the heap of all free hosts too, it is needed when host gets its first free slot
+        @return void
+        """
+        free, center_id, order = self.hosts[host_id]
+        if free > 0:
+            for key in (center_id, None):
+                heapq.heappush(self.buckets[key].setdefault(free, []), (order, host_id))
+                self.entries += 1
+                if first:
+                    heapq.heappush(self.first[key], (order, host_id))
+                    self.entries += 1
+        # Drop stale entries when they are the majority of the heaps
+        if self.entries > 8 * len(self.hosts) + 16:
+            self.compact()
+
+    def compact(self):
+        """
+        Rebuild buckets and first heaps from hosts which, have a free slot
+        @return void
+        """
+        self.buckets = dict((key, {}) for key in self.buckets)
+        self.first = dict((key, []) for key in self.first)
+        self.entries = 0
+        for host_id, (free, center_id, order) in self.hosts.iteritems():
+            if free > 0:
+                for key in (center_id, None):
+                    self.buckets[key].setdefault(free, []).append((order, host_id))
+                    self.first[key].append((order, host_id))
+                    self.entries += 2
+        for heap in [self.first[key] for key in self.first] + [
+                heap for buckets in self.buckets.itervalues() for heap in buckets.itervalues()]:
+            heapq.heapify(heap)
+
+    def level(self, host_id, change):
+        """
+        Count a host in or out of the levels of its customers, a host is only counted while it has a free slot
+        @param host_id
+        @param change 1 to count the host in, -1 to count it out
+        @return void
+        """
+        free, center_id, order = self.hosts[host_id]
+        if free <= 0:
+            return
+        for customer_id, count in self.customers[host_id].iteritems():
+            levels = self.levels.setdefault(customer_id, {})
+            for key in (center_id, None):
+                counts = levels.setdefault(key, {})
+                counts[count] = counts.get(count, 0) + change
+                if not counts[count]:
+                    del counts[count]
+
+    def free_slots(self, center_id=None):
+        """
+        Count free slots
+        @param center_id data center to count, all of them are counted if it is not given
+        @return number of free slots
+        """
+        return sum(max(free, 0) for free, center, order in self.hosts.itervalues()
+                   if center_id is None or center == center_id)
+
+    def candidate(self, heap, free, customer_id, limit, held=None):
+        """
+        Find first host of a heap which, has at most limit instances of a customer, stale entries are dropped
+        @param heap heap of (order, host id)
+        @param free number of free slots hosts of the heap have to have, any number above 0 if it is None
+        @param customer_id
+        @param limit maximum number of instances of the customer
+        @param held list to keep skipped (heap, entry) pairs out of heaps until they are restored, skipped entries
+         are pushed back at once if it is not given
+        @return host id or None
+        """
+        skipped = []
+        found = None
+        while heap:
+            order, host_id = heap[0]
+            host_free = self.hosts[host_id][0]
+            if host_free <= 0 or (free is not None and host_free != free):
+                heapq.heappop(heap)
+                self.entries -= 1
+            elif customer_id is not None and self.customers[host_id].get(customer_id, 0) > limit:
+                skipped.append(heapq.heappop(heap))
+            else:
+                found = host_id
+                break
+        if held is None:
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+        else:
+            held.extend((heap, entry) for entry in skipped)
+        return found
+
+    @staticmethod
+    def restore(held):
+        """
+        Push entries which, are kept out by candidate back into their heaps
+        @param held list of (heap, entry) pairs
+        @return void
+        """
+        for heap, entry in held:
+            heapq.heappush(heap, entry)
+        del held[:]
+
+    def select(self, strategy="first_fit", customer_id=None, center_id=None, limit=0, held=None):
+        """
+        Select a host by strategy without placing anything on it
+        @param strategy first_fit, best_fit or spread
+        @param customer_id customer whose instances are kept apart
+        @param center_id data center to place in, all of them are searched if it is not given
+        @param limit maximum number of instances the customer may already have on the host
+        @param held see candidate
+        @return host id or None if there is no such host
+        """
+        if strategy not in self.strategies:
+            raise ValueError("Unknown placement strategy %s." % strategy)
+        if center_id not in self.first:
+            return None
+        if strategy == "first_fit":
+            return self.candidate(self.first[center_id], None, customer_id, limit, held)
+
+        buckets = self.buckets[center_id]
+        for free in sorted(buckets, reverse=(strategy == "spread")):
+            host_id = self.candidate(buckets[free], free, customer_id, limit, held)
+            # Buckets which, have only stale entries left are removed not to be sorted again
+            if not buckets[free]:
+                del buckets[free]
+            if host_id is not None:
+                return host_id
+        return None
+
+    def place(self, customer_id=None, strategy="first_fit", center_id=None, held=None):
+        """
+        Place an instance on a host selected by strategy
+        @param customer_id owner of the instance, the instances of a customer are kept apart if it is given
+        @param strategy first_fit, best_fit or spread
+        @param center_id data center to place in, all of them are searched if it is not given
+        @param held see candidate
+        @return host id or None if there is no free slot
+        """
+        host_id = self.select(strategy, customer_id, center_id, 0, held)
+        if host_id is None and customer_id is not None:
+            if held:
+                self.restore(held)
+            # Every free host has the customer, take the hosts which, have the least instances of it
+            for limit in sorted(self.levels.get(customer_id, {}).get(center_id, {})):
+                host_id = self.select(strategy, customer_id, center_id, limit)
+                if host_id is not None:
+                    break
+        if host_id is not None:
+            self.assign(host_id, customer_id, 1)
+        return host_id
+
+    def place_many(self, number_of_instances, customer_id=None, strategy="first_fit", center_id=None):
+        """
+        Place a batch of instances of a customer
+        @param number_of_instances
+        @param customer_id owner of the instances
+        @param strategy first_fit, best_fit or spread
+        @param center_id data center to place in, all of them are searched if it is not given
+        @return list of host ids, it is shorter than number_of_instances if free slots run out
+        """
+        hosts = []
+        # Hosts of the customer are kept out of the heaps during the batch instead of being skipped again for every
+        # instance of it
+        held = []
+        try:
+            for _ in xrange(number_of_instances):
+                host_id = self.place(customer_id, strategy, center_id, held)
+                if host_id is None:
+                    break
+                hosts.append(host_id)
+        finally:
+            self.restore(held)
+        return hosts
+
+    def release(self, host_id, customer_id=None):
+        """
+        Release a slot of a host when an instance is removed from it
+        @param host_id
+        @param customer_id owner of the removed instance
+        @return void
+        """
+        self.assign(host_id, customer_id, -1)
+
+    def assign(self, host_id, customer_id, change):
+        """
+        Change number of used slots of a host and move it into its new bucket
+        @param host_id
+        @param customer_id
+        @param change 1 when a slot is taken, -1 when it is released
+        @return void
+        """
+        counts = self.customers[host_id]
+        if customer_id is not None and counts.get(customer_id, 0) + change < 0:
+            raise ValueError("Customer %s has no instance on host %s." % (customer_id, host_id))
+        self.level(host_id, -1)
+        self.hosts[host_id][0] -= change
+        if customer_id is not None:
+            counts[customer_id] = counts.get(customer_id, 0) + change
+            if not counts[customer_id]:
+                del counts[customer_id]
+        self.level(host_id, 1)
+        self.push(host_id, self.hosts[host_id][0] == 1 and change < 0)
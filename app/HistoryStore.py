@@ -0,0 +1,333 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import os
+import struct
+
+from app.Fractions import is_larger
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# A record of a run for the whole fleet (data center id -1) or a data center: time, data center id, customer and
+# fraction of HostClustering, customer and fraction of DatacentreClustering, free slots and free hosts. Customer id
+# is -1 if there is no customer
+RECORD = struct.Struct("<dqqdqdqq")
+
+# A rollup of the records of a data center in a bucket of time: start of bucket, data center id, number of records,
+# then minimum, maximum and sum of HostClustering fraction, DatacentreClustering fraction and free slots
+ROLLUP = struct.Struct("<qqq9d")
+
+# Values which, are rolled up and their positions in a record
+FIELDS = {"host": 3, "center": 5, "free_slots": 6}
+ORDER = ("host", "center", "free_slots")
+
+# Seconds of hourly and daily buckets, buckets start at multiples of them in UTC
+HOUR = 3600
+DAY = 86400
+
+# Data center id of the records of the whole fleet
+FLEET = -1
+
+
+class Segment(object):
+    """
+    Segment is an append only file of fixed width records which, are sorted by their first field, time. A record is
+    found by binary search over its position, so the file is its own time index.
+    """
+
+    def __init__(self, file_name, record):
+        """
+        Constructor of Segment class, a record which, was written partially is dropped
+        @param file_name path of the file, it is created if it does not exist
+        @param record struct.Struct of a record
+        @return instance
+        """
+        super(Segment, self).__init__()
+        self.record = record
+        self.h_file = open(file_name, "a+b")
+        size = os.fstat(self.h_file.fileno()).st_size
+        if size % record.size:
+            self.h_file.truncate(size - size % record.size)
+        self.length = size // record.size
+
+    def __len__(self):
+        """
+        Number of records
+        @return integer
+        """
+        return self.length
+
+    def get(self, position):
+        """
+        Read a record
+        @param position position of the record
+        @return tuple of fields
+        """
+        self.h_file.seek(position * self.record.size)
+        return self.record.unpack(self.h_file.read(self.record.size))
+
+    def bisect(self, time):
+        """
+        Find position of the first record which, is not older than given time
+        @param time seconds since epoch
+        @return position, number of records if there is no such record
+        """
+        low, high = 0, self.length
+        while low < high:
+            middle = (low + high) // 2
+            if self.get(middle)[0] < time:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read(self, start=None, end=None):
+        """
+        Read records of a time range in a single read
+        @param start first second of the range, range starts with the first record if it is None
+        @param end second after the range, range ends with the last record if it is None
+        @return list of tuples of fields
+        """
+        first = 0 if start is None else self.bisect(start)
+        last = self.length if end is None else self.bisect(end)
+        if first >= last:
+            return []
+        self.h_file.seek(first * self.record.size)
+        content = self.h_file.read((last - first) * self.record.size)
+        return [self.record.unpack_from(content, offset) for offset in xrange(0, len(content), self.record.size)]
+
+    def last(self):
+        """
+        Read the newest record
+        @return tuple of fields or None if there is no record
+        """
+        return self.get(self.length - 1) if self.length else None
+
+    def append(self, records):
+        """
+        Append records in a single write
+        @param records list of tuples of fields
+        @return void
+        """
+        if records:
+            self.h_file.seek(0, os.SEEK_END)
+            self.h_file.write("".join(self.record.pack(*fields) for fields in records))
+            self.h_file.flush()
+            self.length += len(records)
+
+    def close(self):
+        """
+        Close the file
+        @return void
+        """
+        self.h_file.close()
+
+
+class HistoryStore(object):
+    """
+    HistoryStore keeps statistics of every run in a directory: raw records of the fleet and its data centers in
+    records.dat and hourly and daily minimum, maximum and mean of their fractions and free slots in hourly.dat and
+    daily.dat. Buckets which, are still open are kept in memory and written once a newer bucket starts. A time range
+    query reads whole days from daily rollups, the hours around them from hourly rollups and only the minutes at
+    the edges from raw records, so 30 days are answered by reading a few hundred records.
+    """
+
+    def __init__(self, directory):
+        """
+        Constructor of HistoryStore class, buckets which, were open when the store was closed are rebuilt from raw
+        records
+        @param directory directory of the files, it is created if it does not exist
+        @return instance
+        """
+        super(HistoryStore, self).__init__()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.records = Segment(os.path.join(directory, "records.dat"), RECORD)
+        # Rollups as (width of bucket, segment, start of open bucket, data center id => open rollup)
+        self.rollups = []
+        since = []
+        for width, file_name in ((HOUR, "hourly.dat"), (DAY, "daily.dat")):
+            segment = Segment(os.path.join(directory, file_name), ROLLUP)
+            last = segment.last()
+            since.append(0 if last is None else last[0] + width)
+            self.rollups.append([width, segment, None, {}])
+        for record in self.records.read(min(since)):
+            self.roll(record, since)
+
+    @staticmethod
+    def rows(model):
+        """
+        Calculate records of the fleet and every data center of a model without time
+        @param model ClusterModel
+        @return list of tuples of fields of RECORD after time
+        """
+        rows = []
+        max_host = {"fraction": 0, "customer_id": None}
+        max_center = {"fraction": 0, "customer_id": None}
+        free_slots = free_hosts = 0
+        for center in xrange(len(model.center_ids)):
+            partial = model.calculate_hosts(model.center_hosts[model.center_offsets[center]:
+                                                               model.center_offsets[center + 1]])
+            center_record = model.largest_center(partial["number_of_instance"], partial["number_of_slots"])
+            center_free_slots = partial["number_of_slots"] - sum(partial["number_of_instance"].itervalues())
+            rows.append(HistoryStore.row(model.center_ids[center], partial["host"], center_record, center_free_slots,
+                                         len(partial["available_hosts"])))
+            if is_larger(partial["host"]["fraction"], partial["host"]["customer_id"], max_host):
+                max_host = partial["host"]
+            if is_larger(center_record["fraction"], center_record["customer_id"], max_center):
+                max_center = center_record
+            free_slots += center_free_slots
+            free_hosts += len(partial["available_hosts"])
+        return [HistoryStore.row(FLEET, max_host, max_center, free_slots, free_hosts)] + rows
+
+    @staticmethod
+    def row(center_id, max_host, max_center, free_slots, free_hosts):
+        """
+        Make fields of a record without time
+        @param center_id data center id, FLEET for the whole fleet
+        @param max_host dictionary including "customer_id" and "fraction" of largest host fraction
+        @param max_center dictionary including "customer_id" and "fraction" of largest data center fraction
+        @param free_slots number of empty slots
+        @param free_hosts number of hosts which, have an empty slot
+        @return tuple of fields
+        """
+        return (center_id,
+                -1 if max_host["customer_id"] is None else max_host["customer_id"], max_host["fraction"],
+                -1 if max_center["customer_id"] is None else max_center["customer_id"], max_center["fraction"],
+                free_slots, free_hosts)
+
+    def append(self, time, rows):
+        """
+        Append records of a run
+        @param time seconds since epoch of the run, it may not be older than the last run
+        @param rows list of fields without time, see rows
+        @return void
+        """
+        last = self.records.last()
+        if last is not None and time < last[0]:
+            raise ValueError("Run of %s is older than the last run of %s." % (time, last[0]))
+        records = [(time,) + tuple(fields) for fields in rows]
+        self.records.append(records)
+        for record in records:
+            self.roll(record)
+
+    def roll(self, record, since=(0, 0)):
+        """
+        Add a record into its open buckets, open buckets are written when a newer bucket starts
+        @param record tuple of fields of RECORD
+        @param since times before which, records are already rolled up, one for each of hourly and daily rollups
+        @return void
+        """
+        for rollup, rolled in zip(self.rollups, since):
+            if record[0] < rolled:
+                continue
+            width, segment, current, buckets = rollup
+            start = int(record[0] // width * width)
+            if current is not None and start > current:
+                segment.append([bucket for center_id, bucket in sorted(buckets.iteritems())])
+                buckets.clear()
+            rollup[2] = start
+            bucket = buckets.get(record[1])
+            if bucket is None:
+                bucket = buckets[record[1]] = [start, record[1], 0] + [value for name in ORDER for value in (
+                    record[FIELDS[name]], record[FIELDS[name]], 0)]
+            bucket[2] += 1
+            for index, name in enumerate(ORDER):
+                value, position = record[FIELDS[name]], 3 + 3 * index
+                bucket[position] = min(bucket[position], value)
+                bucket[position + 1] = max(bucket[position + 1], value)
+                bucket[position + 2] += value
+
+    def buckets(self, rollup, center_id, start, end):
+        """
+        Read rollups of a data center in a time range, open bucket included
+        @param rollup position of hourly or daily rollups in self.rollups
+        @param center_id
+        @param start first second of the range, it is a start of a bucket
+        @param end second after the range, it is a start of a bucket
+        @return list of tuples of fields of ROLLUP
+        """
+        width, segment, current, buckets = self.rollups[rollup]
+        found = [bucket for bucket in segment.read(start, end) if bucket[1] == center_id]
+        if current is not None and start <= current < end and center_id in buckets:
+            found.append(tuple(buckets[center_id]))
+        return found
+
+    def query(self, center_id, start, end, field="center", aggregate="max"):
+        """
+        Aggregate a value of a data center or the fleet over a time range, etc: largest DatacentreClustering of data
+        center 2 over the last 30 days is query(2, time.time() - 30 * 86400, time.time())
+        @param center_id data center id, FLEET for the whole fleet
+        @param start first second of the range
+        @param end second after the range
+        @param field "host", "center" or "free_slots"
+        @param aggregate "min", "max" or "mean"
+        @return value or None if there is no record in the range
+        """
+        if field not in FIELDS or aggregate not in ("min", "max", "mean"):
+            raise ValueError("Unknown field or aggregate: %s, %s" % (field, aggregate))
+        # Edges which, are not whole hours come from raw records, whole hours around whole days from hourly rollups
+        first_hour, last_hour = -(-start // HOUR) * HOUR, end // HOUR * HOUR
+        first_day, last_day = -(-first_hour // DAY) * DAY, last_hour // DAY * DAY
+        if first_hour >= last_hour:
+            first_hour = last_hour = end
+        if first_day >= last_day:
+            first_day = last_day = last_hour
+
+        # Every piece is reduced into (count, minimum, maximum, sum)
+        pieces = []
+        position = FIELDS[field]
+        for low, high in ((start, first_hour), (last_hour, end)):
+            values = [record[position] for record in self.records.read(low, high) if record[1] == center_id]
+            if values:
+                pieces.append((len(values), min(values), max(values), sum(values)))
+        index = 3 + 3 * ORDER.index(field)
+        for rollup, low, high in ((0, first_hour, first_day), (0, last_day, last_hour), (1, first_day, last_day)):
+            for bucket in self.buckets(rollup, center_id, low, high):
+                pieces.append((bucket[2], bucket[index], bucket[index + 1], bucket[index + 2]))
+
+        if not pieces:
+            return None
+        if aggregate == "min":
+            return min(piece[1] for piece in pieces)
+        if aggregate == "max":
+            return max(piece[2] for piece in pieces)
+        return sum(piece[3] for piece in pieces) / sum(piece[0] for piece in pieces)
+
+    def close(self):
+        """
+        Close the files, open buckets are rebuilt from raw records when the store is opened again
+        @return void
+        """
+        for rollup in self.rollups:
+            rollup[1].close()
+        self.records.close()
@@ -0,0 +1,430 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import heapq
+import re
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class CountHeap(object):
+    """
+    CountHeap keeps the largest count of a group of customers. Entries are never updated in place, a change pushes
+    a new entry and stale entries are dropped when they reach the top, so every change costs O(log n).
+    """
+
+    def __init__(self):
+        """
+        Constructor of CountHeap class
+        @return instance
+        """
+        super(CountHeap, self).__init__()
+        self.heap = []
+        self.counts = {}
+
+    def set(self, customer_id, count):
+        """
+        Set count of a customer
+        @param customer_id customer whose count is changed
+        @param count new count, customer is removed if it is 0
+        @return void
+        """
+        if count:
+            self.counts[customer_id] = count
+            heapq.heappush(self.heap, (-count, customer_id))
+        else:
+            self.counts.pop(customer_id, None)
+        # Drop stale entries when they are the majority of the heap
+        if len(self.heap) > 2 * len(self.counts) + 16:
+            self.heap = [(-count, customer_id) for customer_id, count in self.counts.iteritems()]
+            heapq.heapify(self.heap)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """
+        Create a heap from counts at once instead of pushing them one by one
+        @param counts dictionary of customer id => count
+        @return CountHeap
+        """
+        count_heap = cls()
+        count_heap.counts = counts
+        count_heap.heap = [(-count, customer_id) for customer_id, count in counts.iteritems()]
+        heapq.heapify(count_heap.heap)
+        return count_heap
+
+    def get(self, customer_id):
+        """
+        Get count of a customer
+        @param customer_id
+        @return count
+        """
+        return self.counts.get(customer_id, 0)
+
+    def top(self):
+        """
+        Find the largest count, equal counts are resolved by the smaller customer id
+        @return tuple of (count, customer_id) or (0, None) if it is empty
+        """
+        while self.heap:
+            count, customer_id = self.heap[0]
+            if self.counts.get(customer_id) == -count:
+                return -count, customer_id
+            heapq.heappop(self.heap)
+        return 0, None
+
+
+class IncrementalEngine(object):
+    """
+    IncrementalEngine keeps per (customer, host) and per (customer, data center) counters and free slots in memory
+    and updates them by placement and eviction events instead of calculating statistics from scratch.
+    Events are applied in O(log n), HostClustering and DatacentreClustering are answered from heaps and
+    AvailableHosts from the set of hosts which, have an empty slot.
+    """
+
+    # Patterns of the lines of an event file
+    events = {
+        "add": re.compile("^add,([0-9]+),([0-9]+),([0-9]+)\\r?$"),
+        "remove": re.compile("^remove,([0-9]+)\\r?$"),
+        "move": re.compile("^move,([0-9]+),([0-9]+)\\r?$"),
+        "add_host": re.compile("^add_host,([0-9]+),([0-9]+),([0-9]+)\\r?$"),
+        "remove_host": re.compile("^remove_host,([0-9]+)\\r?$")
+    }
+
+    def __init__(self):
+        """
+        Constructor of IncrementalEngine class
+        @return instance
+        """
+        super(IncrementalEngine, self).__init__()
+
+        # host id => [number of slots, data center id, number of instances, order]
+        self.hosts = {}
+        # data center id => [number of slots, order]
+        self.centers = {}
+        # instance id => (customer id, host id)
+        self.instances = {}
+
+        # Counters of customers on every host and in every data center
+        self.host_counts = {}
+        self.center_counts = {}
+
+        # host id => (fraction, customer id) of the largest fraction on the host and the heap of all hosts' largest
+        # fractions, keys of the heap are (-fraction, customer id, host id)
+        self.host_best = {}
+        self.host_heap = []
+
+        # Hosts which, have at least one empty slot
+        self.free_hosts = set()
+
+        # Order of next host and data center, hosts are listed in order of their addition
+        self.order = 0
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Create an engine from a ClusterModel
+        @param model ClusterModel
+        @return IncrementalEngine
+        """
+        engine = cls()
+        for host in xrange(len(model.host_ids)):
+            engine.add_host(model.host_ids[host], model.host_slots[host], model.center_ids[model.host_centers[host]])
+
+        # Counters are filled at once and heaps are built from them, it is cheaper than adding instances one by one
+        host_counts = dict((host_id, {}) for host_id in engine.hosts)
+        center_counts = dict((center_id, {}) for center_id in engine.centers)
+        for instance in xrange(len(model.instance_ids)):
+            customer_id = model.instance_customers[instance]
+            host_id = model.host_ids[model.instance_hosts[instance]]
+            engine.instances[model.instance_ids[instance]] = (customer_id, host_id)
+            counts = host_counts[host_id]
+            counts[customer_id] = counts.get(customer_id, 0) + 1
+            counts = center_counts[engine.hosts[host_id][1]]
+            counts[customer_id] = counts.get(customer_id, 0) + 1
+        for center_id, counts in center_counts.iteritems():
+            engine.center_counts[center_id] = CountHeap.from_counts(counts)
+        for host_id, counts in host_counts.iteritems():
+            engine.host_counts[host_id] = CountHeap.from_counts(counts)
+            engine.hosts[host_id][2] = sum(counts.itervalues())
+            engine.update_host(host_id)
+        return engine
+
+    def add_host(self, host_id, number_of_slots, center_id):
+        """
+        Add an empty host
+        @param host_id
+        @param number_of_slots
+        @param center_id data center of the host
+        @return void
+        """
+        if host_id in self.hosts:
+            raise ValueError("Host %s already exists." % host_id)
+        if center_id not in self.centers:
+            self.centers[center_id] = [0, self.order]
+            self.center_counts[center_id] = CountHeap()
+        self.order += 1
+        self.hosts[host_id] = [number_of_slots, center_id, 0, self.order]
+        self.host_counts[host_id] = CountHeap()
+        self.centers[center_id][0] += number_of_slots
+        self.update_host(host_id)
+
+    def remove_host(self, host_id):
+        """
+        Remove a host, its instances have to be removed or moved before
+        @param host_id
+        @return void
+        """
+        number_of_slots, center_id, used, order = self.host(host_id)
+        if used:
+            raise ValueError("Host %s still has %d instance(s)." % (host_id, used))
+        del self.hosts[host_id]
+        del self.host_counts[host_id]
+        self.host_best.pop(host_id, None)
+        self.free_hosts.discard(host_id)
+        self.centers[center_id][0] -= number_of_slots
+
+    def add(self, instance_id, customer_id, host_id):
+        """
+        Place a new instance on a host
+        @param instance_id
+        @param customer_id
+        @param host_id
+        @return void
+        """
+        if instance_id in self.instances:
+            raise ValueError("Instance %s already exists." % instance_id)
+        self.host(host_id)
+        self.instances[instance_id] = (customer_id, host_id)
+        self.count(customer_id, host_id, 1)
+
+    def remove(self, instance_id):
+        """
+        Evict an instance
+        @param instance_id
+        @return void
+        """
+        customer_id, host_id = self.instance(instance_id)
+        del self.instances[instance_id]
+        self.count(customer_id, host_id, -1)
+
+    def move(self, instance_id, host_id):
+        """
+        Move an instance to another host
+        @param instance_id
+        @param host_id target host
+        @return void
+        """
+        customer_id, previous_host_id = self.instance(instance_id)
+        self.host(host_id)
+        self.instances[instance_id] = (customer_id, host_id)
+        self.count(customer_id, previous_host_id, -1)
+        self.count(customer_id, host_id, 1)
+
+    def move_many(self, moves):
+        """
+        Move many instances at once, counters of a customer on a host or data center are changed once for all of its
+        moved instances, so moving a whole host costs a change per customer instead of a change per instance
+        @param moves iterable of (instance id, target host id)
+        @return void
+        """
+        host_changes, center_changes, used_changes = {}, {}, {}
+        hosts, instances = self.hosts, self.instances
+        for instance_id, host_id in moves:
+            customer_id, previous_host_id = self.instance(instance_id)
+            if previous_host_id == host_id:
+                continue
+            center_id, previous_center_id = self.host(host_id)[1], hosts[previous_host_id][1]
+            instances[instance_id] = (customer_id, host_id)
+            key = (previous_host_id, customer_id)
+            host_changes[key] = host_changes.get(key, 0) - 1
+            key = (host_id, customer_id)
+            host_changes[key] = host_changes.get(key, 0) + 1
+            if center_id != previous_center_id:
+                key = (previous_center_id, customer_id)
+                center_changes[key] = center_changes.get(key, 0) - 1
+                key = (center_id, customer_id)
+                center_changes[key] = center_changes.get(key, 0) + 1
+            used_changes[previous_host_id] = used_changes.get(previous_host_id, 0) - 1
+            used_changes[host_id] = used_changes.get(host_id, 0) + 1
+        for (host_id, customer_id), change in host_changes.iteritems():
+            if change:
+                host_counts = self.host_counts[host_id]
+                host_counts.set(customer_id, host_counts.get(customer_id) + change)
+        for (center_id, customer_id), change in center_changes.iteritems():
+            if change:
+                center_counts = self.center_counts[center_id]
+                center_counts.set(customer_id, center_counts.get(customer_id) + change)
+        for host_id, change in used_changes.iteritems():
+            self.hosts[host_id][2] += change
+            self.update_host(host_id)
+
+    def host(self, host_id):
+        """
+        Get a host
+        @param host_id
+        @return list of [number of slots, data center id, number of instances, order]
+        """
+        try:
+            return self.hosts[host_id]
+        except KeyError:
+            raise KeyError("There is no host %s." % host_id)
+
+    def instance(self, instance_id):
+        """
+        Get an instance
+        @param instance_id
+        @return tuple of (customer id, host id)
+        """
+        try:
+            return self.instances[instance_id]
+        except KeyError:
+            raise KeyError("There is no instance %s." % instance_id)
+
+    def count(self, customer_id, host_id, change):
+        """
+        Change counters of a customer on a host and its data center
+        @param customer_id
+        @param host_id
+        @param change 1 or -1
+        @return void
+        """
+        host = self.hosts[host_id]
+        host[2] += change
+        host_counts = self.host_counts[host_id]
+        host_counts.set(customer_id, host_counts.get(customer_id) + change)
+        center_counts = self.center_counts[host[1]]
+        center_counts.set(customer_id, center_counts.get(customer_id) + change)
+        self.update_host(host_id)
+
+    def update_host(self, host_id):
+        """
+        Update free hosts and the largest fraction of a host after it is changed
+        @param host_id
+        @return void
+        """
+        number_of_slots, center_id, used, order = self.hosts[host_id]
+        if number_of_slots - used > 0:
+            self.free_hosts.add(host_id)
+        else:
+            self.free_hosts.discard(host_id)
+
+        count, customer_id = self.host_counts[host_id].top()
+        best = (count / number_of_slots, customer_id) if count and number_of_slots else None
+        if best != self.host_best.get(host_id):
+            if best is None:
+                del self.host_best[host_id]
+            else:
+                self.host_best[host_id] = best
+                heapq.heappush(self.host_heap, (-best[0], best[1], host_id))
+        # Drop stale entries when they are the majority of the heap
+        if len(self.host_heap) > 2 * len(self.host_best) + 16:
+            self.host_heap = [(-fraction, customer, host) for host, (fraction, customer) in self.host_best.iteritems()]
+            heapq.heapify(self.host_heap)
+
+    def host_clustering(self):
+        """
+        Find customer with the largest fraction of a single host
+        @return dictionary including "fraction" and "customer_id"
+        """
+        while self.host_heap:
+            fraction, customer_id, host_id = self.host_heap[0]
+            if self.host_best.get(host_id) == (-fraction, customer_id):
+                return {"fraction": -fraction, "customer_id": customer_id}
+            heapq.heappop(self.host_heap)
+        return {"fraction": 0, "customer_id": None}
+
+    def center_clustering(self):
+        """
+        Find customer with the largest fraction of a single data center
+        @return dictionary including "fraction" and "customer_id"
+        """
+        best = (0, None)
+        for center_id, (number_of_slots, order) in self.centers.iteritems():
+            count, customer_id = self.center_counts[center_id].top()
+            if count and number_of_slots:
+                fraction = count / number_of_slots
+                if fraction > best[0] or (fraction == best[0] and customer_id < best[1]):
+                    best = (fraction, customer_id)
+        return {"fraction": best[0], "customer_id": best[1]}
+
+    def available_hosts(self):
+        """
+        List hosts which, have at least one empty slot in order of data centers and hosts
+        @return list of host ids
+        """
+        return sorted(
+            self.free_hosts,
+            key=lambda host_id: (self.centers[self.hosts[host_id][1]][1], self.hosts[host_id][3]))
+
+    def calculate(self):
+        """
+        Answer all statistics, see ClusterModel.calculate
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        return {
+            "host": self.host_clustering(),
+            "center": self.center_clustering(),
+            "available_hosts": self.available_hosts()
+        }
+
+    def apply(self, line):
+        """
+        Apply a single line of an event file
+        @param line an event, etc: "add,16,8,2" or "move,16,5"
+        @return Boolean False if line is not a known event
+        """
+        name = line.split(",", 1)[0]
+        matched = self.events[name].match(line) if name in self.events else None
+        if matched is None:
+            return False
+        getattr(self, name)(*[int(field) for field in matched.groups()])
+        return True
+
+    def replay(self, event_file, offset=0):
+        """
+        Apply events appended to an event file since given offset. A last line without a line break may still be
+        written, it is left for the next replay
+        @param event_file path of append only event file
+        @param offset byte offset of the first event to apply
+        @return byte offset to continue from
+        """
+        with open(event_file, "rb") as h_file:
+            h_file.seek(offset)
+            for line in h_file:
+                if not line.endswith("\n"):
+                    break
+                if line.strip() and not self.apply(line.rstrip("\r\n")):
+                    raise SyntaxError(
+                        "Event loaded from %s is malformed at byte offset %d: %r" % (event_file, offset, line[:80]),
+                        (event_file, None, offset, line[:80]))
+                offset += len(line)
+        return offset
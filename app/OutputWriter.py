@@ -0,0 +1,224 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import json
+import struct
+import tempfile
+from itertools import islice
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Formats of target file
+TEXT = "text"
+JSON_LINES = "jsonl"
+BINARY = "binary"
+FORMATS = (TEXT, JSON_LINES, BINARY)
+
+# Binary target file starts with MAGIC then HEADER: host customer id, host fraction, data center customer id, data
+# center fraction and number of available hosts, little endian. Available host ids follow as little endian int64s.
+# Customer id is -1 if there is no customer
+MAGIC = "CLSTAT01"
+HEADER = struct.Struct("<qdqdq")
+
+# Number of available hosts formatted at once
+BATCH_SIZE = 8192
+
+# Lines of text format, Statistics.format_content formats them too
+HOST_CLUSTERING = "HostClustering: %(customer_id)s, %(fraction).2f"
+DATACENTRE_CLUSTERING = "DatacentreClustering: %(customer_id)s, %(fraction).2f"
+AVAILABLE_HOSTS = "AvailableHosts: "
+
+
+class OutputWriter(object):
+    """
+    OutputWriter streams a result of an engine into a temporary file next to target file through a large buffer, then
+    renames it over target file, so readers never see a half written file. Available hosts are written in batches
+    instead of being joined into a single string first.
+    """
+
+    def __init__(self, target_file, output_format=TEXT, buffer_size=1024 * 1024):
+        """
+        Constructor of OutputWriter class
+        @param target_file path of the file which, is replaced
+        @param output_format "text" for the three lines of Statistics.format_content, "jsonl" or "binary"
+        @param buffer_size number of bytes buffered before they are written to the temporary file
+        @return instance
+        """
+        super(OutputWriter, self).__init__()
+        if output_format not in FORMATS:
+            raise ValueError("Unknown output format: %s" % output_format)
+        self.target_file = target_file
+        self.output_format = output_format
+        self.buffer_size = buffer_size
+
+    @staticmethod
+    def batches(available_hosts):
+        """
+        Split available hosts into lists of at most BATCH_SIZE host ids
+        @param available_hosts iterable of host ids, it may be a generator
+        @return generator of lists of host ids
+        """
+        iterator = iter(available_hosts)
+        batch = list(islice(iterator, BATCH_SIZE))
+        while batch:
+            yield batch
+            batch = list(islice(iterator, BATCH_SIZE))
+
+    @staticmethod
+    def customer(record):
+        """
+        Customer id of a host or data center record as an integer
+        @param record dictionary including "customer_id" and "fraction"
+        @return customer id, -1 if there is no customer
+        """
+        return -1 if record["customer_id"] is None else int(record["customer_id"])
+
+    def write(self, result):
+        """
+        Write a result into target file at once
+        @param result dictionary which includes "host" and "center" records and "available_hosts" iterable of host ids
+        @return True
+        """
+        if self.output_format == JSON_LINES:
+            return self.replace(self.write_json_lines, result)
+        elif self.output_format == BINARY:
+            return self.replace(self.write_binary, result)
+        return self.replace(self.write_text, result)
+
+    def write_lines(self, lines):
+        """
+        Write lines which, are already formatted into target file at once
+        @param lines iterable of strings without line breaks
+        @return True
+        """
+        return self.replace(self.write_plain, lines)
+
+    def replace(self, write, content):
+        """
+        Write content into a temporary file next to target file and rename it over target file
+        @param write function which, writes content into the temporary file opened to write
+        @param content result or lines which, are passed to write
+        @return True
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(self.target_file))
+        try:
+            with os.fdopen(descriptor, "wb", self.buffer_size) as target:
+                write(target, content)
+            os.chmod(temporary, 0644)
+            os.rename(temporary, self.target_file)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return True
+
+    @staticmethod
+    def write_plain(target, lines):
+        """
+        Write every line followed by a line break
+        @param target file opened to write
+        @param lines see write_lines
+        @return void
+        """
+        for line in lines:
+            target.write("%s\n" % line)
+
+    def write_text(self, target, result):
+        """
+        Write the three lines of Statistics.format_content
+        @param target file opened to write
+        @param result see write
+        @return void
+        """
+        target.write(HOST_CLUSTERING % result["host"] + "\n")
+        target.write(DATACENTRE_CLUSTERING % result["center"] + "\n")
+        target.write(AVAILABLE_HOSTS)
+        separator = ""
+        for batch in self.batches(result["available_hosts"]):
+            target.write(separator)
+            target.write(",".join(str(host) for host in batch))
+            separator = ","
+        target.write("\n")
+
+    def write_json_lines(self, target, result):
+        """
+        Write a JSON object per line: host clustering, data centre clustering, then an object per available host
+        @param target file opened to write
+        @param result see write
+        @return void
+        """
+        for kind, record in (("HostClustering", result["host"]), ("DatacentreClustering", result["center"])):
+            target.write(json.dumps({
+                "type": kind,
+                "customer_id": None if record["customer_id"] is None else int(record["customer_id"]),
+                "fraction": record["fraction"]
+            }, sort_keys=True))
+            target.write("\n")
+        for batch in self.batches(result["available_hosts"]):
+            target.write("".join('{"host_id": %d, "type": "AvailableHost"}\n' % int(host) for host in batch))
+
+    def write_binary(self, target, result):
+        """
+        Write MAGIC, HEADER and available host ids, number of available hosts is patched into the header at the end
+        so available hosts can be streamed without counting them first
+        @param target file opened to write
+        @param result see write
+        @return void
+        """
+        host, center = result["host"], result["center"]
+        target.write(MAGIC)
+        target.write(HEADER.pack(self.customer(host), host["fraction"], self.customer(center), center["fraction"], 0))
+        count = 0
+        for batch in self.batches(result["available_hosts"]):
+            target.write(struct.pack("<%dq" % len(batch), *[int(host_id) for host_id in batch]))
+            count += len(batch)
+        target.seek(len(MAGIC))
+        target.write(HEADER.pack(self.customer(host), host["fraction"], self.customer(center), center["fraction"],
+                                 count))
+
+    @staticmethod
+    def read_binary(file_name):
+        """
+        Read a binary target file back
+        @param file_name path of the file
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        with open(file_name, "rb") as source:
+            if source.read(len(MAGIC)) != MAGIC:
+                raise SyntaxError("%s is not a binary statistics file" % file_name)
+            host, host_fraction, center, center_fraction, count = HEADER.unpack(source.read(HEADER.size))
+            available_hosts = list(struct.unpack("<%dq" % count, source.read(8 * count)))
+        return {
+            "host": {"customer_id": None if host == -1 else host, "fraction": host_fraction},
+            "center": {"customer_id": None if center == -1 else center, "fraction": center_fraction},
+            "available_hosts": available_hosts
+        }
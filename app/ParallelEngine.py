@@ -0,0 +1,153 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import multiprocessing
+
+from app.Fractions import is_larger
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Model which, is calculated by the worker processes. Workers are forked after it is set so they share the columns
+# of the parent process instead of receiving a pickled copy with every shard
+model = None
+
+
+def share_model(cluster_model):
+    """
+    Set the model of a worker process
+    @param cluster_model ClusterModel
+    @return void
+    """
+    global model
+    model = cluster_model
+
+
+def calculate_shard(shard):
+    """
+    Calculate partial values of a shard in a worker process
+    @param shard tuple of (center row, first position, last position) in center_hosts
+    @return tuple of center row and partial values, see ClusterModel.calculate_hosts
+    """
+    center, start, end = shard
+    return center, model.calculate_hosts(model.center_hosts[start:end])
+
+
+class ParallelEngine(object):
+    """
+    ParallelEngine shards a ClusterModel by data center, a large data center is split into ranges of its hosts, and
+    calculates shards in a pool of worker processes. Partial values are merged in the order of shards so the result
+    does not depend on which worker finishes first.
+    """
+
+    def __init__(self, model, workers=0, shard_size=50000):
+        """
+        Constructor of ParallelEngine class
+        @param model ClusterModel to calculate
+        @param workers number of worker processes, number of CPUs is used if it is 0
+        @param shard_size maximum number of hosts in a single shard
+        @return instance
+        """
+        super(ParallelEngine, self).__init__()
+        self.model = model
+        self.workers = workers or multiprocessing.cpu_count()
+        self.shard_size = max(shard_size, 1)
+
+    def shards(self):
+        """
+        Split data centers into shards
+        @return list of (center row, first position, last position) in center_hosts
+        """
+        shards = []
+        for center in xrange(len(self.model.center_ids)):
+            start, end = self.model.center_offsets[center], self.model.center_offsets[center + 1]
+            for position in xrange(start, end, self.shard_size):
+                shards.append((center, position, min(position + self.shard_size, end)))
+        return shards
+
+    def calculate(self):
+        """
+        Calculate the largest host and data center fractions and available hosts, see ClusterModel.calculate
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        shards = self.shards()
+        pool = multiprocessing.Pool(min(self.workers, len(shards)) or 1, initializer=share_model,
+                                    initargs=(self.model,))
+        try:
+            partials = pool.imap(calculate_shard, shards)
+            return self.reduce(partials)
+        finally:
+            pool.terminate()
+
+    def reduce(self, partials):
+        """
+        Merge partial values of shards, shards of a data center follow each other
+        @param partials iterable of (center row, partial values) in order of shards
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        max_host = {"fraction": 0, "customer_id": None}
+        max_center = {"fraction": 0, "customer_id": None}
+        available_hosts = []
+
+        # Totals of the data center whose shards are being merged
+        current = None
+        number_of_instance = {}
+        number_of_slots = 0
+
+        for center, partial in partials:
+            if center != current:
+                max_center = self.merge_center(max_center, number_of_instance, number_of_slots)
+                current, number_of_instance, number_of_slots = center, {}, 0
+
+            if is_larger(partial["host"]["fraction"], partial["host"]["customer_id"], max_host):
+                max_host = partial["host"]
+            available_hosts.extend(partial["available_hosts"])
+            number_of_slots += partial["number_of_slots"]
+            if number_of_instance:
+                for customer_id, count in partial["number_of_instance"].iteritems():
+                    number_of_instance[customer_id] = number_of_instance.get(customer_id, 0) + count
+            else:
+                number_of_instance = partial["number_of_instance"]
+
+        max_center = self.merge_center(max_center, number_of_instance, number_of_slots)
+        return {"host": max_host, "center": max_center, "available_hosts": available_hosts}
+
+    def merge_center(self, max_center, number_of_instance, number_of_slots):
+        """
+        Compare the largest fraction of a merged data center with the recorded one
+        @param max_center recorded largest data center fraction
+        @param number_of_instance dictionary of customer id => number of instances in the data center
+        @param number_of_slots total number of slots in the data center
+        @return dictionary including "fraction" and "customer_id"
+        """
+        center_record = self.model.largest_center(number_of_instance, number_of_slots)
+        if is_larger(center_record["fraction"], center_record["customer_id"], max_center):
+            return center_record
+        return max_center
@@ -0,0 +1,348 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import json
+import time
+import threading
+import traceback
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+from helper.Utilities import Utilities
+from app.ClusterModel import ClusterModel
+from app.VectorEngine import VectorEngine
+from app.Watcher import Watcher
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class QueryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    QueryHandler answers a request by a path of QueryServer.routes and writes the result as JSON
+    """
+    # Connections are kept alive and small responses are not delayed by Nagle's algorithm
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        """
+        Answer a query
+        @return void
+        """
+        self.answer("GET")
+
+    def do_POST(self):
+        """
+        Run an action which, changes the state of the server such as /reload
+        @return void
+        """
+        # Body of a request is not used, it is read so the next request of a kept alive connection starts cleanly
+        length = int(self.headers.getheader("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.answer("POST")
+
+    def answer(self, method):
+        """
+        Answer a request if its path is allowed to be requested by its method
+        @param method "GET" or "POST"
+        @return void
+        """
+        path = urlparse.urlparse(self.path).path.strip("/").split("/")
+        try:
+            allowed = self.server.method(path)
+            if allowed != method:
+                return self.reply(405, json.dumps({"error": "%s is only answered to %s" % (self.path, allowed)}),
+                                  {"Allow": allowed})
+            body = self.server.respond(path)
+        except KeyError:
+            return self.reply(404, json.dumps({"error": "Unknown query %s" % self.path}))
+        except BaseException:
+            Utilities.get_logger().error(traceback.format_exc())
+            return self.reply(500, json.dumps({"error": "Query %s failed" % self.path}))
+        self.reply(200, body)
+
+    def reply(self, status, body, headers=None):
+        """
+        Write a JSON response
+        @param status HTTP status code
+        @param body JSON encoded result
+        @param headers dictionary of additional headers
+        @return void
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).iteritems():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """
+        Requests are not printed, there may be thousands of them per second
+        @return void
+        """
+        pass
+
+
+class QueryServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    QueryServer keeps the model of hosts and instances files loaded and answers queries over HTTP, so tools do not
+    have to start a process and parse Statistics.txt for every question. Every request is answered in its own thread.
+    Results are cached until hosts or instances file changes or /reload is requested.
+
+    Queries:
+        /statistics             lines of Statistics.txt
+        /host                   HostClustering record
+        /center                 DatacentreClustering record
+        /available_hosts        AvailableHosts list
+        /centers/<center id>    largest host and data center records and available hosts of a data center
+        /customers/<customer id> number of instances of a customer per host and per data center
+
+    Actions, they are only answered to POST:
+        /reload                 load files again
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, statistics, address=("127.0.0.1", 8642)):
+        """
+        Constructor of QueryServer class, files are loaded before it starts to listen
+        @param statistics Statistics instance whose files and engine are used
+        @param address tuple of host and port, port 0 picks a free one
+        @return instance
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, address, QueryHandler)
+        self.statistics = statistics
+        self.lock = threading.Lock()
+        # Model and its cached results are replaced together, so a query never mixes two loads
+        self.state = (None, {})
+        self.signatures = None
+        # Name of a query => (number of ids which, follow the name, query)
+        self.routes = {
+            "statistics": (0, self.query_statistics),
+            "host": (0, lambda: self.query_statistics(raw=True)["host"]),
+            "center": (0, lambda: self.query_statistics(raw=True)["center"]),
+            "available_hosts": (0, lambda: self.query_statistics(raw=True)["available_hosts"]),
+            "centers": (1, lambda center_id: self.query_center(center_id)),
+            "customers": (1, lambda customer_id: self.query_customer(customer_id))
+        }
+        # Name of an action => action, actions change the state of the server
+        self.actions = {
+            "reload": self.reload
+        }
+        self.reload()
+
+    def signature(self):
+        """
+        Signatures of hosts and instances files
+        @return tuple of signatures, see Watcher.signature
+        """
+        return Watcher.signature(self.statistics.host_file), Watcher.signature(self.statistics.instance_file)
+
+    def reload(self):
+        """
+        Load hosts and instances files and drop cached results, previous model is kept if files are malformed
+        @return dictionary including load time, number of hosts and number of instances
+        """
+        started = time.time()
+        with self.lock:
+            signatures = self.signature()
+            try:
+                model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file,
+                                         self.statistics.decode_workers)
+            except (IOError, SyntaxError) as err:
+                Utilities.get_logger().error(err)
+                if self.state[0] is None:
+                    raise
+                # Files are not loaded again until they change, malformed files are not parsed on every query
+                self.signatures = signatures
+                return {"error": str(err)}
+            self.state, self.signatures = (model, {}), signatures
+        return {"seconds": time.time() - started, "hosts": len(model.host_ids), "instances": len(model.instance_ids)}
+
+    def cached(self, key, function, *args):
+        """
+        Cached result of a query, files are loaded again first if they changed
+        @param key key of the result
+        @param function query which, calculates the result over a model
+        @param args arguments of the query
+        @return result
+        """
+        if self.signature() != self.signatures:
+            self.reload()
+        model, results = self.state
+        if key not in results:
+            results[key] = function(model, *args)
+        return results[key]
+
+    def method(self, path):
+        """
+        HTTP method a path is answered to
+        @param path list of path segments
+        @return "POST" for actions and "GET" for queries, KeyError is raised for an unknown path
+        """
+        if path[0] in self.actions:
+            return "POST"
+        if path[0] in self.routes:
+            return "GET"
+        raise KeyError(path[0])
+
+    def respond(self, path):
+        """
+        Answer a query or run an action, encoded answers of queries are cached as well so a repeated query is only
+        written back
+        @param path list of path segments, etc: ["centers", "1"]
+        @return JSON encoded result
+        """
+        if path[0] in self.actions:
+            if len(path) != 1:
+                raise KeyError(path[0])
+            return json.dumps(self.actions[path[0]]())
+        number_of_ids, route = self.routes[path[0]]
+        if len(path) - 1 != number_of_ids:
+            raise KeyError(path[0])
+        ids = [self.identifier(value) for value in path[1:]]
+        return self.cached(tuple(path), lambda model: json.dumps(route(*ids)))
+
+    @staticmethod
+    def identifier(value):
+        """
+        Convert an id of a path into an integer
+        @param value path segment
+        @return integer id, KeyError is raised if it is not an integer like an unknown id
+        """
+        try:
+            return int(value)
+        except ValueError:
+            raise KeyError(value)
+
+    def query_statistics(self, raw=False):
+        """
+        Largest host and data center records and available hosts
+        @param raw return the engine result instead of the lines of Statistics.txt
+        @return dictionary or list of lines
+        """
+        result = self.cached("statistics", self.calculate)
+        if raw:
+            return result
+        return self.statistics.format_content(result["host"], result["center"], result["available_hosts"])
+
+    def calculate(self, model):
+        """
+        Calculate over a model by the configured engine
+        @param model ClusterModel
+        @return dictionary including "host", "center" and "available_hosts"
+        """
+        if self.statistics.engine == "numpy":
+            result = VectorEngine(model).calculate()
+            # Host ids of numpy engine are a numpy array which, json can not encode
+            result["available_hosts"] = result["available_hosts"].tolist()
+            return result
+        return model.calculate()
+
+    def query_center(self, center_id):
+        """
+        Largest records and available hosts of a data center
+        @param center_id
+        @return dictionary or None if there is no such data center
+        """
+        return self.cached(("center", center_id), self.calculate_center, center_id)
+
+    @staticmethod
+    def calculate_center(model, center_id):
+        """
+        Calculate largest records and available hosts of a data center
+        @param model ClusterModel
+        @param center_id
+        @return dictionary including "host", "center", "available_hosts" and "slots"
+        """
+        if center_id not in model.center_ids:
+            raise KeyError(center_id)
+        center = list(model.center_ids).index(center_id)
+        partial = model.calculate_hosts(
+            model.center_hosts[model.center_offsets[center]:model.center_offsets[center + 1]])
+        return {
+            "host": partial["host"],
+            "center": model.largest_center(partial["number_of_instance"], partial["number_of_slots"]),
+            "available_hosts": partial["available_hosts"],
+            "slots": partial["number_of_slots"]
+        }
+
+    def query_customer(self, customer_id):
+        """
+        Instances of a customer per host and per data center
+        @param customer_id
+        @return dictionary
+        """
+        return self.cached(("customer", customer_id), self.calculate_customer, customer_id)
+
+    @staticmethod
+    def calculate_customer(model, customer_id):
+        """
+        Count instances of a customer per host and per data center
+        @param model ClusterModel
+        @param customer_id
+        @return dictionary including "instances", "hosts" and "centers", JSON keys are strings of ids
+        """
+        hosts, centers = {}, {}
+        number_of_instance = 0
+        for row, customer in enumerate(model.instance_customers):
+            if customer == customer_id:
+                host = model.instance_hosts[row]
+                number_of_instance += 1
+                hosts[model.host_ids[host]] = hosts.get(model.host_ids[host], 0) + 1
+                center_id = model.center_ids[model.host_centers[host]]
+                centers[center_id] = centers.get(center_id, 0) + 1
+        if not number_of_instance:
+            raise KeyError(customer_id)
+        return {"instances": number_of_instance, "hosts": hosts, "centers": centers}
+
+    def start(self):
+        """
+        Serve in a background thread
+        @return thread
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        """
+        Stop serving and close the socket
+        @return void
+        """
+        self.shutdown()
+        self.server_close()
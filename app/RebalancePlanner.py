@@ -0,0 +1,268 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import os
+import time
+import heapq
+import tempfile
+
+from app.IncrementalEngine import IncrementalEngine
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Fractions are compared with a small tolerance, so a target of 0.3 allows 3 instances on 10 slots
+TOLERANCE = 1e-9
+
+
+class RebalancePlanner(object):
+    """
+    RebalancePlanner finds instance moves into empty slots which, bring every customer's fraction of a host and of a
+    data center under target fractions. Pairs of (customer, data center) and (customer, host) over their targets are
+    taken from priority queues, most concentrated first, and an instance is moved off them into the host which, has
+    the most empty slots among the hosts it fits into. A move never takes a host or a data center over its target,
+    so every move removes an instance from a pair over its target and the number of moves is the number of instances
+    over the targets as long as empty slots are found for them.
+    """
+
+    def __init__(self, model, host_fraction=0.5, center_fraction=0.25, time_budget=60.0):
+        """
+        Constructor of RebalancePlanner class
+        @param model ClusterModel of the fleet
+        @param host_fraction largest fraction of a host a customer may have
+        @param center_fraction largest fraction of a data center a customer may have
+        @param time_budget seconds planning may take, moves found until then are kept
+        @return instance
+        """
+        super(RebalancePlanner, self).__init__()
+        self.engine = IncrementalEngine.from_model(model)
+        self.host_fraction = host_fraction
+        self.center_fraction = center_fraction
+        self.time_budget = time_budget
+
+        # customer id => host id => instance ids of the customer on the host
+        self.customer_hosts = {}
+        for instance_id, (customer_id, host_id) in self.engine.instances.iteritems():
+            self.customer_hosts.setdefault(customer_id, {}).setdefault(host_id, []).append(instance_id)
+
+        # data center id => heap of (-empty slots, order, host id), entries of changed hosts are pushed again and
+        # stale ones are dropped when they are popped
+        self.free = dict((center_id, []) for center_id in self.engine.centers)
+        for host_id in self.engine.free_hosts:
+            self.push_free(host_id)
+
+        # Data center ids in file order
+        self.center_order = sorted(self.engine.centers, key=lambda center_id: self.engine.centers[center_id][1])
+
+        # List of (instance id, host id, target host id) in order of moves
+        self.moves = []
+        # Number of (customer, host or data center) pairs which, are still over their targets after planning
+        self.unresolved = 0
+        # False if time budget ran out before every pair was handled
+        self.complete = True
+
+    def host_limit(self, host_id):
+        """
+        Largest number of instances a customer may have on a host
+        @param host_id
+        @return number of instances
+        """
+        return int(self.host_fraction * self.engine.hosts[host_id][0] + TOLERANCE)
+
+    def center_limit(self, center_id):
+        """
+        Largest number of instances a customer may have in a data center
+        @param center_id
+        @return number of instances
+        """
+        return int(self.center_fraction * self.engine.centers[center_id][0] + TOLERANCE)
+
+    def push_free(self, host_id):
+        """
+        Push empty slots of a host into the heap of its data center
+        @param host_id
+        @return void
+        """
+        number_of_slots, center_id, used, order = self.engine.hosts[host_id]
+        if number_of_slots - used > 0:
+            heapq.heappush(self.free[center_id], (used - number_of_slots, order, host_id))
+
+    def target(self, customer_id, center_ids):
+        """
+        Find the host which, has the most empty slots and takes one more instance of a customer without going over
+        its target, data centers are searched in given order
+        @param customer_id
+        @param center_ids data centers which, may take the instance
+        @return host id or None if there is no such host
+        """
+        hosts = self.engine.hosts
+        for center_id in center_ids:
+            heap, skipped, found = self.free[center_id], [], None
+            while heap:
+                entry = heapq.heappop(heap)
+                number_of_slots, center, used, order = hosts.get(entry[2], (0, None, 0, None))
+                if used - number_of_slots != entry[0]:
+                    continue
+                skipped.append(entry)
+                if self.engine.host_counts[entry[2]].get(customer_id) < self.host_limit(entry[2]):
+                    found = entry[2]
+                    break
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+            if found is not None:
+                return found
+        return None
+
+    def move(self, customer_id, host_id, target_host_id):
+        """
+        Move an instance of a customer to another host
+        @param customer_id
+        @param host_id host which, the instance is moved from
+        @param target_host_id host which, the instance is moved to
+        @return void
+        """
+        hosts = self.customer_hosts[customer_id]
+        instance_id = hosts[host_id].pop()
+        if not hosts[host_id]:
+            del hosts[host_id]
+        hosts.setdefault(target_host_id, []).append(instance_id)
+        self.engine.move(instance_id, target_host_id)
+        self.moves.append((instance_id, host_id, target_host_id))
+        self.push_free(host_id)
+        self.push_free(target_host_id)
+
+    def balance_centers(self, deadline):
+        """
+        Move instances of customers over their data center target into other data centers
+        @param deadline time.time() when planning has to stop
+        @return Boolean False if deadline is reached
+        """
+        engine = self.engine
+        queue = []
+        for center_id, counts in engine.center_counts.iteritems():
+            limit = self.center_limit(center_id)
+            for customer_id, count in counts.counts.iteritems():
+                if count > limit:
+                    queue.append((-count / engine.centers[center_id][0], customer_id, center_id))
+        heapq.heapify(queue)
+
+        while queue:
+            fraction, customer_id, center_id = heapq.heappop(queue)
+            limit = self.center_limit(center_id)
+            while engine.center_counts[center_id].get(customer_id) > limit:
+                if time.time() > deadline:
+                    self.unresolved += len(queue) + 1
+                    return False
+                # Data centers where the customer has the smallest fraction take the instance first
+                centers = sorted(
+                    (center for center in self.center_order if center != center_id and
+                     engine.center_counts[center].get(customer_id) < self.center_limit(center)),
+                    key=lambda center: engine.center_counts[center].get(customer_id) / engine.centers[center][0])
+                target_host_id = self.target(customer_id, centers)
+                if target_host_id is None:
+                    self.unresolved += 1
+                    break
+                # The host which, has the most instances of the customer in the data center gives the instance
+                host_id = max(
+                    (host for host in self.customer_hosts[customer_id] if engine.hosts[host][1] == center_id),
+                    key=lambda host: (len(self.customer_hosts[customer_id][host]), -engine.hosts[host][3]))
+                self.move(customer_id, host_id, target_host_id)
+        return True
+
+    def balance_hosts(self, deadline):
+        """
+        Move instances of customers over their host target into other hosts, hosts of the same data center first
+        @param deadline time.time() when planning has to stop
+        @return Boolean False if deadline is reached
+        """
+        engine = self.engine
+        queue = []
+        for host_id, counts in engine.host_counts.iteritems():
+            limit = self.host_limit(host_id)
+            for customer_id, count in counts.counts.iteritems():
+                if count > limit:
+                    queue.append((-count / engine.hosts[host_id][0], customer_id, host_id))
+        heapq.heapify(queue)
+
+        while queue:
+            fraction, customer_id, host_id = heapq.heappop(queue)
+            limit, center_id = self.host_limit(host_id), engine.hosts[host_id][1]
+            while engine.host_counts[host_id].get(customer_id) > limit:
+                if time.time() > deadline:
+                    self.unresolved += len(queue) + 1
+                    return False
+                # Other data centers may only take the instance while the customer stays under their target
+                centers = [center_id] + [
+                    center for center in self.center_order if center != center_id and
+                    engine.center_counts[center].get(customer_id) < self.center_limit(center)]
+                target_host_id = self.target(customer_id, centers)
+                if target_host_id is None:
+                    self.unresolved += 1
+                    break
+                self.move(customer_id, host_id, target_host_id)
+        return True
+
+    def plan(self):
+        """
+        Find moves of data center targets then host targets within time budget. Moves off a data center come from
+        the hosts which, have the most instances of the customer, so they resolve most of the host targets as well
+        @return self
+        """
+        deadline = time.time() + self.time_budget
+        self.complete = self.balance_centers(deadline) and self.balance_hosts(deadline)
+        return self
+
+    def calculate(self):
+        """
+        Calculate statistics after the moves
+        @return dictionary which includes "host" and "center" records, "moves" number of moves, "unresolved" number
+         of pairs still over their targets and "complete" False if time budget ran out
+        """
+        return {
+            "host": self.engine.host_clustering(),
+            "center": self.engine.center_clustering(),
+            "moves": len(self.moves),
+            "unresolved": self.unresolved,
+            "complete": self.complete
+        }
+
+    def write(self, plan_file):
+        """
+        Write moves as move events, the plan may be replayed by IncrementalEngine.replay
+        @param plan_file path of the plan, it is replaced at once
+        @return void
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(plan_file))
+        with os.fdopen(descriptor, "w") as target:
+            for instance_id, host_id, target_host_id in self.moves:
+                target.write("move,%d,%d\n" % (instance_id, target_host_id))
+        os.chmod(temporary, 0644)
+        os.rename(temporary, plan_file)
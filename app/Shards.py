@@ -0,0 +1,119 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import re
+import glob
+import gzip
+import errno
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# A path which, ends with this extension lists shards, one path or glob pattern per line relative to itself
+MANIFEST = ".manifest"
+
+# Extensions of compressed shards
+GZIP = (".gz",)
+ZSTD = (".zst", ".zstd")
+
+# Characters which, make a path a glob pattern
+MAGIC = re.compile("[*?[]")
+
+# Size of the chunks a whole shard is read by, some zstandard versions can not read a stream without a size
+CHUNK_SIZE = 1 << 20
+
+
+def is_plain(path):
+    """
+    Check a configured path is a single uncompressed file
+    @param path path, glob pattern or manifest
+    @return Boolean True or False
+    """
+    return not (MAGIC.search(path) or path.endswith(MANIFEST) or path.endswith(GZIP + ZSTD))
+
+
+def expand(path):
+    """
+    Expand a configured path into shard files, matches of a glob pattern are sorted by name
+    @param path path, glob pattern or manifest
+    @return list of file names
+    """
+    if path.endswith(MANIFEST):
+        directory = os.path.dirname(path)
+        files = []
+        with open(path, "rb") as h_file:
+            for line in h_file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    files.extend(expand(os.path.join(directory, line)))
+    elif MAGIC.search(path):
+        files = sorted(glob.glob(path))
+    else:
+        files = [path]
+    if not files:
+        raise IOError(errno.ENOENT, "There is no shard matching %s" % path, path)
+    return files
+
+
+def open_shard(file_name):
+    """
+    Open a shard for reading, compressed shards are decompressed while they are read
+    @param file_name
+    @return file like object
+    """
+    if file_name.endswith(GZIP):
+        return gzip.open(file_name, "rb")
+    if file_name.endswith(ZSTD):
+        if zstandard is None:
+            raise IOError(errno.ENOSYS, "zstandard package is required to read %s" % file_name, file_name)
+        return zstandard.ZstdDecompressor().stream_reader(open(file_name, "rb"))
+    return open(file_name, "rb")
+
+
+def read_shard(file_name):
+    """
+    Read the whole decompressed content of a shard
+    @param file_name
+    @return string
+    """
+    chunks = []
+    with open_shard(file_name) as h_file:
+        while True:
+            chunk = h_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return "".join(chunks)
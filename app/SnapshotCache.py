@@ -0,0 +1,266 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import json
+import struct
+import hashlib
+import tempfile
+from array import array
+
+from app.ClusterModel import ClusterModel
+from app.Shards import expand
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Snapshot files start with this magic and the version of their layout, a snapshot of another layout is not loaded
+MAGIC = "CLMODEL1"
+
+# Columns are aligned to this many bytes in a snapshot file
+ALIGNMENT = 64
+
+
+class SnapshotCache(object):
+    """
+    SnapshotCache keeps parsed ClusterModels on disk in a binary layout. A snapshot is keyed on size, modification
+    time and content hash of both hosts and instances files, so it is loaded instead of parsing the files again
+    until one of them changes. Content hash of a file is remembered by its size and modification time and it is
+    calculated again only if one of them changes.
+
+    Layout of a snapshot file: magic, length of the header as 8 bytes, JSON header which, describes every column and
+    raw bytes of the columns.
+    """
+
+    def __init__(self, directory, max_entries=8, max_bytes=1024 ** 3):
+        """
+        Constructor of SnapshotCache class
+        @param directory where snapshots are kept, it is created if it does not exist
+        @param max_entries maximum number of snapshots
+        @param max_bytes maximum total size of snapshots
+        @return instance
+        """
+        super(SnapshotCache, self).__init__()
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hashes_file = os.path.join(directory, "hashes.json")
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def fingerprint(self, file_name):
+        """
+        Fingerprint of a file
+        @param file_name
+        @return list of [size, modification time, sha1 of content]
+        """
+        stat = os.stat(file_name)
+        hashes = self.read_hashes()
+        known = hashes.get(os.path.abspath(file_name))
+        if known and known[:2] == [stat.st_size, stat.st_mtime]:
+            return known
+
+        digest = hashlib.sha1()
+        with open(file_name, "rb") as h_file:
+            for chunk in iter(lambda: h_file.read(1024 * 1024), ""):
+                digest.update(chunk)
+        known = [stat.st_size, stat.st_mtime, digest.hexdigest()]
+        hashes[os.path.abspath(file_name)] = known
+        self.write_atomic(self.hashes_file, json.dumps(hashes))
+        return known
+
+    def read_hashes(self):
+        """
+        Read remembered content hashes
+        @return dictionary of path => [size, modification time, sha1 of content]
+        """
+        try:
+            with open(self.hashes_file, "rb") as h_file:
+                return json.load(h_file)
+        except (IOError, ValueError):
+            return {}
+
+    def key(self, host_file, instance_file):
+        """
+        Key of the snapshot of two files
+        @param host_file
+        @param instance_file
+        @return hexadecimal string
+        """
+        return hashlib.sha1(json.dumps([MAGIC] + [[self.fingerprint(shard) for shard in expand(file_name)]
+                                                  for file_name in (host_file, instance_file)])).hexdigest()
+
+    def path(self, key):
+        """
+        Path of a snapshot file
+        @param key
+        @return path
+        """
+        return os.path.join(self.directory, "%s.model" % key)
+
+    def load(self, host_file, instance_file):
+        """
+        Load snapshot of two files
+        @param host_file
+        @param instance_file
+        @return ClusterModel or None if there is no snapshot of the files
+        """
+        snapshot = self.path(self.key(host_file, instance_file))
+        try:
+            with open(snapshot, "rb") as h_file:
+                header = self.read_header(h_file)
+                model = ClusterModel()
+                model.orphans = header["orphans"]
+                for name, typecode, offset, size in header["columns"]:
+                    # Columns are read straight into their arrays without an intermediate string of their bytes
+                    column = array(str(typecode))
+                    h_file.seek(offset)
+                    column.fromfile(h_file, size // column.itemsize)
+                    setattr(model, name, column)
+        except (IOError, OSError, EOFError, ValueError, KeyError, struct.error):
+            # A snapshot which, is missing or can not be read is overwritten by the next store
+            return None
+        # Modification time of a snapshot is the time it is last used, eviction removes the least recently used
+        os.utime(snapshot, None)
+        return model
+
+    @staticmethod
+    def read_header(h_file):
+        """
+        Read magic and header of a snapshot file
+        @param h_file snapshot file opened to read at its start
+        @return dictionary of header, it raises ValueError if the file is not a snapshot of this layout
+        """
+        if h_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a snapshot of this layout" % h_file.name)
+        return json.loads(h_file.read(struct.unpack("<Q", h_file.read(8))[0]))
+
+    def store(self, host_file, instance_file, model):
+        """
+        Store snapshot of two files and evict old snapshots if limits are exceeded
+        @param host_file
+        @param instance_file
+        @param model ClusterModel parsed from the files
+        @return path of the snapshot
+        """
+        columns = [getattr(model, name) for name in ClusterModel.columns]
+        # Sources of a snapshot are kept in its header, so their remembered hashes are evicted together with it
+        header = {"orphans": model.orphans, "columns": [],
+                  "sources": [os.path.abspath(shard) for file_name in (host_file, instance_file)
+                              for shard in expand(file_name)]}
+        # Offsets depend on the length of header, header is encoded until its length does not change
+        encoded = ""
+        while True:
+            offset = self.align(len(MAGIC) + 8 + len(encoded))
+            header["columns"] = []
+            for name, column in zip(ClusterModel.columns, columns):
+                size = len(column) * column.itemsize
+                header["columns"].append([name, column.typecode, offset, size])
+                offset = self.align(offset + size)
+            current = json.dumps(header)
+            if len(current) == len(encoded):
+                break
+            encoded = current
+
+        snapshot = self.path(self.key(host_file, instance_file))
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(descriptor, "wb") as h_file:
+            h_file.write(MAGIC + struct.pack("<Q", len(encoded)) + encoded)
+            for (name, typecode, offset, size), column in zip(header["columns"], columns):
+                h_file.write("\0" * (offset - h_file.tell()))
+                column.tofile(h_file)
+        os.rename(temporary, snapshot)
+        self.evict()
+        return snapshot
+
+    @staticmethod
+    def align(offset):
+        """
+        Align an offset
+        @param offset
+        @return aligned offset
+        """
+        return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    def evict(self):
+        """
+        Remove least recently used snapshots until there are at most max_entries snapshots of at most max_bytes
+        @return list of removed snapshots
+        """
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".model"):
+                stat = os.stat(os.path.join(self.directory, name))
+                snapshots.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        snapshots.sort(reverse=True)
+
+        removed = []
+        sources = set()
+        total = 0
+        for position, (modified, size, snapshot) in enumerate(snapshots):
+            total += size
+            if position >= self.max_entries or total > self.max_bytes:
+                os.remove(snapshot)
+                removed.append(snapshot)
+            else:
+                try:
+                    with open(snapshot, "rb") as h_file:
+                        sources.update(self.read_header(h_file).get("sources", []))
+                except (IOError, ValueError, struct.error):
+                    pass
+
+        # Hashes of files which, no kept snapshot is parsed from are forgotten
+        hashes = self.read_hashes()
+        if any(path not in sources for path in hashes):
+            self.write_atomic(self.hashes_file, json.dumps(
+                dict((path, known) for path, known in hashes.iteritems() if path in sources)))
+        return removed
+
+    def clear(self):
+        """
+        Remove all snapshots and remembered hashes
+        @return void
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith(".model") or name == "hashes.json":
+                os.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def write_atomic(file_name, content):
+        """
+        Write a file by renaming a temporary file over it, readers never see a half written file
+        @param file_name
+        @param content
+        @return void
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(file_name))
+        with os.fdopen(descriptor, "wb") as h_file:
+            h_file.write(content)
+        os.rename(temporary, file_name)
@@ -0,0 +1,173 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+from itertools import izip
+
+from app.ClusteringReport import ClusteringReport
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class SnapshotDiff(object):
+    """
+    SnapshotDiff compares two ClusterModels of successive snapshots. Instances are joined by instance id and hosts by
+    host id through hashed indexes, and fractions of every customer come from a ClusteringReport of each snapshot, so
+    the whole comparison takes time linear in the size of the snapshots.
+    """
+
+    def __init__(self, before, after, host_threshold=0.5, center_threshold=0.25):
+        """
+        Constructor of SnapshotDiff class
+        @param before ClusterModel of the older snapshot
+        @param after ClusterModel of the newer snapshot
+        @param host_threshold host fraction of a customer which, is reported when it is crossed
+        @param center_threshold data center fraction of a customer which, is reported when it is crossed
+        @return instance
+        """
+        super(SnapshotDiff, self).__init__()
+        self.before = before
+        self.after = after
+        self.host_threshold = host_threshold
+        self.center_threshold = center_threshold
+
+        # Lists of (instance id, customer id, host id before, host id after), host id is None if there is no host
+        self.moved = []
+        self.added = []
+        self.removed = []
+
+        # List of (host id, free slots before, free slots after), free slots is None if there is no host
+        self.free_slots = []
+
+        # Lists of (customer id, fraction before, fraction after, host or data center id after) of crossed thresholds
+        self.crossed_hosts = []
+        self.crossed_centers = []
+
+        # Results of both snapshots, see ClusterModel.calculate
+        self.results = None
+
+    @staticmethod
+    def instances(model):
+        """
+        Index instances of a model by instance id
+        @param model ClusterModel
+        @return dictionary of instance id => (customer id, host id)
+        """
+        host_ids = model.host_ids
+        return dict((instance_id, (customer_id, host_ids[host]))
+                    for instance_id, customer_id, host in izip(model.instance_ids, model.instance_customers,
+                                                               model.instance_hosts))
+
+    @staticmethod
+    def hosts(model):
+        """
+        Index free slots of hosts of a model by host id
+        @param model ClusterModel
+        @return dictionary of host id => number of free slots
+        """
+        offsets = model.host_offsets
+        return dict((host_id, model.host_slots[host] - (offsets[host + 1] - offsets[host]))
+                    for host, host_id in enumerate(model.host_ids))
+
+    def calculate(self):
+        """
+        Compare the snapshots
+        @return self
+        """
+        before = self.instances(self.before)
+        for instance_id, (customer_id, host_id) in self.instances(self.after).iteritems():
+            previous = before.pop(instance_id, None)
+            if previous is None:
+                self.added.append((instance_id, customer_id, None, host_id))
+            elif previous[1] != host_id:
+                self.moved.append((instance_id, customer_id, previous[1], host_id))
+        self.removed = [(instance_id, customer_id, host_id, None)
+                        for instance_id, (customer_id, host_id) in before.iteritems()]
+
+        before = self.hosts(self.before)
+        for host_id, free in self.hosts(self.after).iteritems():
+            previous = before.pop(host_id, None)
+            if previous != free:
+                self.free_slots.append((host_id, previous, free))
+        self.free_slots.extend((host_id, free, None) for host_id, free in before.iteritems())
+
+        self.crossed_hosts, self.crossed_centers = self.crossed()
+        self.results = (self.before.calculate(), self.after.calculate())
+        for changes in (self.moved, self.added, self.removed, self.free_slots):
+            changes.sort()
+        return self
+
+    def crossed(self):
+        """
+        Find customers whose largest host or data center fraction crossed its threshold in either direction
+        @return tuple of lists of crossed host and data center thresholds
+        """
+        before = ClusteringReport(self.before).calculate().customers
+        after = ClusteringReport(self.after).calculate().customers
+        crossed_hosts, crossed_centers = [], []
+        empty = [0, 0, None, 0, None]
+        for customer_id in sorted(set(before) | set(after)):
+            old, new = before.get(customer_id, empty), after.get(customer_id, empty)
+            if (old[1] >= self.host_threshold) != (new[1] >= self.host_threshold):
+                crossed_hosts.append((customer_id, old[1], new[1], new[2]))
+            if (old[3] >= self.center_threshold) != (new[3] >= self.center_threshold):
+                crossed_centers.append((customer_id, old[3], new[3], new[4]))
+        return crossed_hosts, crossed_centers
+
+    def lines(self):
+        """
+        Format the changes, fractions are formatted like Statistics.format_content does
+        @return list of lines
+        """
+        before, after = self.results
+        lines = []
+        for title, key in (("HostClustering", "host"), ("DatacentreClustering", "center")):
+            old, new = before[key], after[key]
+            lines.append("%s: %s, %.2f -> %s, %.2f (%+.2f)" % (
+                title, old["customer_id"], old["fraction"], new["customer_id"], new["fraction"],
+                new["fraction"] - old["fraction"]))
+        old, new = set(before["available_hosts"]), set(after["available_hosts"])
+        lines.append("AvailableHosts: %s" % ",".join(
+            ["+%s" % host_id for host_id in sorted(new - old)] + ["-%s" % host_id for host_id in sorted(old - new)]))
+        lines.append("Instances: %d moved, %d added, %d removed" % (
+            len(self.moved), len(self.added), len(self.removed)))
+        for title, changes in (("Moved", self.moved), ("Added", self.added), ("Removed", self.removed)):
+            for instance_id, customer_id, old_host, new_host in changes:
+                lines.append("%s: %s, %s, %s -> %s" % (title, instance_id, customer_id, old_host, new_host))
+        for host_id, old_free, new_free in self.free_slots:
+            lines.append("FreeSlots: %s, %s -> %s" % (host_id, old_free, new_free))
+        for title, threshold, crossed in (("CrossedHost", self.host_threshold, self.crossed_hosts),
+                                          ("CrossedDatacentre", self.center_threshold, self.crossed_centers)):
+            for customer_id, old_fraction, new_fraction, group_id in crossed:
+                lines.append("%s: %s, %.2f -> %.2f %s %.2f at %s" % (
+                    title, customer_id, old_fraction, new_fraction,
+                    "above" if new_fraction >= threshold else "below", threshold, group_id))
+        return lines
@@ -0,0 +1,219 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import sqlite3
+from itertools import izip, islice
+
+from app.ColumnParser import ColumnParser
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Tables are created without indexes, indexes are built once after rows are loaded which, is faster than updating
+# them on every insert. Row numbers keep file order of hosts and data centers for AvailableHosts, used slots of a
+# host are counted once after instances are loaded
+SCHEMA = """
+CREATE TABLE centers (center_id INTEGER NOT NULL, row INTEGER NOT NULL);
+CREATE TABLE hosts (host_id INTEGER NOT NULL, slots INTEGER NOT NULL, center_id INTEGER NOT NULL, row INTEGER NOT NULL,
+                    used INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE instances (instance_id INTEGER NOT NULL, customer_id INTEGER NOT NULL, host_id INTEGER NOT NULL);
+"""
+
+INDEXES = """
+CREATE INDEX hosts_host ON hosts (host_id);
+CREATE INDEX hosts_center ON hosts (center_id);
+CREATE INDEX instances_host ON instances (host_id, customer_id);
+CREATE INDEX instances_customer ON instances (customer_id);
+UPDATE hosts SET used = (SELECT COUNT(*) FROM instances i WHERE i.host_id = hosts.host_id);
+"""
+
+# Largest fraction of a customer on a single host, equal fractions are resolved by the smaller customer id
+HOST_CLUSTERING = """
+SELECT i.customer_id, CAST(COUNT(*) AS REAL) / h.slots AS fraction
+FROM instances i JOIN hosts h ON h.host_id = i.host_id
+WHERE h.slots > 0
+GROUP BY i.host_id, i.customer_id
+ORDER BY fraction DESC, i.customer_id
+LIMIT 1
+"""
+
+# Largest fraction of a customer in a single data center
+CENTER_CLUSTERING = """
+SELECT i.customer_id, CAST(COUNT(*) AS REAL) / c.slots AS fraction
+FROM instances i
+JOIN hosts h ON h.host_id = i.host_id
+JOIN (SELECT center_id, SUM(slots) AS slots FROM hosts GROUP BY center_id) c ON c.center_id = h.center_id
+WHERE c.slots > 0
+GROUP BY h.center_id, i.customer_id
+ORDER BY fraction DESC, i.customer_id
+LIMIT 1
+"""
+
+# Hosts which, have free slots ordered by data center and then by file order
+AVAILABLE_HOSTS = """
+SELECT h.host_id
+FROM hosts h JOIN centers c ON c.center_id = h.center_id
+WHERE h.slots - h.used >= ? %s
+ORDER BY c.row, h.row
+"""
+
+
+class SqlStore(object):
+    """
+    SqlStore keeps hosts and instances in a SQLite database with indexes on host, data center and customer, so they
+    can be queried ad hoc, etc: hosts of a data center which, have free slots or hosts of a customer. Rows are loaded
+    by executemany in batches, a batch is a transaction. The standard statistics are calculated by SQL aggregates.
+    """
+
+    def __init__(self, database=":memory:", batch_size=50000):
+        """
+        Constructor of SqlStore class
+        @param database path of the database file, it is kept in memory by default
+        @param batch_size number of rows inserted in a transaction
+        @return instance
+        """
+        super(SqlStore, self).__init__()
+        self.database = database
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(database)
+
+        # Numbers of rows of the last load, orphans are instances whose host is not in hosts file
+        self.hosts = 0
+        self.instances = 0
+        self.orphans = 0
+
+    def load(self, host_file, instance_file):
+        """
+        Replace contents of the database with hosts and instances files
+        @param host_file source file to provide host list
+        @param instance_file source file to provide instance list
+        @return tuple of number of hosts and number of instances which, belong to a host
+        """
+        host_ids, slots, center_ids = ColumnParser(host_file).parse()
+        instances = ColumnParser(instance_file).parse()
+
+        cursor = self.connection.cursor()
+        # Database is rebuilt from files whenever it is loaded, there is nothing a journal should protect
+        cursor.execute("PRAGMA journal_mode = OFF")
+        cursor.execute("PRAGMA synchronous = OFF")
+        for table in ("centers", "hosts", "instances"):
+            cursor.execute("DROP TABLE IF EXISTS %s" % table)
+        cursor.executescript(SCHEMA)
+
+        centers = {}
+        for center_id in center_ids:
+            centers.setdefault(center_id, len(centers))
+        self.insert("INSERT INTO centers VALUES (?, ?)", centers.iteritems())
+        self.insert("INSERT INTO hosts (host_id, slots, center_id, row) VALUES (?, ?, ?, ?)",
+                    izip(host_ids, slots, center_ids, xrange(len(host_ids))))
+        self.insert("INSERT INTO instances VALUES (?, ?, ?)", izip(*instances))
+        cursor.executescript(INDEXES)
+        cursor.execute("ANALYZE")
+
+        self.hosts = len(host_ids)
+        self.orphans = cursor.execute(
+            "SELECT COUNT(*) FROM instances WHERE host_id NOT IN (SELECT host_id FROM hosts)").fetchone()[0]
+        self.instances = len(instances[0]) - self.orphans
+        return self.hosts, self.instances
+
+    def insert(self, statement, rows):
+        """
+        Insert rows by executemany, every batch is committed in its own transaction
+        @param statement INSERT statement
+        @param rows iterable of tuples
+        @return void
+        """
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with self.connection:
+                self.connection.executemany(statement, batch)
+
+    def query(self, statement, parameters=()):
+        """
+        Run an ad hoc query
+        @param statement SELECT statement
+        @param parameters parameters of the statement
+        @return list of rows
+        """
+        return self.connection.execute(statement, parameters).fetchall()
+
+    def largest(self, statement):
+        """
+        Run a clustering query
+        @param statement HOST_CLUSTERING or CENTER_CLUSTERING
+        @return dictionary including "fraction" and "customer_id"
+        """
+        row = self.connection.execute(statement).fetchone()
+        if row is None:
+            return {"fraction": 0, "customer_id": None}
+        return {"fraction": row[1], "customer_id": row[0]}
+
+    def available_hosts(self, center_id=None, minimum=1):
+        """
+        Hosts which, have free slots
+        @param center_id data center of the hosts, hosts of every data center are listed if it is not given
+        @param minimum minimum number of free slots
+        @return list of host ids
+        """
+        condition, parameters = "", [minimum]
+        if center_id is not None:
+            condition = "AND h.center_id = ?"
+            parameters.append(center_id)
+        return [row[0] for row in self.connection.execute(AVAILABLE_HOSTS % condition, parameters)]
+
+    def customer_hosts(self, customer_id):
+        """
+        Hosts of a customer
+        @param customer_id
+        @return list of (host id, number of instances) tuples ordered by host id
+        """
+        return self.query("SELECT host_id, COUNT(*) FROM instances WHERE customer_id = ? GROUP BY host_id "
+                          "ORDER BY host_id", (customer_id,))
+
+    def calculate(self):
+        """
+        Calculate the largest host and data center fractions and available hosts by SQL aggregates
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        return {
+            "host": self.largest(HOST_CLUSTERING),
+            "center": self.largest(CENTER_CLUSTERING),
+            "available_hosts": self.available_hosts()
+        }
+
+    def close(self):
+        """
+        Close the database
+        @return void
+        """
+        self.connection.close()
@@ -0,0 +1,153 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import re
+
+from app.Shards import expand, open_shard
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Size of a single buffered read, a chunk is validated and parsed before the next one is read
+BUFFER_SIZE = 1024 * 1024
+
+# A well formed line is three integers which, never need that many characters. A longer line means the file has
+# no line breaks at all and there is no reason to keep buffering it
+MAX_LINE_LENGTH = 4096
+
+
+class StateReader(object):
+    """
+    StateReader streams a state file such as "HostState.txt" or "InstanceState.txt" in fixed size chunks and validates
+    every line while it is parsed, so memory usage does not depend on the size of the file. Both "\\n" and "\\r\\n"
+    line endings are accepted.
+    """
+
+    # Pattern of a single line, three comma separated integers
+    pattern = re.compile("^([0-9]+),([0-9]+),([0-9]+)\\r?$")
+
+    def __init__(self, file_name, buffer_size=BUFFER_SIZE):
+        """
+        Constructor of StateReader class
+        @param file_name path of the state file to read, a glob pattern or a manifest of shards, see app/Shards.py
+        @param buffer_size number of bytes read at once
+        @return instance
+        """
+        super(StateReader, self).__init__()
+        self.file_name = file_name
+        self.buffer_size = buffer_size
+
+        # Position of the reader in the current shard, they are kept to report where a malformed line is
+        self.shard = file_name
+        self.line_number = 0
+        self.offset = 0
+
+    def __iter__(self):
+        """
+        Iterate over the rows of the file, a glob pattern or a manifest is read shard by shard
+        @return generator of tuples including three fields as strings, etc: ('1', '8', '2')
+        """
+        rows = 0
+        for shard in expand(self.file_name):
+            for fields in self.read(shard):
+                yield fields
+            rows += self.line_number
+
+        if not rows:
+            raise SyntaxError("Content loaded from %s is empty." % self.file_name)
+
+    def read(self, shard):
+        """
+        Iterate over the rows of a single shard, compressed shards are decompressed while they are read
+        @param shard file name
+        @return generator of tuples including three fields as strings
+        """
+        self.shard = shard
+        self.line_number = 0
+        self.offset = 0
+        with open_shard(shard) as h_file:
+            remainder = ""
+            while True:
+                chunk = h_file.read(self.buffer_size)
+                if not chunk:
+                    break
+                lines = (remainder + chunk).split("\n")
+                # Last piece of the chunk is an incomplete line, keep it for the next chunk
+                remainder = lines.pop()
+                for line in lines:
+                    yield self.parse(line)
+                    self.offset += len(line) + 1
+                if len(remainder) > MAX_LINE_LENGTH:
+                    self.line_number += 1
+                    self.malformed(remainder)
+
+            # Last line of a file does not have to end with a line break
+            if remainder:
+                yield self.parse(remainder)
+                self.offset += len(remainder)
+
+    def parse(self, line):
+        """
+        Validate and parse a single line
+        @param line content of the line without its line break
+        @return tuple including three fields as strings
+        """
+        self.line_number += 1
+        matched = self.pattern.match(line)
+        if matched is None:
+            self.malformed(line)
+        return matched.groups()
+
+    def malformed(self, line):
+        """
+        Raise a SyntaxError which, points the malformed line
+        @param line content of the malformed line
+        @return void
+        """
+        raise SyntaxError(
+            "Content loaded from %s is malformed at line %d, byte offset %d: %r" % (
+                self.shard, self.line_number, self.offset, line[:80]),
+            (self.shard, self.line_number, self.offset, line[:80]))
+
+    @classmethod
+    def validate(cls, content):
+        """
+        Check every line of given content, it is used for the content which, is already in memory
+        @param content to check
+        @return Boolean True or False
+        """
+        lines = content.split("\n")
+        # Content may end with a line break but it may not include any empty line
+        if len(lines) > 1 and not lines[-1]:
+            lines.pop()
+        for line in lines:
+            if cls.pattern.match(line) is None:
+                return False
+        return True
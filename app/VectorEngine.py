@@ -0,0 +1,159 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+def column(values):
+    """
+    View an array column as a numpy array without copying it
+    @param values array.array
+    @return numpy.ndarray
+    """
+    return numpy.frombuffer(values, dtype="i%d" % values.itemsize)
+
+
+class VectorEngine(object):
+    """
+    VectorEngine calculates statistics of a ClusterModel by grouped counts over integer arrays instead of walking
+    data centers, hosts and instances one by one. It requires numpy.
+    """
+
+    def __init__(self, model):
+        """
+        Constructor of VectorEngine class
+        @param model ClusterModel to calculate
+        @return instance
+        """
+        super(VectorEngine, self).__init__()
+        if numpy is None:
+            raise ImportError("numpy is required to use numpy engine.")
+        self.model = model
+
+    @staticmethod
+    def pairs(customers, groups, number_of_groups, weights=None):
+        """
+        Count instances of every (customer, group) pair
+        @param customers customer id of every row
+        @param groups group row of every row
+        @param number_of_groups number of groups
+        @param weights number of instances every row stands for, a row is a single instance if it is not given
+        @return tuple of customer ids, group rows and counts of the pairs, pairs are sorted by customer id
+        """
+        if weights is None:
+            # Pairs are sorted by customer first so a single integer key keeps the order of (customer, group)
+            keys, counts = numpy.unique(customers * number_of_groups + groups, return_counts=True)
+            return keys // number_of_groups, keys % number_of_groups, counts
+
+        # Weighted rows are pairs which, are already sorted by customer, so customers can be ranked without
+        # sorting and pairs can be counted in a dense (customer rank, group) table if it is not much larger
+        changes = numpy.empty(len(customers), dtype=numpy.bool_)
+        changes[:1] = True
+        numpy.not_equal(customers[1:], customers[:-1], out=changes[1:])
+        ranks = numpy.cumsum(changes) - 1
+        number_of_ranks = int(ranks[-1]) + 1 if len(ranks) else 0
+        if number_of_ranks * number_of_groups <= 4 * len(customers) + number_of_groups:
+            counts = numpy.bincount(
+                ranks * number_of_groups + groups, weights=weights,
+                minlength=number_of_ranks * number_of_groups).astype(numpy.int64)
+            keys = numpy.flatnonzero(counts)
+            return customers[changes][keys // number_of_groups], keys % number_of_groups, counts[keys]
+
+        keys, inverse = numpy.unique(customers * number_of_groups + groups, return_inverse=True)
+        counts = numpy.bincount(inverse, weights=weights, minlength=len(keys)).astype(numpy.int64)
+        return keys // number_of_groups, keys % number_of_groups, counts
+
+    @classmethod
+    def largest(cls, customers, groups, counts, slots):
+        """
+        Find the largest count / slots fraction, equal fractions are resolved by the smaller customer id like
+        is_larger does
+        @param customers customer ids of (customer, group) pairs
+        @param groups group rows of the same pairs
+        @param counts number of instances of the same pairs
+        @param slots number of slots of every group
+        @return dictionary including "fraction" and "customer_id"
+        """
+        slots = slots[groups]
+        # A group without slots can not have a fraction
+        valid = slots > 0
+        fractions = counts[valid] / slots[valid]
+        if not len(fractions):
+            return {"fraction": 0, "customer_id": None}
+        fraction = fractions.max()
+        return {"fraction": float(fraction), "customer_id": int(customers[valid][fractions == fraction].min())}
+
+    def calculate(self):
+        """
+        Calculate the largest host and data center fractions and available hosts, see ClusterModel.calculate
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        model = self.model
+        host_ids = column(model.host_ids)
+        host_slots = column(model.host_slots).astype(numpy.int64)
+        host_centers = column(model.host_centers).astype(numpy.int64)
+        instance_hosts = column(model.instance_hosts).astype(numpy.int64)
+        customers = column(model.instance_customers).astype(numpy.int64)
+        number_of_hosts = len(host_ids)
+        number_of_centers = len(model.center_ids)
+
+        # Customer ids are used in keys as they are unless customer id * number of hosts may overflow, then they
+        # are replaced with dense codes which, are sorted as the ids are
+        customer_ids = None
+        if len(customers) and (customers.min() < 0 or int(customers.max()) * number_of_hosts >= 2 ** 62):
+            customer_ids, customers = numpy.unique(customers, return_inverse=True)
+            customers = customers.astype(numpy.int64)
+
+        # Instances are counted once per (customer, host), data center counts are summed up over those pairs
+        pair_customers, pair_hosts, pair_counts = self.pairs(customers, instance_hosts, number_of_hosts)
+        center_customers, center_rows, center_counts = self.pairs(
+            pair_customers, host_centers[pair_hosts], number_of_centers, weights=pair_counts)
+        if customer_ids is not None:
+            pair_customers = customer_ids[pair_customers]
+            center_customers = customer_ids[center_customers]
+
+        center_slots = numpy.bincount(host_centers, weights=host_slots, minlength=number_of_centers).astype(numpy.int64)
+        max_host = self.largest(pair_customers, pair_hosts, pair_counts, host_slots)
+        max_center = self.largest(center_customers, center_rows, center_counts, center_slots)
+
+        # Hosts which, have an empty slot in order of data centers then hosts file
+        used_slots = numpy.bincount(instance_hosts, minlength=number_of_hosts)
+        center_hosts = column(model.center_hosts)
+        available_hosts = host_ids[center_hosts][(host_slots - used_slots)[center_hosts] > 0]
+
+        return {"host": max_host, "center": max_center, "available_hosts": available_hosts}
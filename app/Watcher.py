@@ -0,0 +1,257 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package app
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from itertools import izip
+
+from helper.Utilities import Utilities
+from app.ClusterModel import ClusterModel
+from app.ColumnParser import ColumnParser
+from app.Shards import MANIFEST, expand
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# inotify events which, mean a file of a watched directory is written or replaced
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x2, 0x8, 0x80, 0x100, 0x200
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify(object):
+    """
+    Inotify wraps inotify of Linux through ctypes to wake up when files of watched directories change
+    """
+
+    def __init__(self, directories):
+        """
+        Constructor of Inotify class, it raises OSError if inotify is not available
+        @param directories directories to watch
+        @return instance
+        """
+        super(Inotify, self).__init__()
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.descriptor = libc.inotify_init()
+        if self.descriptor < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        for directory in set(directories):
+            if libc.inotify_add_watch(self.descriptor, directory,
+                                      IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE) < 0:
+                os.close(self.descriptor)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed for %s" % directory)
+
+    def wait(self, timeout):
+        """
+        Wait for events
+        @param timeout maximum number of seconds to wait
+        @return set of names of changed files, it is empty if timeout expires
+        """
+        names = set()
+        readable, _, _ = select.select([self.descriptor], [], [], timeout)
+        if readable:
+            events = os.read(self.descriptor, 64 * 1024)
+            position = 0
+            while position < len(events):
+                watch, mask, cookie, length = EVENT_HEADER.unpack_from(events, position)
+                position += EVENT_HEADER.size
+                names.add(events[position:position + length].rstrip("\0"))
+                position += length
+        return names
+
+    def close(self):
+        """
+        Stop watching
+        @return void
+        """
+        os.close(self.descriptor)
+
+
+class Watcher(object):
+    """
+    Watcher keeps a Statistics instance running, watches its hosts and instances files and writes target file again
+    when they change. Changes are detected by inotify where it is available and by polling modification times
+    otherwise. A burst of writes is waited out before anything is calculated, and only a changed file is parsed again;
+    parsed columns of the other file are reused.
+    """
+
+    def __init__(self, statistics, debounce=0.5, poll_interval=1.0):
+        """
+        Constructor of Watcher class
+        @param statistics Statistics instance whose files are watched
+        @param debounce number of seconds files have to stay unchanged before they are loaded
+        @param poll_interval number of seconds between two checks when inotify is not available
+        @return instance
+        """
+        super(Watcher, self).__init__()
+        self.statistics = statistics
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.running = False
+
+        # Parsed columns and signatures of the files they are parsed from
+        self.columns = {}
+        self.signatures = {}
+
+        # Latencies of the first calculation and of the updates in seconds
+        self.latencies = []
+
+        try:
+            self.inotify = Inotify([os.path.dirname(os.path.abspath(file_name)) for file_name in self.files()])
+        except (OSError, AttributeError):
+            self.inotify = None
+
+    def files(self):
+        """
+        Watched files
+        @return list of hosts file and instances file
+        """
+        return [self.statistics.host_file, self.statistics.instance_file]
+
+    @staticmethod
+    def signature(file_name):
+        """
+        Signature of a file, it changes when a file is written or replaced, or when a shard of a glob pattern or a
+        manifest is written, added or removed
+        @param file_name
+        @return tuple of (inode, size, modification time) of every shard or None if a file does not exist
+        """
+        try:
+            signatures = []
+            for shard in expand(file_name):
+                stat = os.stat(shard)
+                signatures.append((stat.st_ino, stat.st_size, stat.st_mtime))
+            if file_name.endswith(MANIFEST):
+                stat = os.stat(file_name)
+                signatures.append((stat.st_ino, stat.st_size, stat.st_mtime))
+        except (OSError, IOError):
+            return None
+        return tuple(signatures)
+
+    def changed(self):
+        """
+        Find files which, changed since they are last parsed
+        @return list of changed files
+        """
+        return [file_name for file_name in self.files() if self.signature(file_name) != self.signatures.get(file_name)]
+
+    def update(self):
+        """
+        Parse changed files, calculate content and write it into target file
+        @return list of parsed files
+        """
+        started = time.time()
+        changed = self.changed()
+        for file_name in changed:
+            # Signature is taken before parsing so a write during parsing is seen, and saved after it so a file which,
+            # fails to parse is parsed again
+            signature = self.signature(file_name)
+            self.columns[file_name] = ColumnParser(file_name, workers=self.statistics.decode_workers).parse()
+            self.signatures[file_name] = signature
+
+        model = ClusterModel()
+        model.load_hosts(izip(*self.columns[self.statistics.host_file]))
+        model.load_instance_columns(*self.columns[self.statistics.instance_file])
+        model.group()
+        self.statistics.write_result(self.statistics.calculate_model_result(model))
+
+        self.latencies.append(time.time() - started)
+        return changed
+
+    def wait(self):
+        """
+        Block until a watched file changes and stays unchanged for debounce seconds
+        @return void
+        """
+        while self.running and not self.changed():
+            if self.inotify is not None:
+                self.inotify.wait(self.poll_interval)
+            else:
+                time.sleep(self.poll_interval)
+
+        # Wait out a burst of writes, every new signature restarts the quiet period
+        signatures = [self.signature(file_name) for file_name in self.files()]
+        while self.running:
+            time.sleep(self.debounce)
+            current = [self.signature(file_name) for file_name in self.files()]
+            if current == signatures:
+                break
+            signatures = current
+
+    def run(self, updates=None, progress=None):
+        """
+        Write target file and keep writing it again whenever watched files change
+        @param updates number of updates to wait for, it runs until stop is called if it is not given
+        @param progress function which, is called with a dictionary including "changed" files, "seconds", "ok" and
+         "error" after every update
+        @return list of latencies
+        """
+        self.running = True
+        changed = self.update()
+        if progress:
+            progress({"changed": changed, "seconds": self.latencies[-1], "ok": True, "error": None})
+        try:
+            while self.running and (updates is None or len(self.latencies) <= updates):
+                self.wait()
+                if not self.running:
+                    break
+                changed, error = self.changed(), None
+                try:
+                    self.update()
+                except (SyntaxError, IOError, OSError) as err:
+                    # A file may be malformed or missing until its writer is done, previous target file is kept
+                    Utilities.get_logger().error(err)
+                    error = str(err)
+                except SystemExit:
+                    # Statistics logs why a result can not be calculated or written and exits, an unwritable target
+                    # file skips the update instead of stopping the daemon
+                    error = "target file is not written, see log files"
+                if progress:
+                    progress({"changed": changed, "seconds": self.latencies[-1] if error is None else None,
+                              "ok": error is None, "error": error})
+        finally:
+            self.running = False
+            if self.inotify is not None:
+                self.inotify.close()
+        return self.latencies
+
+    def stop(self):
+        """
+        Stop watching after the current wait
+        @return void
+        """
+        self.running = False
@@ -30,9 +30,8 @@ THE SOFTWARE.
 from __future__ import division
 import os
 import sys
-import operator
 import traceback
-import re
+import collections
 
 __author__ = 'fatih'
 __date__ = '19/06/14'
@@ -45,6 +44,14 @@ sys.path.insert(0, '%s' % PARENT_DIR)
 
 # Import Utilities class to use required helper and utility methods
 from helper.Utilities import Utilities
+from helper.Metrics import Metrics, NullMetrics
+from app.StateReader import StateReader
+from app.Shards import expand
+from app.OutputWriter import OutputWriter, HOST_CLUSTERING, DATACENTRE_CLUSTERING, AVAILABLE_HOSTS
+from app.Fractions import is_larger
+
+# Engines and modes are imported by the methods which, use them, so a run of dict engine does not load numpy,
+# sqlite3 or an HTTP server at startup
 
 
 class Statistics(object):
@@ -66,6 +73,76 @@ class Statistics(object):
         self.instance_file = None
         self.target_file = None
 
+        # Number of worker processes which, decompress and parse shards of hosts and instances files
+        self.decode_workers = 0
+
+        # Name of the engine which, calculates the content: "dict", "columnar", "numpy", "parallel", "external",
+        # "sqlite" or "approximate"
+        self.engine = None
+
+        # Number of worker processes and maximum number of hosts in a shard of parallel engine
+        self.workers = 0
+        self.shard_size = 0
+
+        # Clustering report of every customer is written next to target file if it is enabled
+        self.report_enabled = False
+        self.report_file = None
+        self.report_top = 0
+
+        # Snapshot cache of parsed models, it is None if it is disabled
+        self.cache = None
+
+        # Timings and counters of a run, metrics_file is written next to target file if it is set
+        self.metrics = NullMetrics()
+        self.metrics_file = None
+
+        # Seconds files have to stay unchanged and seconds between polls in watch mode
+        self.watch_debounce = 0.5
+        self.watch_poll_interval = 1.0
+
+        # Memory budget of external engine in bytes and directory of its spilled runs, None means system default
+        self.memory_budget = 256 * 1024 * 1024
+        self.spill_directory = None
+
+        # Database of sqlite engine and number of rows inserted in a transaction
+        self.database = None
+        self.batch_size = 50000
+
+        # Error bound of data center fractions, number of counters of a host and number of candidates of approximate
+        # engine
+        self.epsilon = 0.001
+        self.host_counters = 2
+        self.candidates = 10
+
+        # Host and data center fractions of a customer which, are reported by diff when they are crossed
+        self.diff_host_threshold = 0.5
+        self.diff_center_threshold = 0.25
+
+        # Address of query server
+        self.server_address = ("127.0.0.1", 8642)
+
+        # Number of worker processes which, simulate evacuation scenarios, 1 simulates them in this process
+        self.simulation_workers = 1
+
+        # Largest host and data center fractions of a customer, seconds planning may take and the file of moves of
+        # rebalancing planner
+        self.rebalance_host_fraction = 0.5
+        self.rebalance_center_fraction = 0.25
+        self.rebalance_time_budget = 60.0
+        self.plan_file = None
+
+        # Number of worker processes shared by regions of a batch and manifest which, lists regions of a batch
+        self.batch_workers = 0
+        self.batch_manifest = None
+
+        # History of runs is appended into the store in history directory if it is enabled
+        self.history_enabled = False
+        self.history_directory = None
+
+        # Format of target file: "text", "jsonl" or "binary" and number of bytes buffered while it is written
+        self.output_format = "text"
+        self.output_buffer_size = 1024 * 1024
+
         # Load initially self files
         self.load_config()
 
@@ -75,37 +152,31 @@ class Statistics(object):
         @return void
         @param hosts_file source file to provide host list
         """
-        data_centers = {}
+        # Data centers and their hosts keep the order of hosts file so available hosts are listed in file order
+        data_centers = collections.OrderedDict()
         try:
-            # First retrieve host list from the source file
-            with open(hosts_file, "r") as h_file:
-                # Gather content of file and split lines
-                content = h_file.read()
-
-                # Check file content
-                if self.check_file(content):
-                    content = content.splitlines()
-                    for line in content:
-                        new_line = line.split(",")
-                        if new_line[2] in data_centers:
-                            data_centers[new_line[2]][new_line[0]] = {
-                                "number_of_slots": new_line[1],
-                                "instances": []
-                            }
-                        else:
-                            data_centers[new_line[2]] = {
-                                new_line[0]: {
-                                    "number_of_slots": new_line[1],
-                                    "instances": []
-                                }
-                            }
-                        # Fill the object with instances
-                        self.write_instances(
-                            key=new_line[0],
-                            target=data_centers[new_line[2]][new_line[0]])
-                    return data_centers
+            # Read instances file once and index its rows by host id, so hosts can be filled in a single pass
+            instances = self.index_instances(self.instance_file)
+
+            # Retrieve host list from the source file, lines are validated while they are read
+            for new_line in StateReader(hosts_file):
+                if new_line[2] in data_centers:
+                    data_centers[new_line[2]][new_line[0]] = {
+                        "number_of_slots": new_line[1],
+                        "instances": []
+                    }
                 else:
-                    raise SyntaxError("Content loaded from host file is malformed.")
+                    data_centers[new_line[2]] = collections.OrderedDict()
+                    data_centers[new_line[2]][new_line[0]] = {
+                        "number_of_slots": new_line[1],
+                        "instances": []
+                    }
+                # Fill the object with instances
+                self.write_instances(
+                    key=new_line[0],
+                    target=data_centers[new_line[2]][new_line[0]],
+                    index=instances)
+            return data_centers
 
         except EOFError as err:
             Utilities.log(Utilities.logging.ERROR, err)
@@ -116,33 +187,26 @@ class Statistics(object):
         except IndexError:
             Utilities.log(Utilities.logging.CRITICAL, "Content of file is malformed")
 
-    def write_instances(self, target=None, key=None):
+    def index_instances(self, instances_file):
         """
-        This method write instances retrieved from class instances file and push those instances into given target
-        @param target a data structure preferably dictionary
-        @return void
+        Read instances file once and group its instances by the host they belong to
+        @param instances_file source file to provide instance list
+        @return dictionary of host id => list of instances, etc: {'2': [{'instance_id': '1', 'customer_id': '8'}]}
         """
+        index = {}
         try:
-            # Fill the object with instances
-            with open(self.instance_file, "r") as h_file:
-                # Gather content of file and split lines
-                content = h_file.read()
-
-                # Check file content
-                if self.check_file(content):
-                    content = content.splitlines()
-                    for line in content:
-                        new_line = line.split(",")
-                        # Set instances into the host which, they belong to
-                        if new_line[2] == key:
-                            target["instances"].append({
-                                "instance_id": new_line[0],
-                                "customer_id": new_line[1]
-                            })
-                            # It is a class instance's object but it mostly will be required in some other cases
-                            # that is why it is better to also return the class object
+            # Lines are validated while they are read, a malformed line raises SyntaxError
+            for new_line in StateReader(instances_file):
+                instance = {
+                    "instance_id": new_line[0],
+                    "customer_id": new_line[1]
+                }
+                # Group instances under the host which, they belong to
+                if new_line[2] in index:
+                    index[new_line[2]].append(instance)
                 else:
-                    raise SyntaxError("Content loaded from instance file is malformed.")
+                    index[new_line[2]] = [instance]
+            return index
         except EOFError as err:
             Utilities.log(Utilities.logging.ERROR, err)
         except IOError:
@@ -150,6 +214,20 @@ class Statistics(object):
         except SyntaxError as err:
             Utilities.log(Utilities.logging.ERROR, err)
 
+    def write_instances(self, target=None, key=None, index=None):
+        """
+        This method write instances retrieved from class instances file and push those instances into given target
+        @param target a data structure preferably dictionary
+        @param key id of the host whose instances will be written
+        @param index optional host id => instances index built by index_instances, file is read again if not given
+        @return void
+        """
+        if index is None:
+            index = self.index_instances(self.instance_file)
+
+        # Set instances into the host which, they belong to
+        target["instances"].extend(index.get(key, []))
+
     def load_config(self):
         """
         Load configuration file to instance variables
@@ -159,6 +237,48 @@ class Statistics(object):
             self.host_file = PARENT_DIR + Utilities.config_get("files", "host_file")
             self.instance_file = PARENT_DIR + Utilities.config_get("files", "instance_file")
             self.target_file = PARENT_DIR + Utilities.config_get("files", "target_file")
+            self.decode_workers = int(Utilities.config_get("files", "workers"))
+            self.engine = Utilities.config_get("engine", "name")
+            self.workers = int(Utilities.config_get("engine", "workers"))
+            self.shard_size = int(Utilities.config_get("engine", "shard_size"))
+            self.report_enabled = Utilities.config_get("report", "enable") == "True"
+            self.report_file = PARENT_DIR + Utilities.config_get("report", "report_file")
+            self.report_top = int(Utilities.config_get("report", "top"))
+            if Utilities.config_get("cache", "enable") == "True":
+                from app.SnapshotCache import SnapshotCache
+                self.cache = SnapshotCache(
+                    PARENT_DIR + Utilities.config_get("cache", "directory"),
+                    int(Utilities.config_get("cache", "max_entries")),
+                    int(Utilities.config_get("cache", "max_bytes")))
+            if Utilities.config_get("metrics", "enable") == "True":
+                self.metrics = Metrics()
+                if Utilities.config_get("metrics", "sidecar") == "True":
+                    self.metrics_file = os.path.splitext(self.target_file)[0] + ".metrics.json"
+            self.watch_debounce = float(Utilities.config_get("watch", "debounce"))
+            self.watch_poll_interval = float(Utilities.config_get("watch", "poll_interval"))
+            self.memory_budget = int(Utilities.config_get("external", "memory_budget"))
+            if Utilities.config_get("external", "directory"):
+                self.spill_directory = PARENT_DIR + Utilities.config_get("external", "directory")
+            self.database = PARENT_DIR + Utilities.config_get("sqlite", "database")
+            self.batch_size = int(Utilities.config_get("sqlite", "batch_size"))
+            self.epsilon = float(Utilities.config_get("approximate", "epsilon"))
+            self.host_counters = int(Utilities.config_get("approximate", "host_counters"))
+            self.candidates = int(Utilities.config_get("approximate", "candidates"))
+            self.diff_host_threshold = float(Utilities.config_get("diff", "host_threshold"))
+            self.diff_center_threshold = float(Utilities.config_get("diff", "center_threshold"))
+            self.server_address = (Utilities.config_get("server", "host"), int(Utilities.config_get("server", "port")))
+            self.simulation_workers = int(Utilities.config_get("simulation", "workers"))
+            self.rebalance_host_fraction = float(Utilities.config_get("rebalance", "host_fraction"))
+            self.rebalance_center_fraction = float(Utilities.config_get("rebalance", "center_fraction"))
+            self.rebalance_time_budget = float(Utilities.config_get("rebalance", "time_budget"))
+            self.plan_file = PARENT_DIR + Utilities.config_get("rebalance", "plan_file")
+            self.batch_workers = int(Utilities.config_get("batch", "workers"))
+            if Utilities.config_get("batch", "manifest"):
+                self.batch_manifest = PARENT_DIR + Utilities.config_get("batch", "manifest")
+            self.history_enabled = Utilities.config_get("history", "enable") == "True"
+            self.history_directory = PARENT_DIR + Utilities.config_get("history", "directory")
+            self.output_format = Utilities.config_get("output", "format")
+            self.output_buffer_size = int(Utilities.config_get("output", "buffer_size"))
         except KeyError:
             Utilities.log(Utilities.logging.CRITICAL, "Required file(s) key could be found on configuration file.")
         except BaseException as exception:
@@ -171,13 +291,8 @@ class Statistics(object):
         @param file_to_check
         @return Boolean True or False
         """
-        # Pattern to check file content for provided files
-        pattern = re.compile("^(?:[0-9]+,[0-9]+,[0-9]+\\r\\n)*[0-9]+,[0-9]+,[0-9]+$")
         try:
-            if pattern.match(content_to_check):
-                return True
-            else:
-                return False
+            return StateReader.validate(content_to_check)
         except RuntimeError:
             Utilities.log(Utilities.logging.ERROR, traceback.format_exc())
             return False
@@ -187,22 +302,362 @@ class Statistics(object):
         Statistics instance runner
 
         It is not a thread but i like it to pretend as a thread
-        @return void
+        @return Metrics of the run, NullMetrics if metrics are disabled
         """
+        # Metrics of a previous run of this instance are not added up with this one
+        self.metrics.reset()
         # First fill hosts
         try:
-            self.write_target(
-                self.calculate_content(
-                    data_centers=self.fill_data_centers(self.host_file)
-                )
-            )
-            return True
+            model = data_centers = external = store = None
+            with self.metrics.stage("load"):
+                if self.engine in ("columnar", "numpy", "parallel"):
+                    model = self.load_model(self.host_file, self.instance_file)
+                elif self.engine in ("external", "approximate"):
+                    external = self.load_external()
+                elif self.engine == "sqlite":
+                    store = self.load_store()
+                else:
+                    data_centers = self.fill_data_centers(self.host_file)
+            if self.metrics.enabled:
+                self.count_loaded(model, data_centers, external, store)
+            with self.metrics.stage("calculate"):
+                if model is not None:
+                    result = self.calculate_model_result(model)
+                elif external is not None or store is not None:
+                    result = (external or store).calculate()
+                else:
+                    result = self.calculate_content_result(data_centers=data_centers)
+            with self.metrics.stage("write_target"):
+                self.write_result(result)
+            if self.report_enabled:
+                with self.metrics.stage("report"):
+                    self.report(model)
+            if self.history_enabled:
+                with self.metrics.stage("history"):
+                    self.record_history(model)
+            if self.metrics.enabled and self.metrics_file:
+                self.metrics.write(self.metrics_file)
+            return self.metrics
         except SyntaxError as err:
             Utilities.log(Utilities.logging.CRITICAL, err)
         except BaseException:
             Utilities.log(Utilities.logging.CRITICAL, traceback.format_exc())
             return False
 
+    def watch(self, updates=None, progress=None):
+        """
+        Write target file and write it again whenever hosts or instances file changes
+        @param updates number of updates to wait for, it runs until interrupted if it is not given
+        @param progress function which, is called with a dictionary after every update, see Watcher.run
+        @return list of latencies of the first calculation and the updates in seconds
+        """
+        from app.Watcher import Watcher
+        watcher = Watcher(self, self.watch_debounce, self.watch_poll_interval)
+        try:
+            return watcher.run(updates, progress)
+        except KeyboardInterrupt:
+            return watcher.latencies
+
+    def diff(self, host_file, instance_file):
+        """
+        Compare a previous snapshot with configured hosts and instances files, see SnapshotDiff
+        @param host_file hosts file of the previous snapshot
+        @param instance_file instances file of the previous snapshot
+        @return list of lines of changes
+        """
+        from app.SnapshotDiff import SnapshotDiff
+        before = self.load_model(host_file, instance_file)
+        after = self.load_model(self.host_file, self.instance_file)
+        return SnapshotDiff(before, after, self.diff_host_threshold, self.diff_center_threshold).calculate().lines()
+
+    def serve(self):
+        """
+        Keep files loaded and answer queries over HTTP until interrupted, see QueryServer
+        @return void
+        """
+        from app.QueryServer import QueryServer
+        server = QueryServer(self, self.server_address)
+        print "Serving on http://%s:%d/" % server.server_address
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+
+    def count_loaded(self, model=None, data_centers=None, external=None, store=None):
+        """
+        Count bytes, rows, hosts and instances loaded from hosts and instances files into metrics
+        @param model ClusterModel if a model engine is used
+        @param data_centers data centers structure if dict engine is used
+        @param external ExternalEngine or ApproximateEngine if external or approximate engine is used
+        @param store SqlStore if sqlite engine is used
+        @return void
+        """
+        if model is not None:
+            hosts, instances, orphans = len(model.host_ids), len(model.instance_ids), model.orphans
+        elif external is not None:
+            hosts, instances, orphans = len(external.host_ids), external.instances, external.orphans
+            from app.ExternalEngine import ExternalEngine
+            if isinstance(external, ExternalEngine):
+                self.metrics.count("runs", len(external.runs))
+        elif store is not None:
+            hosts, instances, orphans = store.hosts, store.instances, store.orphans
+        else:
+            hosts = sum(len(data_centers[center]) for center in data_centers)
+            instances = sum(len(data_centers[center][host]["instances"])
+                            for center in data_centers for host in data_centers[center])
+            orphans = 0
+        # Inputs may be glob patterns or manifests, so the sizes of the files they expand into are counted
+        self.metrics.count("bytes_read", sum(os.path.getsize(shard)
+                                             for file_name in (self.host_file, self.instance_file)
+                                             for shard in expand(file_name)))
+        self.metrics.count("rows_parsed", hosts + instances + orphans)
+        self.metrics.count("hosts", hosts)
+        self.metrics.count("instances", instances)
+        self.metrics.count("orphans", orphans)
+
+    def load_model(self, hosts_file, instances_file):
+        """
+        Load hosts and instances files into typed columns instead of data centers dictionary
+        @param hosts_file source file to provide host list
+        @param instances_file source file to provide instance list
+        @return ClusterModel
+        """
+        from app.ClusterModel import ClusterModel
+        try:
+            if self.cache is None:
+                return ClusterModel.load(hosts_file, instances_file, self.decode_workers)
+            model = self.cache.load(hosts_file, instances_file)
+            if model is None:
+                model = ClusterModel.load(hosts_file, instances_file, self.decode_workers)
+                self.cache.store(hosts_file, instances_file, model)
+            return model
+        except IOError:
+            Utilities.log(Utilities.logging.ERROR,
+                          "There is no required file to retrieve hosts or instances in given path.")
+        except SyntaxError as err:
+            Utilities.log(Utilities.logging.ERROR, err)
+
+    def load_external(self):
+        """
+        Count instances of configured files within the memory budget of external engine or within the error bound of
+        approximate engine, see ExternalEngine and ApproximateEngine
+        @return ExternalEngine or ApproximateEngine which, is ready to calculate
+        """
+        try:
+            if self.engine == "approximate":
+                from app.ApproximateEngine import ApproximateEngine
+                external = ApproximateEngine(self.host_file, self.instance_file, self.epsilon, self.host_counters,
+                                             self.candidates)
+            else:
+                from app.ExternalEngine import ExternalEngine
+                external = ExternalEngine(self.host_file, self.instance_file, self.memory_budget, self.spill_directory)
+            external.load()
+            return external
+        except IOError:
+            Utilities.log(Utilities.logging.ERROR,
+                          "There is no required file to retrieve hosts or instances in given path.")
+        except SyntaxError as err:
+            Utilities.log(Utilities.logging.ERROR, err)
+
+    def load_store(self):
+        """
+        Load configured files into the database of sqlite engine, the database is kept for ad hoc queries
+        afterwards, see SqlStore
+        @return SqlStore
+        """
+        from app.SqlStore import SqlStore
+        try:
+            store = SqlStore(self.database, self.batch_size)
+            store.load(self.host_file, self.instance_file)
+            return store
+        except IOError:
+            Utilities.log(Utilities.logging.ERROR,
+                          "There is no required file to retrieve hosts or instances in given path.")
+        except SyntaxError as err:
+            Utilities.log(Utilities.logging.ERROR, err)
+
+    def load_incremental(self):
+        """
+        Load configured files into an incremental engine, it is kept up to date by placement and eviction events
+        afterwards, see IncrementalEngine.replay
+        @return IncrementalEngine
+        """
+        from app.IncrementalEngine import IncrementalEngine
+        return IncrementalEngine.from_model(self.load_model(self.host_file, self.instance_file))
+
+    def simulate(self, scenarios):
+        """
+        Calculate statistics of configured files as if hosts or data centers of every scenario were drained, see
+        EvacuationSimulator
+        @param scenarios iterable of (host ids, data center ids) tuples
+        @return list of results in order of scenarios, see EvacuationSimulator.simulate
+        """
+        from app.EvacuationSimulator import EvacuationSimulator
+        simulator = EvacuationSimulator(self.load_model(self.host_file, self.instance_file))
+        return simulator.evaluate(scenarios, self.simulation_workers)
+
+    def rebalance(self):
+        """
+        Plan instance moves which, bring customers under configured fractions and write them into plan file, see
+        RebalancePlanner
+        @return lines of resulting clustering and number of moves
+        """
+        from app.RebalancePlanner import RebalancePlanner
+        try:
+            planner = RebalancePlanner(self.load_model(self.host_file, self.instance_file),
+                                       self.rebalance_host_fraction, self.rebalance_center_fraction,
+                                       self.rebalance_time_budget).plan()
+            planner.write(self.plan_file)
+            result = planner.calculate()
+            return self.format_content(result["host"], result["center"], [])[:2] + [
+                "Moves: %(moves)d" % result,
+                "Unresolved: %d%s" % (result["unresolved"], "" if result["complete"] else ", time budget ran out")]
+        except IOError:
+            Utilities.log(Utilities.logging.ERROR, "Plan file can not be opened to write.")
+
+    def regions(self):
+        """
+        List regions of a batch: [region:<name>] sections of config file, then lines of batch manifest
+        @return list of dictionaries which include "name", "host_file", "instance_file" and "target_file"
+        """
+        from app.BatchRunner import BatchRunner
+        regions = [{
+            "name": section.split(":", 1)[1],
+            "host_file": PARENT_DIR + Utilities.config_get(section, "host_file"),
+            "instance_file": PARENT_DIR + Utilities.config_get(section, "instance_file"),
+            "target_file": PARENT_DIR + Utilities.config_get(section, "target_file")
+        } for section in Utilities.config_sections("region:")]
+        if self.batch_manifest:
+            regions.extend(BatchRunner.read_manifest(self.batch_manifest))
+        return regions
+
+    def batch(self, regions=None, progress=None):
+        """
+        Run every region of a batch in a shared pool of worker processes, a region which fails does not stop the
+        others, see BatchRunner
+        @param regions list of regions, configured regions are run if it is not given
+        @param progress callable which, is called as every region finishes, see BatchRunner.run
+        @return list of results in order of regions, see BatchRunner.run
+        """
+        from app.BatchRunner import BatchRunner
+        try:
+            if regions is None:
+                regions = self.regions()
+            return BatchRunner(self, regions, self.batch_workers).run(progress)
+        except IOError:
+            Utilities.log(Utilities.logging.ERROR, "There is no batch manifest in given path.")
+        except SyntaxError as err:
+            Utilities.log(Utilities.logging.ERROR, err)
+
+    def load_free_slots(self):
+        """
+        Load configured files into a free slot index to place new instances, see FreeSlotIndex.place
+        @return FreeSlotIndex
+        """
+        from app.FreeSlotIndex import FreeSlotIndex
+        return FreeSlotIndex.from_data_centers(self.fill_data_centers(self.host_file))
+
+    def report(self, model=None):
+        """
+        Calculate clustering report of every customer and write its customer table into report file
+        @param model ClusterModel, configured files are loaded if it is not given
+        @return ClusteringReport
+        """
+        from app.ClusteringReport import ClusteringReport
+        try:
+            if model is None:
+                model = self.load_model(self.host_file, self.instance_file)
+            report = ClusteringReport(model, self.report_top).calculate()
+            report.write_csv(self.report_file)
+            return report
+        except IOError:
+            Utilities.log(Utilities.logging.ERROR, "Report file can not be opened to write.")
+
+    def record_history(self, model=None, time=None):
+        """
+        Append statistics of the fleet and every data center into history store, see HistoryStore
+        @param model ClusterModel, configured files are loaded if it is not given
+        @param time seconds since epoch of the run, now if it is not given
+        @return void
+        """
+        import time as clock
+        from app.HistoryStore import HistoryStore
+        if model is None:
+            model = self.load_model(self.host_file, self.instance_file)
+        store = HistoryStore(self.history_directory)
+        try:
+            store.append(clock.time() if time is None else time, HistoryStore.rows(model))
+        finally:
+            store.close()
+
+    def history(self, center_id, days):
+        """
+        Summarize history of a data center or the fleet over the last days
+        @param center_id data center id, -1 for the whole fleet
+        @param days number of days
+        @return lines of minimum, maximum and mean of HostClustering, DatacentreClustering and free slots
+        """
+        import time as clock
+        from app.HistoryStore import HistoryStore
+        store = HistoryStore(self.history_directory)
+        try:
+            end = clock.time()
+            lines = []
+            for name, field in (("HostClustering", "host"), ("DatacentreClustering", "center"),
+                                ("FreeSlots", "free_slots")):
+                values = [store.query(center_id, end - days * 86400, end, field, aggregate)
+                          for aggregate in ("min", "max", "mean")]
+                lines.append("%s: " % name + ("no runs" if values[0] is None else "min %.2f, max %.2f, mean %.2f" %
+                                              tuple(values)))
+            return lines
+        finally:
+            store.close()
+
+    def calculate_model(self, model=None):
+        """
+        Calculate the content over a columnar model, see calculate_content
+        @param model ClusterModel
+        @rtype : a list including formatted data
+        """
+        result = self.calculate_model_result(model)
+        if result:
+            return self.format_content(result["host"], result["center"], result["available_hosts"])
+
+    def calculate_model_result(self, model=None):
+        """
+        Calculate the result over a columnar model by configured engine
+        @param model ClusterModel
+        @return dictionary which includes "host" and "center" records and "available_hosts" list of host ids
+        """
+        try:
+            if self.engine == "numpy":
+                from app.VectorEngine import VectorEngine
+                result = VectorEngine(model).calculate()
+            elif self.engine == "parallel":
+                from app.ParallelEngine import ParallelEngine
+                result = ParallelEngine(model, self.workers, self.shard_size).calculate()
+            else:
+                result = model.calculate()
+            return result
+        except BaseException:
+            Utilities.log(Utilities.logging.ERROR, traceback.format_exc())
+
+    def write_result(self, result=None):
+        """
+        Stream a calculated result into target file in configured format, see OutputWriter
+        @param result dictionary which includes "host" and "center" records and "available_hosts" iterable of host ids
+        @return True if target file is written
+        """
+        try:
+            if result:
+                return OutputWriter(self.target_file, self.output_format, self.output_buffer_size).write(result)
+            else:
+                print "Error occurred while running the process. Please see log files."
+        except IOError:
+            Utilities.log(Utilities.logging.ERROR, "Destination file can not be opened to write.")
+        except ValueError as err:
+            Utilities.log(Utilities.logging.ERROR, err)
+
     def write_target(self, content=None):
         """
         Write calculated content into target file
@@ -211,10 +666,8 @@ class Statistics(object):
         """
         try:
             if content:
-                with open(self.target_file, "w+") as target:
-                    for line in content:
-                        target.write("%s\n" % line)
-                return True
+                # Content replaces target file at once, so readers never see a half written file
+                return OutputWriter(self.target_file, buffer_size=self.output_buffer_size).write_lines(content)
             else:
                 print "Error occurred while running the process. Please see log files."
         except IOError:
@@ -226,35 +679,33 @@ class Statistics(object):
 
     def calculate_content(self, data_centers=None):
         """
-        Calculate the content by given parameters regarding algorithm
+        Calculate the content by given parameters regarding algorithm, see calculate_content_result
         @param data_centers
         @rtype : a list including formatted data
-        @return Object which includes:
+        """
+        result = self.calculate_content_result(data_centers)
+        if result:
+            return self.format_content(result["host"], result["center"], result["available_hosts"])
+
+    def calculate_content_result(self, data_centers=None):
+        """
+        Calculate the result by given parameters regarding algorithm
+        @param data_centers
+        @return dictionary which includes:
          customer with the largest fraction of their total fleet of instances on a single host and output
          the value of that fraction;
          customer with the largest fraction of their total fleet of instances in a single data centre and output
          the value of that fraction;
          a list of all the hosts which have at least one empty slot.
+         They are kept as "host", "center" and "available_hosts" keys like ClusterModel.calculate does
         """
         try:
-            # Host clustering pattern
-            host_clustering = "HostClustering: %(customer_id)s, %(fraction).2f"
             max_host = {"fraction": 0, "customer_id": None}
-
-            # Data center clustering pattern
-            data_centre_clustering = "DatacentreClustering: %(customer_id)s, %(fraction).2f"
             max_center = {"fraction": 0, "customer_id": None}
-
-            # Available hosts list pattern & host
-            available_hosts = "AvailableHosts: "
             available_hosts_list = []
 
             # Calculate fraction for customer and hosts and find available hosts
             for center in data_centers:
-                # Fraction of a host it starts with 1 because it has no effect when getting fraction
-                # but it has to start with 1 by counting customers who have instance(s) on host/ data center
-                fraction_of_host = 1
-
                 # It is used to get total number of slots in a data center even though we know number of slots
                 # in a single host but not data center
                 max_number_of_slots = 0
@@ -265,62 +716,75 @@ class Statistics(object):
 
                 # Loop in hosts including by data center
                 for host in data_centers[center]:
-                    tmp_val = 0
+                    number_of_slots = int(data_centers[center][host]["number_of_slots"])
+                    instances = data_centers[center][host]["instances"]
+
                     # Find available hosts
-                    if int(data_centers[center][host]["number_of_slots"]) - len(
-                            data_centers[center][host]["instances"]) > 0:
+                    if number_of_slots - len(instances) > 0:
                         # Append the hosts that has an empty slot on it
                         available_hosts_list.append(host)
-                    # Find largest fraction of total fleet of instances on a single host
-                    for instance in data_centers[center][host]["instances"]:
-                        # If current customer id is same with previous one increase fraction count
-                        if instance["customer_id"] == tmp_val:
-                            fraction_of_host += 1
-                            # Calculate fraction if one customer has more than one instance on a single host then
-                            fraction = float(fraction_of_host / int(data_centers[center][host]["number_of_slots"]))
-
-                            # Check if recorded fraction is smaller than new one and then
-                            if max_host["fraction"] < fraction:
-                                # Set new one as recorded maximum fraction
-                                max_host["fraction"] = fraction
-                                # And get customer id who, has largest fraction
-                                max_host["customer_id"] = instance["customer_id"]
-
-                        # Set recent customer id to tmp to check following one with this
-                        tmp_val = instance["customer_id"]
 
+                    # Same structure with number_of_instance but it is kept for a single host
+                    number_of_host_instance = {}
+                    for instance in instances:
+                        customer_id = instance["customer_id"]
+                        number_of_host_instance[customer_id] = number_of_host_instance.get(customer_id, 0) + 1
                         # Get total number of instances from a data center
-                        if instance["customer_id"] in number_of_instance:
-                            number_of_instance[instance["customer_id"]] += 1
-                        else:
-                            number_of_instance[instance["customer_id"]] = 1
+                        number_of_instance[customer_id] = number_of_instance.get(customer_id, 0) + 1
+
+                    # Find largest fraction of total fleet of instances on a single host
+                    if number_of_slots:
+                        for customer_id, count in number_of_host_instance.iteritems():
+                            fraction = count / number_of_slots
+                            if is_larger(fraction, customer_id, max_host):
+                                max_host = {"fraction": fraction, "customer_id": customer_id}
+
                     # Find largest fraction of total flees ot instances on a single data center
-                    max_number_of_slots += int(data_centers[center][host]["number_of_slots"])
+                    max_number_of_slots += number_of_slots
 
                 # Calculate largest fraction by given values on a single data center
-                fraction = float(max(number_of_instance.iteritems(), key=operator.itemgetter(1))[1] / max_number_of_slots)
-                # Check which one is larger and find max one
-                if max_center["fraction"] < fraction:
-                    max_center["fraction"] = fraction
-                    # Find maximum value of iteration items in total number of instances
-                    max_center["customer_id"] = max(number_of_instance.iteritems(), key=operator.itemgetter(1))[0]
-
-            # Make a response body to use it anywhere
-            response = []
-
-            # Join available host into a single string
-            available_hosts += ",".join(available_hosts_list)
-
-            # Format patterns by calculated values
-            response.append(host_clustering % max_host)
-            response.append(data_centre_clustering % max_center)
-            response.append(available_hosts)
-
-            # return response as a list
-            return response
+                if max_number_of_slots:
+                    for customer_id, count in number_of_instance.iteritems():
+                        fraction = count / max_number_of_slots
+                        if is_larger(fraction, customer_id, max_center):
+                            max_center = {"fraction": fraction, "customer_id": customer_id}
+
+            return {"host": max_host, "center": max_center, "available_hosts": available_hosts_list}
         except BaseException:
             Utilities.log(Utilities.logging.ERROR, traceback.format_exc())
 
+    @classmethod
+    def format_content(cls, max_host, max_center, available_hosts_list):
+        """
+        Format calculated values as the lines of target file
+        @param max_host dictionary including "customer_id" and "fraction" of largest host fraction
+        @param max_center dictionary including "customer_id" and "fraction" of largest data center fraction
+        @param available_hosts_list ids of the hosts which, have at least one empty slot
+        @rtype : a list including formatted data
+        """
+        # Host clustering pattern
+        host_clustering = HOST_CLUSTERING
+
+        # Data center clustering pattern
+        data_centre_clustering = DATACENTRE_CLUSTERING
+
+        # Available hosts list pattern & host
+        available_hosts = AVAILABLE_HOSTS
+
+        # Make a response body to use it anywhere
+        response = []
+
+        # Join available host into a single string
+        available_hosts += ",".join(str(host) for host in available_hosts_list)
+
+        # Format patterns by calculated values
+        response.append(host_clustering % max_host)
+        response.append(data_centre_clustering % max_center)
+        response.append(available_hosts)
+
+        # return response as a list
+        return response
+
 
 if __name__ == "__main__":
     # Create an instance of Statistics object
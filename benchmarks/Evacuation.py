@@ -0,0 +1,109 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+# Set project directory to import required files, packages or objects when benchmarks are run as a script
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, '%s' % PROJECT_DIR)
+
+from app.ClusterModel import ClusterModel
+from app.EvacuationSimulator import EvacuationSimulator
+from benchmarks.FleetGenerator import FleetGenerator
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+def scenarios(model, number, drained_hosts, seed):
+    """
+    Draw random scenarios, every tenth one drains a whole data center
+    @param model ClusterModel
+    @param number number of scenarios
+    @param drained_hosts number of hosts drained by the other scenarios
+    @param seed seed of random generator
+    @return list of (host ids, data center ids) tuples
+    """
+    generator = random.Random(seed)
+    host_ids, center_ids = list(model.host_ids), list(model.center_ids)
+    return [([], [generator.choice(center_ids)]) if index % 10 == 9 else
+            (generator.sample(host_ids, drained_hosts), []) for index in xrange(number)]
+
+
+def main(arguments=None):
+    """
+    Command line entry of evacuation simulator benchmark
+    @param arguments list of command line arguments
+    @return void
+    """
+    parser = argparse.ArgumentParser(description="Measure scenarios per second of evacuation simulator.")
+    parser.add_argument("--centers", type=int, default=20)
+    parser.add_argument("--hosts", type=int, default=20000)
+    parser.add_argument("--scenarios", type=int, default=1000)
+    parser.add_argument("--drained-hosts", type=int, default=10, help="number of hosts drained by a scenario")
+    parser.add_argument("--workers", default="1,0", help="comma separated numbers of processes, 0 means CPUs")
+    parser.add_argument("--seed", type=int, default=42)
+    options = parser.parse_args(arguments)
+
+    directory = tempfile.mkdtemp()
+    try:
+        host_file = os.path.join(directory, "HostState.txt")
+        instance_file = os.path.join(directory, "InstanceState.txt")
+        FleetGenerator(options.centers, options.hosts, seed=options.seed).write(host_file, instance_file)
+        model = ClusterModel.load(host_file, instance_file)
+
+        started = time.time()
+        simulator = EvacuationSimulator(model)
+        print "%d hosts, %d instances, simulator built in %.3fs" % (
+            len(model.host_ids), len(model.instance_ids), time.time() - started)
+
+        # Rerunning the whole calculation is what a scenario costs without the simulator
+        started = time.time()
+        model.calculate()
+        print "full calculation: %.1f scenarios/s" % (1 / (time.time() - started))
+
+        drawn = scenarios(model, options.scenarios, options.drained_hosts, options.seed)
+        for workers in options.workers.split(","):
+            started = time.time()
+            simulator.evaluate(drawn, int(workers))
+            print "simulator, %s worker(s): %.1f scenarios/s" % (workers, len(drawn) / (time.time() - started))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
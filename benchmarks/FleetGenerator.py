@@ -0,0 +1,110 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import bisect
+import random
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+class FleetGenerator(object):
+    """
+    FleetGenerator writes deterministic "HostState.txt" and "InstanceState.txt" files of a synthetic fleet. The same
+    parameters and seed always give the same files, so results of different commits are comparable.
+
+    Customers of instances follow a Zipf distribution, customer k is picked with a weight of 1 / k ** skew; a skew
+    of 0 picks every customer equally likely and a larger skew concentrates instances on fewer customers.
+    """
+
+    def __init__(self, centers=3, hosts=1000, slots=(2, 16), customers=100, skew=1.1, fill=0.75, seed=42):
+        """
+        Constructor of FleetGenerator class
+        @param centers number of data centers
+        @param hosts number of hosts, they are spread over data centers evenly
+        @param slots tuple of minimum and maximum number of slots of a host
+        @param customers number of customers
+        @param skew exponent of Zipf distribution of customers
+        @param fill expected fraction of slots which, are used by instances
+        @param seed seed of random number generator
+        @return instance
+        """
+        super(FleetGenerator, self).__init__()
+        self.centers = centers
+        self.hosts = hosts
+        self.slots = slots
+        self.customers = customers
+        self.skew = skew
+        self.fill = fill
+        self.seed = seed
+
+        # Cumulative weights of customers to pick them by a binary search
+        self.weights = []
+        total = 0.0
+        for customer in xrange(1, customers + 1):
+            total += 1.0 / customer ** skew
+            self.weights.append(total)
+
+    def parameters(self):
+        """
+        Parameters of the fleet
+        @return dictionary
+        """
+        return {"centers": self.centers, "hosts": self.hosts, "slots": list(self.slots), "customers": self.customers,
+                "skew": self.skew, "fill": self.fill, "seed": self.seed}
+
+    def customer(self, generator):
+        """
+        Pick a customer
+        @param generator random.Random
+        @return customer id
+        """
+        return bisect.bisect_left(self.weights, generator.random() * self.weights[-1]) + 1
+
+    def write(self, host_file, instance_file):
+        """
+        Write hosts and instances files, lines end with "\\r\\n" like the files in data directory
+        @param host_file path of hosts file
+        @param instance_file path of instances file
+        @return tuple of number of hosts and number of instances
+        """
+        generator = random.Random(self.seed)
+        instance_id = 0
+        with open(host_file, "wb") as hosts, open(instance_file, "wb") as instances:
+            for host_id in xrange(1, self.hosts + 1):
+                number_of_slots = generator.randint(*self.slots)
+                hosts.write("%s%d,%d,%d" % ("\r\n" if host_id > 1 else "", host_id, number_of_slots,
+                                            host_id % self.centers))
+                for _ in xrange(number_of_slots):
+                    if generator.random() < self.fill:
+                        instance_id += 1
+                        instances.write("%s%d,%d,%d" % ("\r\n" if instance_id > 1 else "", instance_id,
+                                                        self.customer(generator), host_id))
+        return self.hosts, instance_id
@@ -0,0 +1,157 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Set project directory to import required files, packages or objects when benchmarks are run as a script
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, '%s' % PROJECT_DIR)
+
+from app.ApproximateEngine import ApproximateEngine
+from app.ClusterModel import ClusterModel
+from app.ClusteringReport import ClusteringReport
+from app.VectorEngine import numpy
+from benchmarks import deep_sizeof
+from benchmarks.FleetGenerator import FleetGenerator
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+def exact_pairs(model):
+    """
+    Exact (customer, host) and (customer, data center) counts, an exact single pass over an instances file which, is
+    not grouped by host has to hold all of them
+    @param model ClusterModel
+    @return tuple of dictionaries of (customer id, host id) => count and (customer id, data center id) => count
+    """
+    hosts, centers = {}, {}
+    for customer_id, host in zip(model.instance_customers, model.instance_hosts):
+        pair = (customer_id, model.host_ids[host])
+        hosts[pair] = hosts.get(pair, 0) + 1
+        pair = (customer_id, model.center_ids[model.host_centers[host]])
+        centers[pair] = centers.get(pair, 0) + 1
+    return hosts, centers
+
+
+def accuracy(engine, model, hosts, centers, top):
+    """
+    Compare candidates of an approximate engine with exact fractions
+    @param engine loaded ApproximateEngine
+    @param model ClusterModel of the same files
+    @param hosts exact (customer id, host id) counts
+    @param centers exact (customer id, data center id) counts
+    @param top number of most concentrated pairs compared
+    @return dictionary of largest fraction errors of candidates and recall of exact top pairs
+    """
+    slots = dict(zip(model.host_ids, model.host_slots))
+    center_slots = {}
+    for host, center in enumerate(model.host_centers):
+        center_slots[model.center_ids[center]] = center_slots.get(model.center_ids[center], 0) + model.host_slots[host]
+    report = ClusteringReport(model, top).calculate()
+
+    host_errors = [candidate["fraction"] - hosts[(candidate["customer_id"], candidate["id"])] / slots[candidate["id"]]
+                   for candidate in engine.hosts()]
+    center_errors = [candidate["fraction"] - centers.get((candidate["customer_id"], candidate["id"]), 0) /
+                     center_slots[candidate["id"]] for candidate in engine.centers()]
+    # Exact top pairs may tie with many others, a candidate counts if its exact fraction reaches the exact top ones
+    host_floor = min(pair["fraction"] for pair in report.hosts())
+    center_floor = min(pair["fraction"] for pair in report.centers())
+    exact_centers = set((pair["customer_id"], pair["id"]) for pair in report.centers())
+    return {
+        "host_error": max(host_errors),
+        "center_error": max(center_errors),
+        "host_precision": sum(candidate["fraction"] - error >= host_floor
+                              for candidate, error in zip(engine.hosts(), host_errors)) / len(host_errors),
+        "center_recall": len(exact_centers & set((candidate["customer_id"], candidate["id"])
+                                                 for candidate in engine.centers())) / len(exact_centers),
+        "center_floor": center_floor
+    }
+
+
+def main(arguments=None):
+    """
+    Command line entry of approximate engine benchmark
+    @param arguments list of command line arguments
+    @return void
+    """
+    parser = argparse.ArgumentParser(description="Compare approximate engine with exact fractions.")
+    parser.add_argument("--hosts", type=int, default=100000)
+    parser.add_argument("--customers", type=int, default=30000)
+    parser.add_argument("--epsilons", default="0.01,0.001,0.0001", help="comma separated error bounds")
+    parser.add_argument("--host-counters", type=int, default=2, help="number of counters of a host")
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    options = parser.parse_args(arguments)
+    if numpy is None:
+        parser.error("numpy is required by approximate engine")
+
+    directory = tempfile.mkdtemp()
+    try:
+        host_file = os.path.join(directory, "HostState.txt")
+        instance_file = os.path.join(directory, "InstanceState.txt")
+        number_of_hosts, number_of_instances = FleetGenerator(
+            5, options.hosts, (2, 16), options.customers, 1.1, 0.9, options.seed).write(host_file, instance_file)
+        started = time.time()
+        model = ClusterModel.load(host_file, instance_file)
+        expected = model.calculate()
+        exact_time = time.time() - started
+        hosts, centers = exact_pairs(model)
+        exact_bytes = deep_sizeof(hosts) + deep_sizeof(centers)
+        print "%d hosts, %d instances, exact %.3fs, exact pair counts %.1f MB" % (
+            number_of_hosts, number_of_instances, exact_time, exact_bytes / 1024.0 ** 2)
+
+        for epsilon in options.epsilons.split(","):
+            started = time.time()
+            engine = ApproximateEngine(host_file, instance_file, float(epsilon), options.host_counters,
+                                       options.candidates)
+            engine.load()
+            result = engine.calculate()
+            elapsed = time.time() - started
+            scores = accuracy(engine, model, hosts, centers, options.candidates)
+            print "epsilon %s: %.3fs, %.1f MB, host %s, center %s" % (
+                epsilon, elapsed, engine.nbytes() / 1024.0 ** 2,
+                "match" if result["host"] == expected["host"] else "%(customer_id)s %(fraction).4f" % result["host"],
+                "match" if result["center"] == expected["center"] else
+                "%(customer_id)s %(fraction).4f" % result["center"])
+            print "  host candidates: largest error %(host_error).4f, precision %(host_precision).2f" % scores
+            print "  center candidates: largest error %(center_error).4f, recall %(center_recall).2f" % scores
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
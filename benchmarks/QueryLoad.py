@@ -0,0 +1,143 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import sys
+import time
+import shutil
+import httplib
+import argparse
+import tempfile
+import threading
+import subprocess
+
+# Set project directory to import required files, packages or objects when benchmarks are run as a script
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, '%s' % PROJECT_DIR)
+
+from app import Statistics
+from app.QueryServer import QueryServer
+from benchmarks.FleetGenerator import FleetGenerator
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# A query answered by a new process, like tools do when they run the script and parse Statistics.txt
+PROCESS_QUERY = """
+import sys
+sys.path.insert(0, %r)
+from app import Statistics
+from app.ClusterModel import ClusterModel
+result = ClusterModel.load(%r, %r).calculate()
+print Statistics.format_content(result["host"], result["center"], result["available_hosts"])[0]
+"""
+
+
+def server_load(server, paths, requests, concurrency):
+    """
+    Send requests to a query server from concurrent clients with keep alive connections
+    @param server started QueryServer
+    @param paths paths to query in turn
+    @param requests total number of requests
+    @param concurrency number of clients
+    @return requests per second
+    """
+    def client(number):
+        connection = httplib.HTTPConnection(*server.server_address)
+        for index in xrange(number):
+            connection.request("GET", paths[index % len(paths)])
+            connection.getresponse().read()
+        connection.close()
+
+    clients = [threading.Thread(target=client, args=(requests // concurrency,)) for _ in xrange(concurrency)]
+    started = time.time()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return requests // concurrency * concurrency / (time.time() - started)
+
+
+def process_load(host_file, instance_file, requests):
+    """
+    Answer queries by starting a process for every one of them
+    @param host_file
+    @param instance_file
+    @param requests number of queries
+    @return requests per second
+    """
+    script = PROCESS_QUERY % (PROJECT_DIR, host_file, instance_file)
+    started = time.time()
+    for _ in xrange(requests):
+        subprocess.check_output([sys.executable, "-c", script])
+    return requests / (time.time() - started)
+
+
+def main(arguments=None):
+    """
+    Command line entry of query server load test
+    @param arguments list of command line arguments
+    @return void
+    """
+    parser = argparse.ArgumentParser(description="Compare query server with a process per query.")
+    parser.add_argument("--hosts", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=10000, help="number of requests sent to query server")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=10, help="number of queries answered by new processes")
+    parser.add_argument("--seed", type=int, default=42)
+    options = parser.parse_args(arguments)
+
+    directory = tempfile.mkdtemp()
+    try:
+        statistics = Statistics()
+        statistics.host_file = os.path.join(directory, "HostState.txt")
+        statistics.instance_file = os.path.join(directory, "InstanceState.txt")
+        generator = FleetGenerator(3, options.hosts, (2, 16), 1000, 1.1, 0.75, options.seed)
+        generator.write(statistics.host_file, statistics.instance_file)
+
+        started = time.time()
+        server = QueryServer(statistics, ("127.0.0.1", 0))
+        server.start()
+        print "server loaded %d hosts in %.3fs" % (options.hosts, time.time() - started)
+        try:
+            paths = ["/host", "/center", "/centers/1", "/customers/1"]
+            warm = server_load(server, paths, options.requests, options.concurrency)
+        finally:
+            server.stop()
+        cold = process_load(statistics.host_file, statistics.instance_file, options.processes)
+        print "query server:      %10.1f requests/s" % warm
+        print "process per query: %10.1f requests/s" % cold
+        print "query server answers %.0fx more requests" % (warm / cold)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+from __future__ import division
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Set project directory to import required files, packages or objects when benchmarks are run as a script
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, '%s' % PROJECT_DIR)
+
+from app.ClusterModel import ClusterModel
+from app.RebalancePlanner import RebalancePlanner
+from benchmarks.FleetGenerator import FleetGenerator
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+def main(arguments=None):
+    """
+    Command line entry of rebalancing planner benchmark
+    @param arguments list of command line arguments
+    @return void
+    """
+    parser = argparse.ArgumentParser(description="Measure planning time and moves of rebalancing planner.")
+    parser.add_argument("--centers", type=int, default=10)
+    parser.add_argument("--hosts", type=int, default=150000)
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--host-fraction", type=float, default=0.5)
+    parser.add_argument("--center-fraction", type=float, default=0.15)
+    parser.add_argument("--time-budget", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    options = parser.parse_args(arguments)
+
+    directory = tempfile.mkdtemp()
+    try:
+        host_file = os.path.join(directory, "HostState.txt")
+        instance_file = os.path.join(directory, "InstanceState.txt")
+        FleetGenerator(options.centers, options.hosts, customers=options.customers,
+                       seed=options.seed).write(host_file, instance_file)
+        model = ClusterModel.load(host_file, instance_file)
+        before = model.calculate()
+        print "%d hosts, %d instances, host %.4f, center %.4f" % (
+            len(model.host_ids), len(model.instance_ids), before["host"]["fraction"], before["center"]["fraction"])
+
+        started = time.time()
+        planner = RebalancePlanner(model, options.host_fraction, options.center_fraction, options.time_budget)
+        indexed = time.time()
+        result = planner.plan().calculate()
+        planned = time.time()
+        planner.write(os.path.join(directory, "RebalancePlan.txt"))
+        print "indexed in %.3fs, planned in %.3fs, written in %.3fs" % (
+            indexed - started, planned - indexed, time.time() - planned)
+        print "%(moves)d moves, %(unresolved)d unresolved, complete %(complete)s" % result
+        print "host %.4f, center %.4f" % (result["host"]["fraction"], result["center"]["fraction"])
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
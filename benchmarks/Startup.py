@@ -0,0 +1,98 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+# Set project directory to import required files, packages or objects when benchmarks are run as a script
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# Commands timed in a new interpreter each, the bare interpreter is subtracted from the others
+COMMANDS = (
+    ("interpreter", "pass"),
+    ("import", "import app"),
+    ("first result",
+     "import app; statistics = app.Statistics(); statistics.target_file = %(target)r; statistics.run()"),
+)
+
+
+def median_time(code, repeat):
+    """
+    Median wall time of running code in a new interpreter
+    @param code Python code
+    @param repeat number of runs
+    @return seconds
+    """
+    times = []
+    for _ in xrange(repeat):
+        started = time.time()
+        subprocess.check_call([sys.executable, "-c", "import sys; sys.path.insert(0, %r); %s" % (PROJECT_DIR, code)])
+        times.append(time.time() - started)
+    return sorted(times)[len(times) // 2]
+
+
+def main(arguments=None):
+    """
+    Command line entry of startup benchmark, it exits with status 1 if a budget is exceeded
+    @param arguments list of command line arguments
+    @return void
+    """
+    parser = argparse.ArgumentParser(description="Measure import and first result latency of a short lived run.")
+    parser.add_argument("--repeat", type=int, default=11)
+    parser.add_argument("--import-budget", type=float, default=0.05, help="seconds spent importing app")
+    parser.add_argument("--result-budget", type=float, default=0.1, help="seconds until Statistics.txt is written")
+    options = parser.parse_args(arguments)
+
+    target = os.path.join(tempfile.mkdtemp(), "Statistics.txt")
+    try:
+        times = dict((name, median_time(code % {"target": target}, options.repeat)) for name, code in COMMANDS)
+    finally:
+        if os.path.exists(target):
+            os.remove(target)
+        os.rmdir(os.path.dirname(target))
+
+    exceeded = False
+    for name, budget in (("import", options.import_budget), ("first result", options.result_budget)):
+        elapsed = times[name] - times["interpreter"]
+        exceeded = exceeded or elapsed > budget
+        print "%-14s %7.1fms  budget %7.1fms  %s" % (name, elapsed * 1000, budget * 1000,
+                                                     "ok" if elapsed <= budget else "EXCEEDED")
+    sys.exit(1 if exceeded else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Set project directory to import required files, packages or objects when benchmarks are run as a script
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, '%s' % PROJECT_DIR)
+
+from app.ClusterModel import ClusterModel
+from app.QueryServer import QueryServer
+from app.SqlStore import SqlStore
+from benchmarks.FleetGenerator import FleetGenerator
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+
+def timed(function, *args):
+    """
+    Run a function and measure its wall time
+    @param function
+    @param args arguments of the function
+    @return tuple of result and seconds
+    """
+    started = time.time()
+    result = function(*args)
+    return result, time.time() - started
+
+
+def model_available_hosts(model, center_id, minimum):
+    """
+    Hosts of a data center which, have at least minimum free slots in the columnar model, SqlStore.available_hosts
+    answers the same query
+    @param model ClusterModel
+    @param center_id
+    @param minimum minimum number of free slots
+    @return list of host ids
+    """
+    center = list(model.center_ids).index(center_id)
+    offsets = model.host_offsets
+    hosts = model.center_hosts[model.center_offsets[center]:model.center_offsets[center + 1]]
+    return [model.host_ids[host] for host in hosts
+            if model.host_slots[host] - (offsets[host + 1] - offsets[host]) >= minimum]
+
+
+def main(arguments=None):
+    """
+    Command line entry of SQLite store benchmark
+    @param arguments list of command line arguments
+    @return void
+    """
+    parser = argparse.ArgumentParser(description="Compare SQLite store with the in-memory columnar model.")
+    parser.add_argument("--hosts", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=100, help="number of times every ad hoc query is run")
+    parser.add_argument("--seed", type=int, default=42)
+    options = parser.parse_args(arguments)
+
+    directory = tempfile.mkdtemp()
+    try:
+        host_file = os.path.join(directory, "HostState.txt")
+        instance_file = os.path.join(directory, "InstanceState.txt")
+        hosts, instances = FleetGenerator(3, options.hosts, (2, 16), 1000, 1.1, 0.75, options.seed).write(
+            host_file, instance_file)
+
+        model, model_load = timed(ClusterModel.load, host_file, instance_file)
+        expected, model_calculate = timed(model.calculate)
+        store = SqlStore(os.path.join(directory, "Statistics.db"), options.batch_size)
+        _, store_load = timed(store.load, host_file, instance_file)
+        result, store_calculate = timed(store.calculate)
+        print "%d hosts, %d instances, results %s" % (hosts, instances, "match" if result == expected else "DIFFER")
+        print "  %-28s %10s %10s" % ("", "memory", "sqlite")
+        print "  %-28s %10.0f %10.0f" % ("load rows/s", (hosts + instances) / model_load,
+                                         (hosts + instances) / store_load)
+        print "  %-28s %9.3fs %9.3fs" % ("standard output", model_calculate, store_calculate)
+
+        center_id = model.center_ids[0]
+        for name, memory, sql in (
+                ("free slots >= 2 in a DC", lambda: model_available_hosts(model, center_id, 2),
+                 lambda: store.available_hosts(center_id, 2)),
+                ("hosts of a customer", lambda: QueryServer.calculate_customer(model, 1)["hosts"],
+                 lambda: store.customer_hosts(1))):
+            _, memory_time = timed(lambda: [memory() for _ in xrange(options.queries)])
+            _, sql_time = timed(lambda: [sql() for _ in xrange(options.queries)])
+            print "  %-28s %8.2fms %8.2fms" % (name, memory_time * 1000 / options.queries,
+                                               sql_time * 1000 / options.queries)
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package benchmarks
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import collections
+import tempfile
+import subprocess
+import multiprocessing
+
+# Set project directory to import required files, packages or objects when benchmarks are run as a script
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, '%s' % PROJECT_DIR)
+
+from app import Statistics
+from app.ClusterModel import ClusterModel
+from app.VectorEngine import numpy
+from benchmarks.FleetGenerator import FleetGenerator
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = ''
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on OS X
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Size of an object including the objects it refers to, every object is counted once
+    @param obj a dictionary, list, tuple or a scalar
+    @param seen ids of already counted objects
+    @return number of bytes
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.iteritems())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def compare_memory(host_file, instance_file):
+    """
+    Compare memory used by data centers dictionary with memory used by columnar model for the same files
+    @param host_file source file to provide host list
+    @param instance_file source file to provide instance list
+    @return dictionary including "dict" and "columnar" sizes in bytes
+    """
+    statistics = Statistics()
+    statistics.instance_file = instance_file
+    return {
+        "dict": deep_sizeof(statistics.fill_data_centers(host_file)),
+        "columnar": ClusterModel.load(host_file, instance_file).nbytes()
+    }
+
+
+def measure(phases, name, function, *args):
+    """
+    Run a phase and record its wall time, CPU time and peak resident memory of the process after it
+    @param phases dictionary to record phase into
+    @param name name of the phase
+    @param function phase to run
+    @param args arguments of the phase
+    @return result of the phase
+    """
+    started, cpu = time.time(), time.clock()
+    result = function(*args)
+    phases[name] = {
+        "wall": time.time() - started,
+        "cpu": time.clock() - cpu,
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+    }
+    return result
+
+
+def run_phases(host_file, instance_file, target_file, engines, queue):
+    """
+    Run phases of the dictionary pipeline and of the given model engines, it runs in its own process so peak memory
+    of a size does not include the previous ones
+    @param host_file
+    @param instance_file
+    @param target_file
+    @param engines names of model engines to run after dictionary pipeline
+    @param queue multiprocessing.Queue to put phases into
+    @return void
+    """
+    statistics = Statistics()
+    statistics.host_file, statistics.instance_file, statistics.target_file = host_file, instance_file, target_file
+    phases = collections.OrderedDict()
+
+    def check_files():
+        for file_name in (host_file, instance_file):
+            with open(file_name, "rb") as h_file:
+                statistics.check_file(h_file.read())
+
+    measure(phases, "check_file", check_files)
+    data_centers = measure(phases, "fill_data_centers", statistics.fill_data_centers, host_file)
+    content = measure(phases, "calculate_content", statistics.calculate_content, data_centers)
+    measure(phases, "write_target", statistics.write_target, content)
+    del data_centers
+
+    model = measure(phases, "load_model", ClusterModel.load, host_file, instance_file)
+    for engine in engines:
+        if engine == "numpy" and numpy is None:
+            continue
+        statistics.engine = engine
+        measure(phases, "calculate_model[%s]" % engine, statistics.calculate_model, model)
+    queue.put(phases)
+
+
+def benchmark(generator, engines=("columnar", "numpy")):
+    """
+    Generate a fleet and time every phase over it
+    @param generator FleetGenerator
+    @param engines names of model engines to time
+    @return dictionary including parameters, sizes and phases
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        host_file = os.path.join(directory, "HostState.txt")
+        instance_file = os.path.join(directory, "InstanceState.txt")
+        number_of_hosts, number_of_instances = generator.write(host_file, instance_file)
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=run_phases,
+            args=(host_file, instance_file, os.path.join(directory, "Statistics.txt"), engines, queue))
+        process.start()
+        phases = queue.get()
+        process.join()
+        return {
+            "parameters": generator.parameters(),
+            "hosts": number_of_hosts,
+            "instances": number_of_instances,
+            "bytes": os.path.getsize(host_file) + os.path.getsize(instance_file),
+            "phases": phases
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def commit():
+    """
+    Current commit of the repository
+    @return commit hash or None if it is not a git repository
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PROJECT_DIR,
+                                       stderr=open(os.devnull, "w")).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results):
+    """
+    Compare wall times of the phases with a baseline of the same sizes
+    @param baseline dictionary loaded from a results file
+    @param results dictionary of current results
+    @return list of (hosts, phase, baseline wall time, current wall time) tuples
+    """
+    previous = dict((result["hosts"], result["phases"]) for result in baseline["results"])
+    rows = []
+    for result in results["results"]:
+        for phase, values in result["phases"].iteritems():
+            if phase in previous.get(result["hosts"], {}):
+                rows.append((result["hosts"], phase, previous[result["hosts"]][phase]["wall"], values["wall"]))
+    return rows
+
+
+def main(arguments=None):
+    """
+    Command line entry of benchmarks
+    @param arguments list of command line arguments
+    @return void
+    """
+    parser = argparse.ArgumentParser(description="Benchmark statistics phases over synthetic fleets.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated numbers of hosts")
+    parser.add_argument("--centers", type=int, default=3)
+    parser.add_argument("--slots", default="2,16", help="minimum and maximum number of slots of a host")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=1.1, help="exponent of Zipf distribution of customers")
+    parser.add_argument("--fill", type=float, default=0.75, help="expected fraction of used slots")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--engines", default="columnar,numpy", help="comma separated model engines to time")
+    parser.add_argument("--output", help="JSON file to save results into")
+    parser.add_argument("--baseline", help="JSON file of previous results to compare with")
+    parser.add_argument("--memory", nargs=2, metavar=("HOST_FILE", "INSTANCE_FILE"),
+                        help="only compare memory of dictionary and columnar models of given files")
+    options = parser.parse_args(arguments)
+
+    if options.memory:
+        sizes = compare_memory(*options.memory)
+        print "dict: %(dict)d bytes, columnar: %(columnar)d bytes" % sizes
+        print "columnar model uses %.1fx less memory" % (sizes["dict"] / float(sizes["columnar"]))
+        return
+
+    results = {"commit": commit(), "python": sys.version.split()[0], "time": time.time(), "results": []}
+    for size in options.sizes.split(","):
+        generator = FleetGenerator(options.centers, int(size), tuple(int(slot) for slot in options.slots.split(",")),
+                                   options.customers, options.skew, options.fill, options.seed)
+        result = benchmark(generator, options.engines.split(","))
+        results["results"].append(result)
+        print "%(hosts)d hosts, %(instances)d instances, %(bytes)d bytes" % result
+        for phase, values in result["phases"].iteritems():
+            print "  %-28s wall %8.3fs  cpu %8.3fs  peak rss %6.1f MB" % (
+                phase, values["wall"], values["cpu"], values["peak_rss"] / 1024.0 ** 2)
+
+    if options.output:
+        with open(options.output, "w") as h_file:
+            json.dump(results, h_file, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as h_file:
+            for hosts, phase, before, after in compare(json.load(h_file), results):
+                print "%8d hosts  %-28s %8.3fs -> %8.3fs  (%.2fx)" % (
+                    hosts, phase, before, after, before / after if after else float("inf"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# coding: utf-8
+"""
+The MIT License (MIT)
+
+Copyright (c) 2013 Fatih Karatana
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+@package helper
+@date 18/10/26
+@author fatih
+@version 1.0.0
+"""
+
+__author__ = 'fatih'
+__date__ = '18/10/26'
+__version__ = '1.0.0'
+
+import os
+import sys
+import json
+import time
+import collections
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on OS X
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class Stage(object):
+    """
+    Stage measures wall time, CPU time and peak resident memory of a block of a pipeline
+    """
+
+    def __init__(self, metrics, name):
+        """
+        Constructor of Stage class
+        @param metrics Metrics to record stage into
+        @param name name of the stage
+        @return instance
+        """
+        self.metrics = metrics
+        self.name = name
+        self.started = None
+        self.cpu = None
+
+    def __enter__(self):
+        """
+        Start measuring the stage
+        @return self
+        """
+        self.started = time.time()
+        self.cpu = sum(os.times()[:2])
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """
+        Record the stage, exceptions are not suppressed
+        @return False
+        """
+        self.metrics.stages[self.name] = {
+            "wall": time.time() - self.started,
+            "cpu": sum(os.times()[:2]) - self.cpu,
+            "peak_rss": Metrics.peak_rss()
+        }
+        return False
+
+
+class NullStage(object):
+    """
+    NullStage is used when metrics are disabled, it does nothing
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+class Metrics(object):
+    """
+    Metrics collects timings of pipeline stages and counters of a run, etc:
+        with metrics.stage("load"):
+            ...
+        metrics.count("instances", 15)
+    """
+    enabled = True
+
+    def __init__(self):
+        """
+        Constructor of Metrics class
+        @return instance
+        """
+        self.stages = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+
+    def stage(self, name):
+        """
+        Measure a stage
+        @param name name of the stage
+        @return context manager
+        """
+        return Stage(self, name)
+
+    def reset(self):
+        """
+        Forget stages and counters of a previous run
+        @return void
+        """
+        self.stages.clear()
+        self.counters.clear()
+
+    def count(self, name, value=1):
+        """
+        Increase a counter
+        @param name name of the counter
+        @param value to add
+        @return void
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @staticmethod
+    def peak_rss():
+        """
+        Peak resident memory of the process
+        @return number of bytes or None if it is not available on the platform
+        """
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+    def to_dict(self):
+        """
+        Convert metrics to a dictionary
+        @return dictionary including "stages" and "counters"
+        """
+        return collections.OrderedDict((("stages", self.stages), ("counters", self.counters)))
+
+    def write(self, file_name):
+        """
+        Write metrics into a JSON file
+        @param file_name
+        @return void
+        """
+        with open(file_name, "w") as h_file:
+            json.dump(self.to_dict(), h_file, indent=2)
+
+
+class NullMetrics(Metrics):
+    """
+    NullMetrics is used when metrics are disabled, it keeps the interface of Metrics without measuring anything
+    """
+    enabled = False
+    null_stage = NullStage()
+
+    def stage(self, name):
+        return self.null_stage
+
+    def count(self, name, value=1):
+        pass
@@ -59,35 +59,62 @@ class Utilities(object):
     # Set logging parameters and initiate logging
     logger = logging.getLogger()
 
+    # Config parser of config file, it is read once by the first instance
+    parser = None
+
+    # Syslog handler of logger, it is attached once when something is logged first time
+    syslog = None
+
     def __init__(self):
         """
         Constructor for Utilities class
         """
 
-        # Initiate Config Parser instance
-        self.parser = config_parser()
+        # Config file is parsed once, later instances share CONFIG
+        if not CONFIG:
+            self.load_config()
 
-        # Read config file inside
-        self.parser.read(CONFIG_FILE)
+        # Set global NOW value to be used in any where in application
+        self.now = strftime(self.config_get("locale", "datetime_format"))
+
+    @staticmethod
+    def load_config():
+        """
+        Parse config file into CONFIG
+        @return void
+        """
+        # Initiate Config Parser instance and read config file inside
+        Utilities.parser = config_parser()
+        Utilities.parser.read(CONFIG_FILE)
 
         # Set Config object by config parser sections
-        CONFIG.update(self.parser._sections)
+        CONFIG.update(Utilities.parser._sections)
 
-        # Set global NOW value to be used in any where in application
-        self.now = strftime(self.config_get("locale", "datetime_format"))
+    @staticmethod
+    def get_logger():
+        """
+        Get logger, syslog handler is attached to it at the first call so a run which, logs nothing does not open
+        a syslog socket
+        @return logger
+        """
+        if Utilities.syslog is None:
+            if not CONFIG:
+                Utilities.load_config()
 
-        # Set log destination
-        # Convert Json string into DotDict/OrderedDict object
-        log_destination = json.loads(unicode(self.config_get("logging", "destination")))
+            # Set log destination
+            # Convert Json string into DotDict/OrderedDict object
+            log_destination = json.loads(unicode(Utilities.config_get("logging", "destination")))
 
-        # Initiate Syslog handler with log destination regarding to the system architecture
-        syslog = SysLogHandler(address=log_destination[sys.platform])
+            # Initiate Syslog handler with log destination regarding to the system architecture
+            syslog = SysLogHandler(address=log_destination[sys.platform])
 
-        # Set syslog format
-        syslog.setFormatter(
-            logging.Formatter(self.config_get("logging", "format"))
-        )
-        self.logger.addHandler(syslog)
+            # Set syslog format
+            syslog.setFormatter(
+                logging.Formatter(Utilities.config_get("logging", "format"))
+            )
+            Utilities.logger.addHandler(syslog)
+            Utilities.syslog = syslog
+        return Utilities.logger
 
     def config_set(self, section, key, value):
         """
@@ -109,6 +136,16 @@ class Utilities(object):
         """
         return CONFIG[section][key]
 
+    @staticmethod
+    def config_sections(prefix=""):
+        """
+        Get names of config sections by given prefix
+
+        @param prefix prefix of section names
+        @return list of section names in order of config file
+        """
+        return [section for section in CONFIG if section.startswith(prefix)]
+
     @staticmethod
     def log(severity=logging.DEBUG, message=None):
         """
@@ -119,7 +156,7 @@ class Utilities(object):
         """
         Utilities.logger.setLevel(severity)
         if severity is Utilities.logging.CRITICAL or severity is Utilities.logging.ERROR:
-            Utilities.logger.log(severity, message) if Utilities.config_get("logging", "enable") else ""
+            Utilities.get_logger().log(severity, message) if Utilities.config_get("logging", "enable") else ""
             sys.exit(0)
 
 
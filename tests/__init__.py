@@ -33,8 +33,17 @@ __date__ = '19/06/14'
 __version__ = ''
 
 import unittest
+import tempfile
+import shutil
+import threading
+import time
+import copy
+import mmap
 import sys
 import os
+import gzip
+import json
+import urllib2
 
 # Set parent directory to import required files, packages or objects
 PARENT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -42,13 +51,49 @@ sys.path.insert(0, '%s' % PARENT_DIR)
 
 # import Statistics class to call its method and test them.
 from app import Statistics
+from app.StateReader import StateReader
+from app.ClusterModel import ClusterModel
+from app.VectorEngine import VectorEngine, numpy
+from app.ParallelEngine import ParallelEngine
+from app.IncrementalEngine import IncrementalEngine
+from app.FreeSlotIndex import FreeSlotIndex
+from app.ClusteringReport import ClusteringReport
+from app.SnapshotCache import SnapshotCache
+from app.ColumnParser import ColumnParser
+from app.ExternalEngine import ExternalEngine
+from app.Shards import zstandard
+from app.OutputWriter import OutputWriter
+from app.EvacuationSimulator import EvacuationSimulator
+from app.RebalancePlanner import RebalancePlanner
+from app.BatchRunner import BatchRunner
+from app.HistoryStore import HistoryStore
+from app.SnapshotDiff import SnapshotDiff
+from app.SqlStore import SqlStore
+from app.ApproximateEngine import ApproximateEngine, SpaceSaving
+from app.Watcher import Watcher
+from app.QueryServer import QueryServer
+from benchmarks.FleetGenerator import FleetGenerator
+from helper.Metrics import Metrics, NullMetrics
+from helper.Utilities import Utilities
 
 
-class TestStatistics(unittest.TestCase):
+class StatisticsTestCase(unittest.TestCase):
+    """
+    Base of the test cases which share a statistics instance
+    """
+    @classmethod
+    def setUpClass(cls):
+        """
+        Create a statistics instance for the tests of the class
+        @return void
+        """
+        cls.statistics = Statistics()
+
+
+class TestStatistics(StatisticsTestCase):
     """
     Test statistics app tests
     """
-    statistics = Statistics()
     malformed_host_file = PARENT_DIR + "/statistics/tests/data/HostState.txt"
     malformed_instance_file = PARENT_DIR + "/statistics/tests/data/InstanceState.txt"
 
@@ -84,6 +129,17 @@ class TestStatistics(unittest.TestCase):
         with open(self.malformed_instance_file) as file_to_test:
             self.assertFalse(self.statistics.check_file(file_to_test.read()))
 
+    def testFillDataCenters(self):
+        """
+        Check instances file is indexed once and attached to every host of every data center
+        @return void
+        """
+        data_centers = self.statistics.fill_data_centers(self.statistics.host_file)
+        self.assertEqual(sorted(data_centers.keys()), ["0", "1", "2"])
+        self.assertEqual(len(data_centers["0"]["2"]["instances"]), 3)
+        self.assertEqual(
+            sum(len(host["instances"]) for center in data_centers.values() for host in center.values()), 15)
+
     def testWriteTarget(self):
         """
         Check if targeted file is written
@@ -92,11 +148,1111 @@ class TestStatistics(unittest.TestCase):
         dummy_content = ["HostClustering: 8, 0.75","DatacentreClustering: 8, 0.36","AvailableHosts: 3,2,5,10,6"]
         self.assertTrue(self.statistics.write_target(dummy_content))
 
+    def testWrittenContent(self):
+        """
+        Check calculated content is written with available hosts in hosts file order
+        @return void
+        """
+        content = self.statistics.calculate_content(self.statistics.fill_data_centers(self.statistics.host_file))
+        self.assertEqual(content[2], "AvailableHosts: 2,5,3,10,6")
+        self.assertTrue(self.statistics.write_target(content))
+        with open(self.statistics.target_file) as target:
+            self.assertEqual(target.read().splitlines(), content)
+
+    def testSyslogHandlerOnce(self):
+        """
+        Check instances share config and syslog handler is attached only once
+        @return void
+        """
+        handlers = len(Utilities.logger.handlers)
+        Statistics()
+        Statistics()
+        self.assertEqual(len(Utilities.logger.handlers), handlers)
+        Utilities.get_logger()
+        Utilities.get_logger()
+        self.assertEqual(len(Utilities.logger.handlers), 1)
+
+
+class TestStateReader(unittest.TestCase):
+    """
+    Test streaming state file reader
+    """
+    malformed_host_file = PARENT_DIR + "/statistics/tests/data/HostState.txt"
+
+    def testLineEndings(self):
+        """
+        Check both line endings are accepted and small buffers do not break lines
+        @return void
+        """
+        with tempfile.NamedTemporaryFile() as state_file:
+            state_file.write("1,8,2\n2,8,2\r\n3,9,5\n")
+            state_file.flush()
+            rows = list(StateReader(state_file.name, buffer_size=4))
+        self.assertEqual(rows, [("1", "8", "2"), ("2", "8", "2"), ("3", "9", "5")])
+
+    def testMalformedLine(self):
+        """
+        Check malformed line is reported by its line number and byte offset
+        @return void
+        """
+        with self.assertRaises(SyntaxError) as context:
+            list(StateReader(self.malformed_host_file))
+        self.assertEqual(context.exception.lineno, 5)
+        self.assertEqual(context.exception.offset, 28)
+
+
+class TestClusterModel(StatisticsTestCase):
+    """
+    Test columnar model gives the same content with data centers dictionary
+    """
+    def testSameContent(self):
+        """
+        Check both engines calculate the same content
+        @return void
+        """
+        model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+        self.assertEqual(
+            self.statistics.calculate_model(model),
+            self.statistics.calculate_content(self.statistics.fill_data_centers(self.statistics.host_file)))
+        self.assertEqual(
+            self.statistics.calculate_model(model),
+            ["HostClustering: 8, 0.75", "DatacentreClustering: 8, 0.36", "AvailableHosts: 2,5,3,10,6"])
+
+    def testGroups(self):
+        """
+        Check instances are grouped by host and hosts are grouped by data center
+        @return void
+        """
+        model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+        self.assertEqual(list(model.center_ids), [0, 1, 2])
+        self.assertEqual([model.host_ids[host] for host in model.center_hosts], [2, 5, 7, 9, 3, 10, 6, 8])
+        host = model.host_index()[9]
+        self.assertEqual(
+            [model.instance_ids[row]
+             for row in model.host_instances[model.host_offsets[host]:model.host_offsets[host + 1]]],
+            [6, 7, 14])
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestVectorEngine(StatisticsTestCase):
+    """
+    Test numpy engine gives the same content with columnar model
+    """
+    def testSameContent(self):
+        """
+        Check both engines calculate the same content
+        @return void
+        """
+        model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+        result = VectorEngine(model).calculate()
+        self.assertEqual(
+            Statistics.format_content(result["host"], result["center"], result["available_hosts"]),
+            self.statistics.calculate_model(model))
+
+    def testTies(self):
+        """
+        Check equal fractions are resolved by the smaller customer id
+        @return void
+        """
+        model = ClusterModel()
+        model.load_hosts([("1", "2", "0"), ("2", "2", "0")])
+        model.load_instances([("1", "9", "1"), ("2", "4", "2")])
+        model.group()
+        result = VectorEngine(model).calculate()
+        self.assertEqual(result["host"], model.calculate()["host"])
+        self.assertEqual(result["host"], {"fraction": 0.5, "customer_id": 4})
+
+
+class TestParallelEngine(StatisticsTestCase):
+    """
+    Test parallel engine gives the same content with columnar model
+    """
+    def testSameResult(self):
+        """
+        Check shards of split data centers are merged into the same result
+        @return void
+        """
+        model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+        engine = ParallelEngine(model, workers=2, shard_size=2)
+        self.assertEqual(len(engine.shards()), 5)
+        self.assertEqual(engine.calculate(), model.calculate())
+
+
+class TestIncrementalEngine(StatisticsTestCase):
+    """
+    Test incremental engine gives the same result with calculating from scratch after events
+    """
+    def testEvents(self):
+        """
+        Check events update statistics
+        @return void
+        """
+        engine = self.statistics.load_incremental()
+        self.assertEqual(engine.calculate(), ClusterModel.load(
+            self.statistics.host_file, self.statistics.instance_file).calculate())
+
+        engine.add_host(11, 2, 1)
+        engine.add(16, 4, 11)
+        engine.add(17, 4, 11)
+        engine.move(1, 5)
+        engine.remove(2)
+        engine.remove(3)
+        engine.remove(10)
+        engine.remove_host(10)
+
+        model = ClusterModel()
+        model.load_hosts([("2", "4", "0"), ("5", "4", "0"), ("7", "3", "0"), ("9", "3", "1"), ("3", "3", "1"),
+                          ("11", "2", "1"), ("6", "4", "2"), ("8", "2", "2")])
+        model.load_instances([(str(instance_id), str(customer_id), str(host_id))
+                              for instance_id, (customer_id, host_id) in sorted(engine.instances.items())])
+        model.group()
+        self.assertEqual(engine.calculate(), model.calculate())
+        self.assertEqual(engine.host_clustering(), {"fraction": 1.0, "customer_id": 4})
+
+    def testReplay(self):
+        """
+        Check an incomplete last event is left for the next replay
+        @return void
+        """
+        engine = IncrementalEngine()
+        with tempfile.NamedTemporaryFile() as event_file:
+            event_file.write("add_host,1,2,0\nadd,1,8,1\nadd,2,8")
+            event_file.flush()
+            offset = engine.replay(event_file.name)
+            self.assertEqual(offset, 25)
+            event_file.write(",1\r\n")
+            event_file.flush()
+            engine.replay(event_file.name, offset)
+        self.assertEqual(engine.calculate(), {
+            "host": {"fraction": 1.0, "customer_id": 8},
+            "center": {"fraction": 1.0, "customer_id": 8},
+            "available_hosts": []})
+
+
+class TestFreeSlotIndex(StatisticsTestCase):
+    """
+    Test placement strategies of free slot index
+    """
+    def testStrategies(self):
+        """
+        Check every strategy selects the expected host
+        @return void
+        """
+        index = self.statistics.load_free_slots()
+        self.assertEqual(index.free_slots(), 10)
+        self.assertEqual(index.select("first_fit"), "2")
+        self.assertEqual(index.select("best_fit"), "2")
+        self.assertEqual(index.select("spread"), "5")
+        self.assertEqual(index.select("best_fit", center_id="2"), "10")
+
+    def testAntiAffinity(self):
+        """
+        Check hosts of the customer are avoided until there is no other free slot
+        @return void
+        """
+        index = self.statistics.load_free_slots()
+        self.assertEqual(index.place("8", "first_fit", "0"), "5")
+        self.assertEqual(index.place_many(5, "8", "first_fit", "0"), ["5", "5", "2"])
+        self.assertEqual(index.free_slots("0"), 0)
+        index.release("2", "8")
+        self.assertEqual(index.place("16"), "2")
+
+    def testRelease(self):
+        """
+        Check a long place and release cycle keeps heaps bounded and a release of an unknown customer is refused
+        @return void
+        """
+        index = FreeSlotIndex.from_model(ClusterModel.load(self.statistics.host_file, self.statistics.instance_file))
+        for _ in xrange(1000):
+            host_id = index.place(8, "spread")
+            index.release(host_id, 8)
+        self.assertTrue(index.entries <= 8 * len(index.hosts) + 16)
+        self.assertEqual(index.free_slots(), 10)
+        self.assertEqual(index.select("spread"), 5)
+        self.assertRaises(ValueError, index.release, 5, 8)
+        self.assertEqual(index.free_slots(), 10)
+        # Free hosts of a data center are counted by the number of instances of the customer they have
+        self.assertEqual(index.levels[8], {0: {3: 1}, 2: {1: 1}, None: {1: 1, 3: 1}})
+        self.assertEqual(index.place_many(4, 8, "first_fit", 0), [5, 5, 5, 2])
+        self.assertEqual(index.levels[8], {0: {}, 2: {1: 1}, None: {1: 1}})
+
+
+class TestClusteringReport(StatisticsTestCase):
+    """
+    Test clustering report of every customer
+    """
+    def testReport(self):
+        """
+        Check top pairs agree with the largest fractions and customer table is written
+        @return void
+        """
+        model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+        report = ClusteringReport(model, top=2).calculate()
+        self.assertEqual(report.hosts(), [{"customer_id": 8, "id": 2, "fraction": 0.75},
+                                          {"customer_id": 15, "id": 8, "fraction": 0.5}])
+        self.assertEqual(report.centers()[0]["customer_id"], model.calculate()["center"]["customer_id"])
+        with tempfile.NamedTemporaryFile() as report_file:
+            report.write_csv(report_file.name)
+            lines = report_file.read().splitlines()
+        self.assertEqual(lines[0], ",".join(ClusteringReport.header))
+        self.assertEqual(lines[1], "8,5,2,0.7500,0,0.3636")
+        self.assertEqual(len(lines), 6)
+
+
+class TestSnapshotCache(StatisticsTestCase):
+    """
+    Test snapshot cache of parsed models
+    """
+    def setUp(self):
+        """
+        Create a temporary cache directory and copies of state files
+        @return void
+        """
+        self.directory = tempfile.mkdtemp()
+        self.host_file = os.path.join(self.directory, "HostState.txt")
+        self.instance_file = os.path.join(self.directory, "InstanceState.txt")
+        shutil.copy(self.statistics.host_file, self.host_file)
+        shutil.copy(self.statistics.instance_file, self.instance_file)
+        self.cache = SnapshotCache(os.path.join(self.directory, "cache"), max_entries=1)
+
+    def tearDown(self):
+        """
+        Remove temporary directory
+        @return void
+        """
+        shutil.rmtree(self.directory)
+
+    def testStoreAndLoad(self):
+        """
+        Check a stored model is loaded with the same columns
+        @return void
+        """
+        self.assertIsNone(self.cache.load(self.host_file, self.instance_file))
+        model = ClusterModel.load(self.host_file, self.instance_file)
+        self.cache.store(self.host_file, self.instance_file, model)
+        loaded = self.cache.load(self.host_file, self.instance_file)
+        for name in ClusterModel.columns:
+            self.assertEqual(getattr(loaded, name), getattr(model, name))
+        self.assertEqual(loaded.calculate(), model.calculate())
+
+    def testInvalidation(self):
+        """
+        Check a changed file misses the cache and old snapshots are evicted
+        @return void
+        """
+        self.cache.store(self.host_file, self.instance_file, ClusterModel.load(self.host_file, self.instance_file))
+        with open(self.instance_file, "ab") as h_file:
+            h_file.write("\r\n16,8,5")
+        self.assertIsNone(self.cache.load(self.host_file, self.instance_file))
+        self.cache.store(self.host_file, self.instance_file, ClusterModel.load(self.host_file, self.instance_file))
+        self.assertEqual(len([name for name in os.listdir(self.cache.directory) if name.endswith(".model")]), 1)
+        self.assertEqual(len(self.cache.load(self.host_file, self.instance_file).instance_ids), 16)
+
+    def testEvictedHashes(self):
+        """
+        Check remembered hashes of files are evicted together with the snapshots parsed from them
+        @return void
+        """
+        model = ClusterModel.load(self.host_file, self.instance_file)
+        self.cache.store(self.host_file, self.instance_file, model)
+        other_file = os.path.join(self.directory, "OtherState.txt")
+        shutil.copy(self.instance_file, other_file)
+        self.cache.store(self.host_file, other_file, model)
+        self.assertEqual(sorted(self.cache.read_hashes()), [self.host_file, other_file])
+        self.assertEqual(len(self.cache.load(self.host_file, other_file).instance_ids), 15)
+
+
+class TestColumnParser(StatisticsTestCase):
+    """
+    Test memory mapped parser gives the same columns with streaming reader
+    """
+    malformed_instance_file = PARENT_DIR + "/statistics/tests/data/InstanceState.txt"
+
+    def testSameColumns(self):
+        """
+        Check every parsing method gives the same columns
+        @return void
+        """
+        parser = ColumnParser(self.statistics.instance_file, window_size=32)
+        columns = parser.parse()
+        self.assertEqual(columns, parser.parse_stream())
+        with open(self.statistics.instance_file, "rb") as h_file:
+            mapped = mmap.mmap(h_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.assertEqual(columns, parser.parse_regex(mapped))
+            mapped.close()
+        self.assertEqual(list(columns[2][:4]), [2, 2, 2, 7])
+
+    def testMalformedFile(self):
+        """
+        Check malformed and empty files are reported by streaming reader
+        @return void
+        """
+        with self.assertRaises(SyntaxError) as context:
+            ColumnParser(self.malformed_instance_file).parse()
+        self.assertEqual(context.exception.lineno, 8)
+        with tempfile.NamedTemporaryFile() as empty_file:
+            self.assertRaises(SyntaxError, ColumnParser(empty_file.name).parse)
+
+
+class TestFleetGenerator(unittest.TestCase):
+    """
+    Test synthetic fleet generator of benchmarks
+    """
+
+    def testDeterministic(self):
+        """
+        Check the same seed writes the same well formed files
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            contents = []
+            for seed in (1, 1, 2):
+                host_file = os.path.join(directory, "HostState.txt")
+                instance_file = os.path.join(directory, "InstanceState.txt")
+                hosts, instances = FleetGenerator(centers=2, hosts=50, customers=10, seed=seed).write(
+                    host_file, instance_file)
+                model = ClusterModel.load(host_file, instance_file)
+                self.assertEqual((len(model.host_ids), len(model.instance_ids), len(model.center_ids)),
+                                 (hosts, instances, 2))
+                with open(instance_file) as h_file:
+                    contents.append(h_file.read())
+            self.assertEqual(contents[0], contents[1])
+            self.assertNotEqual(contents[0], contents[2])
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Test metrics of a run
+    """
+
+    def testRunMetrics(self):
+        """
+        Check stages and counters are recorded and written as a sidecar
+        @return void
+        """
+        statistics = Statistics()
+        directory = tempfile.mkdtemp()
+        try:
+            statistics.target_file = os.path.join(directory, "Statistics.txt")
+            statistics.metrics_file = os.path.join(directory, "Statistics.metrics.json")
+            statistics.metrics = Metrics()
+            metrics = statistics.run()
+            self.assertEqual(metrics.stages.keys(), ["load", "calculate", "write_target"])
+            self.assertEqual(metrics.counters["hosts"], 8)
+            self.assertEqual(metrics.counters["instances"], 15)
+            self.assertTrue(os.path.exists(statistics.metrics_file))
+            # A second run of the same instance counts its own rows only
+            self.assertEqual(statistics.run().counters["instances"], 15)
+        finally:
+            shutil.rmtree(directory)
+
+    def testNullMetrics(self):
+        """
+        Check disabled metrics record nothing
+        @return void
+        """
+        metrics = NullMetrics()
+        with metrics.stage("load"):
+            metrics.count("hosts", 8)
+        self.assertEqual((metrics.stages, metrics.counters), ({}, {}))
+
+
+class TestShards(StatisticsTestCase):
+    """
+    Test compressed and sharded state files
+    """
+    def setUp(self):
+        """
+        Split instances file into two gzip compressed shards and a manifest
+        @return void
+        """
+        self.directory = tempfile.mkdtemp()
+        with open(self.statistics.instance_file, "rb") as h_file:
+            lines = h_file.read().splitlines(True)
+        for number, shard in enumerate((lines[:7], lines[7:])):
+            with gzip.open(os.path.join(self.directory, "InstanceState-%d.txt.gz" % number), "wb") as g_file:
+                g_file.writelines(shard)
+        with open(os.path.join(self.directory, "InstanceState.manifest"), "w") as h_file:
+            h_file.write("# shards of a region\nInstanceState-*.txt.gz\n")
+
+    def tearDown(self):
+        """
+        Remove temporary directory
+        @return void
+        """
+        shutil.rmtree(self.directory)
+
+    def testShardedModel(self):
+        """
+        Check a glob pattern and a manifest of compressed shards load the same model as the plain file
+        @return void
+        """
+        expected = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file).calculate()
+        for instance_file in ("InstanceState-*.txt.gz", "InstanceState.manifest"):
+            for workers in (1, 2):
+                model = ClusterModel.load(self.statistics.host_file, os.path.join(self.directory, instance_file),
+                                          workers)
+                self.assertEqual(len(model.instance_ids), 15)
+                self.assertEqual(model.calculate(), expected)
+        rows = list(StateReader(os.path.join(self.directory, "InstanceState.manifest")))
+        self.assertEqual(rows[-1], ("15", "9", "7"))
+
+    def testMalformedShard(self):
+        """
+        Check a malformed shard is pointed by SyntaxError
+        @return void
+        """
+        with gzip.open(os.path.join(self.directory, "InstanceState-1.txt.gz"), "wb") as g_file:
+            g_file.write("8,9,3\n9,13\n")
+        with self.assertRaises(SyntaxError) as context:
+            ColumnParser(os.path.join(self.directory, "InstanceState-*.txt.gz"), workers=1).parse()
+        self.assertEqual(context.exception.args[1][:2], (os.path.join(self.directory, "InstanceState-1.txt.gz"), 2))
+
+    def testShardedMetrics(self):
+        """
+        Check bytes read are counted over the shards a glob pattern expands into when metrics are enabled
+        @return void
+        """
+        statistics = Statistics()
+        statistics.instance_file = os.path.join(self.directory, "InstanceState-*.txt.gz")
+        statistics.target_file = os.path.join(self.directory, "Statistics.txt")
+        statistics.metrics = Metrics()
+        metrics = statistics.run()
+        self.assertEqual(metrics.counters["instances"], 15)
+        self.assertEqual(metrics.counters["bytes_read"], os.path.getsize(statistics.host_file) + sum(
+            os.path.getsize(os.path.join(self.directory, "InstanceState-%d.txt.gz" % number)) for number in (0, 1)))
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def testZstdShard(self):
+        """
+        Check a zstd compressed shard loads the same model as the plain file
+        @return void
+        """
+        with open(self.statistics.instance_file, "rb") as h_file:
+            content = h_file.read()
+        with open(os.path.join(self.directory, "InstanceState.txt.zst"), "wb") as z_file:
+            z_file.write(zstandard.ZstdCompressor().compress(content))
+        expected = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file).calculate()
+        instance_file = os.path.join(self.directory, "InstanceState.txt.zst")
+        self.assertEqual(ClusterModel.load(self.statistics.host_file, instance_file, 1).calculate(), expected)
+        self.assertEqual(len(list(StateReader(instance_file))), 15)
+
+
+class TestExternalEngine(StatisticsTestCase):
+    """
+    Test external engine
+    """
+    def testSpilledRuns(self):
+        """
+        Check counts spilled into many runs give the same result as the columnar model
+        @return void
+        """
+        external = ExternalEngine(self.statistics.host_file, self.statistics.instance_file, memory_budget=200)
+        external.load()
+        self.assertEqual((external.instances, len(external.runs)), (15, 7))
+        self.assertEqual(external.calculate(),
+                         ClusterModel.load(self.statistics.host_file, self.statistics.instance_file).calculate())
+        self.assertEqual(external.runs, [])
+
+    def testLargeIds(self):
+        """
+        Check host ids which, do not fit into 32 bits are counted like the columnar model does
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            host_file, instance_file = os.path.join(directory, "HostState.txt"), os.path.join(directory, "Inst.txt")
+            with open(host_file, "wb") as h_file:
+                h_file.write("3000000000,4,0\n2,2,1")
+            with open(instance_file, "wb") as h_file:
+                h_file.write("1,8,3000000000\n2,8,3000000000\n3,9,2")
+            external = ExternalEngine(host_file, instance_file)
+            external.load()
+            self.assertEqual(external.calculate(), ClusterModel.load(host_file, instance_file).calculate())
+            self.assertEqual(external.calculate()["available_hosts"], [3000000000, 2])
+        finally:
+            shutil.rmtree(directory)
+
+    def testRemovedRuns(self):
+        """
+        Check runs are removed when instances file is malformed after a spill and when an engine is discarded
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            instance_file = os.path.join(directory, "InstanceState.txt")
+            with open(self.statistics.instance_file, "rb") as h_file:
+                content = h_file.read()
+            with open(instance_file, "wb") as h_file:
+                h_file.write(content.rstrip("\n") + "\n16,9\n")
+            external = ExternalEngine(self.statistics.host_file, instance_file, memory_budget=200, directory=directory)
+            with self.assertRaises(SyntaxError):
+                external.load()
+            self.assertEqual(os.listdir(directory), ["InstanceState.txt"])
+            external = ExternalEngine(self.statistics.host_file, self.statistics.instance_file, memory_budget=200,
+                                      directory=directory)
+            external.load()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            del external
+            self.assertEqual(os.listdir(directory), ["InstanceState.txt"])
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestSnapshotDiff(StatisticsTestCase):
+    """
+    Test comparison of two snapshots
+    """
+    def testDiff(self):
+        """
+        Check moved, added and removed instances, free slots and crossed thresholds are found
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            instance_file = os.path.join(directory, "InstanceState.txt")
+            with open(self.statistics.instance_file, "rb") as h_file:
+                lines = h_file.read().splitlines()
+            with open(instance_file, "wb") as h_file:
+                h_file.write("\n".join(["12,8,2"] + [line for line in lines if line[:3] not in ("12,", "15,")] +
+                                        ["16,13,8"]))
+            before = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+            diff = SnapshotDiff(before, ClusterModel.load(self.statistics.host_file, instance_file)).calculate()
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(diff.moved, [(12, 8, 6, 2)])
+        self.assertEqual(diff.added, [(16, 13, None, 8)])
+        self.assertEqual(diff.removed, [(15, 9, 7, None)])
+        self.assertEqual(diff.free_slots, [(2, 1, 0), (6, 3, 4), (7, 0, 1), (8, 0, -1)])
+        self.assertEqual([crossed[0] for crossed in diff.crossed_hosts], [13])
+        self.assertEqual(diff.lines()[:3], ["HostClustering: 8, 0.75 -> 8, 1.00 (+0.25)",
+                                            "DatacentreClustering: 8, 0.36 -> 8, 0.45 (+0.09)",
+                                            "AvailableHosts: +7,-2"])
+
+
+class TestOutputWriter(StatisticsTestCase):
+    """
+    Test streamed target file formats
+    """
+    def setUp(self):
+        """
+        Calculate result of configured files and create a directory of target files
+        @return void
+        """
+        self.result = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file).calculate()
+        self.directory = tempfile.mkdtemp()
+        self.target_file = os.path.join(self.directory, "Statistics.txt")
+
+    def tearDown(self):
+        """
+        Remove the directory of target files
+        @return void
+        """
+        shutil.rmtree(self.directory)
+
+    def testText(self):
+        """
+        Check text format is the same as formatted content and available hosts may be streamed by a generator
+        @return void
+        """
+        result = dict(self.result, available_hosts=(host for host in self.result["available_hosts"]))
+        self.assertTrue(OutputWriter(self.target_file).write(result))
+        with open(self.target_file, "rb") as target:
+            lines = target.read().splitlines()
+        self.assertEqual(lines, Statistics.format_content(
+            self.result["host"], self.result["center"], self.result["available_hosts"]))
+        self.assertEqual(os.listdir(self.directory), ["Statistics.txt"])
+
+    def testJsonLines(self):
+        """
+        Check every line of JSON lines format is a JSON object
+        @return void
+        """
+        OutputWriter(self.target_file, "jsonl").write(self.result)
+        with open(self.target_file, "rb") as target:
+            records = [json.loads(line) for line in target]
+        self.assertEqual(records[0], {"type": "HostClustering", "customer_id": 8, "fraction": 0.75})
+        self.assertEqual(records[1]["customer_id"], 8)
+        self.assertEqual([record["host_id"] for record in records[2:]], [2, 5, 3, 10, 6])
+
+    def testBinary(self):
+        """
+        Check binary format is read back as it is written
+        @return void
+        """
+        OutputWriter(self.target_file, "binary").write(self.result)
+        self.assertEqual(OutputWriter.read_binary(self.target_file), self.result)
+        self.assertRaises(ValueError, OutputWriter, self.target_file, "xml")
+
+
+class TestEvacuationSimulator(StatisticsTestCase):
+    """
+    Test what if scenarios of drained hosts and data centers
+    """
+    def setUp(self):
+        """
+        Create a simulator of configured files
+        @return void
+        """
+        self.model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+        self.simulator = EvacuationSimulator(self.model)
+
+    def testDrainHost(self):
+        """
+        Check instances of a drained host are moved into its data center first
+        @return void
+        """
+        result = self.simulator.simulate([2])
+        self.assertEqual((result["moved"], result["unplaced"], result["free_slots"]), (3, 0, 6))
+        self.assertEqual(result["center"]["customer_id"], 8)
+        self.assertAlmostEqual(result["center"]["fraction"], 4 / 7.0)
+        self.assertEqual(self.simulator.simulate(), self.simulator.baseline)
+        self.assertEqual(self.simulator.engine.calculate(), self.model.calculate())
+
+    def testDrainCenters(self):
+        """
+        Check instances which, do not fit anywhere are counted and scenarios are simulated by a pool of processes
+        @return void
+        """
+        results = self.simulator.evaluate([([], [2]), ([], [0, 1, 2]), ([2], [])], 2)
+        self.assertEqual(results[0]["host"], {"customer_id": 8, "fraction": 1.0})
+        self.assertEqual((results[1]["drained"], results[1]["unplaced"], results[1]["free_slots"]), (8, 15, 0))
+        self.assertEqual(results[2], self.simulator.simulate([2]))
+        self.assertRaises(KeyError, self.simulator.simulate, [], [4])
+        self.assertEqual(self.simulator.engine.calculate(), self.model.calculate())
+
+
+class TestRebalancePlanner(StatisticsTestCase):
+    """
+    Test planning of moves which, reduce concentration of customers
+    """
+    def setUp(self):
+        """
+        Load configured files
+        @return void
+        """
+        self.model = ClusterModel.load(self.statistics.host_file, self.statistics.instance_file)
+
+    def testPlan(self):
+        """
+        Check targets are reached by one move per instance over them and the plan replays to the same state
+        @return void
+        """
+        planner = RebalancePlanner(self.model, 0.5, 0.25).plan()
+        result = planner.calculate()
+        self.assertEqual((result["moves"], result["unresolved"], result["complete"]), (4, 0, True))
+        self.assertEqual(result["host"], {"customer_id": 8, "fraction": 0.5})
+        self.assertEqual(result["center"], {"customer_id": 8, "fraction": 0.25})
+        with tempfile.NamedTemporaryFile() as plan_file:
+            planner.write(plan_file.name)
+            engine = IncrementalEngine.from_model(self.model)
+            engine.replay(plan_file.name)
+        self.assertEqual(engine.calculate(), planner.engine.calculate())
+
+    def testTimeBudget(self):
+        """
+        Check planning stops when time budget runs out and unreachable targets are reported
+        @return void
+        """
+        result = RebalancePlanner(self.model, 0.5, 0.25, -1).plan().calculate()
+        self.assertEqual((result["moves"], result["complete"]), (0, False))
+        result = RebalancePlanner(self.model, 0.1, 0.05).plan().calculate()
+        self.assertEqual((result["moves"], result["unresolved"]), (0, 23))
+
+
+class TestBatchRunner(StatisticsTestCase):
+    """
+    Test batch of regions
+    """
+    def testBatch(self):
+        """
+        Check every region is written and a malformed region fails alone
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            shutil.copy(self.statistics.host_file, directory)
+            shutil.copy(self.statistics.instance_file, directory)
+            with open(os.path.join(directory, "Malformed.txt"), "wb") as h_file:
+                h_file.write("1,8\n")
+            with open(os.path.join(directory, "regions.manifest"), "wb") as h_file:
+                h_file.write("# name,hosts,instances,target\n"
+                             "east,HostState.txt,InstanceState.txt,East.txt\n"
+                             "broken,HostState.txt,Malformed.txt,Broken.txt\n\n"
+                             "west,HostState.txt,InstanceState.txt,West.txt\n")
+            regions = BatchRunner.read_manifest(os.path.join(directory, "regions.manifest"))
+            progress = []
+            results = BatchRunner(self.statistics, regions, 2).run(
+                lambda finished, total, result: progress.append((finished, total)))
+            self.assertEqual([result["name"] for result in results], ["east", "broken", "west"])
+            self.assertEqual([result["ok"] for result in results], [True, False, True])
+            self.assertTrue(results[1]["error"])
+            self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+            with open(os.path.join(directory, "West.txt"), "rb") as target:
+                self.assertEqual(target.read().splitlines()[0], "HostClustering: 8, 0.75")
+            self.assertFalse(os.path.exists(os.path.join(directory, "Broken.txt")))
+        finally:
+            shutil.rmtree(directory)
+
+    def testHistory(self):
+        """
+        Check every region appends into its own history
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            template = copy.copy(self.statistics)
+            template.history_enabled = True
+            template.history_directory = os.path.join(directory, "history")
+            regions = [{"name": name, "host_file": self.statistics.host_file,
+                        "instance_file": self.statistics.instance_file,
+                        "target_file": os.path.join(directory, "%s.txt" % name)} for name in ("east", "west")]
+            for _ in xrange(2):
+                results = BatchRunner(template, regions, 2).run()
+                self.assertEqual([result["ok"] for result in results], [True, True])
+            self.assertEqual(sorted(os.listdir(template.history_directory)), ["east", "west"])
+            for name in ("east", "west"):
+                store = HistoryStore(os.path.join(template.history_directory, name))
+                self.assertEqual([record[1] for record in store.records.read()], [-1, 0, 1, 2] * 2)
+                store.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestHistoryStore(StatisticsTestCase):
+    """
+    Test history of runs and its rollups
+    """
+    def setUp(self):
+        """
+        Create a directory of history store
+        @return void
+        """
+        self.directory = tempfile.mkdtemp()
+        self.rows = HistoryStore.rows(ClusterModel.load(self.statistics.host_file, self.statistics.instance_file))
+
+    def tearDown(self):
+        """
+        Remove the directory of history store
+        @return void
+        """
+        shutil.rmtree(self.directory)
+
+    def testRows(self):
+        """
+        Check records of the fleet and every data center
+        @return void
+        """
+        self.assertEqual([row[0] for row in self.rows], [-1, 0, 1, 2])
+        self.assertEqual(self.rows[0][:4], (-1, 8, 0.75, 8))
+        self.assertEqual((self.rows[0][5], self.rows[0][6]), (10, 5))
+        self.assertEqual(self.rows[3][3:], (8, 0.125, 5, 2))
+
+    def testQuery(self):
+        """
+        Check queries over raw records and rollups match the records, also after the store is opened again
+        @return void
+        """
+        store = HistoryStore(self.directory)
+        records = []
+        # A run every 20 minutes for 3 days, fraction of data center 2 grows by every run
+        for run in xrange(3 * 72):
+            run_time = 1400000000 + run * 1200
+            rows = [row[:4] + (run / 1000.0,) + row[5:] if row[0] == 2 else row for row in self.rows]
+            store.append(run_time, rows)
+            records.append((run_time, run / 1000.0))
+            if run == 100:
+                store.close()
+                store = HistoryStore(self.directory)
+        self.assertRaises(ValueError, store.append, 1400000000, self.rows)
+        end = records[-1][0] + 1
+        for start in (records[0][0], records[10][0] + 7, end - 86400, end - 600):
+            values = [fraction for run_time, fraction in records if start <= run_time < end]
+            self.assertEqual(store.query(2, start, end, "center", "max"), max(values))
+            self.assertEqual(store.query(2, start, end, "center", "min"), min(values))
+            self.assertAlmostEqual(store.query(2, start, end, "center", "mean"), sum(values) / len(values))
+        self.assertEqual(store.query(-1, records[0][0], end, "free_slots", "max"), 10)
+        self.assertEqual(store.query(4, records[0][0], end), None)
+        self.assertTrue(len(store.rollups[1][1]) > 0)
+        store.close()
+
+
+class TestSqlStore(StatisticsTestCase):
+    """
+    Test SQLite store
+    """
+    def testStore(self):
+        """
+        Check SQL aggregates give the same result as the columnar model and ad hoc queries use loaded rows
+        @return void
+        """
+        store = SqlStore(batch_size=4)
+        self.assertEqual(store.load(self.statistics.host_file, self.statistics.instance_file), (8, 15))
+        self.assertEqual(store.calculate(),
+                         ClusterModel.load(self.statistics.host_file, self.statistics.instance_file).calculate())
+        self.assertEqual(store.available_hosts(2, 2), [10, 6])
+        self.assertEqual(store.customer_hosts(8), [(2, 3), (6, 1), (7, 1)])
+        store.close()
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestApproximateEngine(StatisticsTestCase):
+    """
+    Test approximate engine
+    """
+    def testSpaceSaving(self):
+        """
+        Check the heaviest keys are kept and a replaced counter carries its error
+        @return void
+        """
+        summary = SpaceSaving(2)
+        for key in (1, 1, 1, 2, 3, 1):
+            summary.add(key)
+        self.assertEqual(sorted(summary.items()), [(1, 4, 0), (3, 2, 1)])
+
+    def testCandidates(self):
+        """
+        Check candidates of a small fleet are exact and windows are counted like a whole file
+        @return void
+        """
+        engine = ApproximateEngine(self.statistics.host_file, self.statistics.instance_file, window_size=32)
+        engine.load()
+        self.assertEqual((engine.instances, engine.orphans), (15, 0))
+        self.assertEqual(engine.calculate(),
+                         ClusterModel.load(self.statistics.host_file, self.statistics.instance_file).calculate())
+        self.assertEqual(engine.hosts()[0], {"customer_id": 8, "id": 2, "fraction": 0.75, "error": 0})
+
+    def testCountHosts(self):
+        """
+        Check counters of the hosts a window touches are updated and the other counters are left as they are
+        @return void
+        """
+        engine = ApproximateEngine(self.statistics.host_file, self.statistics.instance_file)
+        engine.load_hosts()
+        engine.count_hosts(numpy.array([17, 18, 19]), numpy.array([3, 2, 1]), 10)
+        self.assertEqual(engine.counter_customers.tolist(), [-1, -1, 7, 9] + [-1] * 12)
+        self.assertEqual(engine.counter_counts.tolist(), [0, 0, 3, 3] + [0] * 12)
+        self.assertEqual(engine.counter_errors.tolist(), [0, 0, 0, 2] + [0] * 12)
+
+    def testLargeCustomerIds(self):
+        """
+        Check customer ids which, overflow composite keys are counted like the columnar model does
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            instance_file = os.path.join(directory, "InstanceState.txt")
+            with open(self.statistics.instance_file, "rb") as h_file:
+                lines = h_file.read().splitlines()
+            with open(instance_file, "wb") as h_file:
+                h_file.write("\n".join("%s,%d,%s" % (instance_id, 9 * 10 ** 17 + int(customer_id), host_id)
+                                       for instance_id, customer_id, host_id in (line.split(",") for line in lines)))
+            engine = ApproximateEngine(self.statistics.host_file, instance_file)
+            engine.load()
+            self.assertEqual(engine.calculate(),
+                             ClusterModel.load(self.statistics.host_file, instance_file).calculate())
+            self.assertEqual(engine.hosts()[0]["customer_id"], 9 * 10 ** 17 + 8)
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestWatcher(unittest.TestCase):
+    """
+    Test watch mode
+    """
+
+    def setUp(self):
+        """
+        Create a statistics instance working on copies of state files
+        @return void
+        """
+        self.directory = tempfile.mkdtemp()
+        self.statistics = Statistics()
+        for name in ("host_file", "instance_file"):
+            copy = os.path.join(self.directory, os.path.basename(getattr(self.statistics, name)))
+            shutil.copy(getattr(self.statistics, name), copy)
+            setattr(self.statistics, name, copy)
+        self.statistics.target_file = os.path.join(self.directory, "Statistics.txt")
+        self.watcher = Watcher(self.statistics, debounce=0.01, poll_interval=0.01)
+
+    def tearDown(self):
+        """
+        Remove temporary directory
+        @return void
+        """
+        shutil.rmtree(self.directory)
+
+    def testUpdate(self):
+        """
+        Check only changed files are parsed again and target file is replaced
+        @return void
+        """
+        self.assertEqual(self.watcher.update(), [self.statistics.host_file, self.statistics.instance_file])
+        with open(self.statistics.target_file) as target:
+            self.assertEqual(target.readline(), "HostClustering: 8, 0.75\n")
+        self.assertEqual(self.watcher.changed(), [])
+
+        with open(self.statistics.instance_file, "a") as instances:
+            instances.write("\n16,8,2")
+        self.assertEqual(self.watcher.update(), [self.statistics.instance_file])
+        with open(self.statistics.target_file) as target:
+            self.assertEqual(target.readline(), "HostClustering: 8, 1.00\n")
+        self.assertEqual(sorted(os.listdir(self.directory)), ["HostState.txt", "InstanceState.txt", "Statistics.txt"])
+
+    def testMalformedUpdate(self):
+        """
+        Check a file which, fails to parse is parsed again by the next update
+        @return void
+        """
+        self.watcher.update()
+        with open(self.statistics.instance_file, "a") as instances:
+            instances.write("\n16,8")
+        self.assertRaises(SyntaxError, self.watcher.update)
+        self.assertEqual(self.watcher.changed(), [self.statistics.instance_file])
+        with open(self.statistics.instance_file, "a") as instances:
+            instances.write(",2")
+        self.assertEqual(self.watcher.update(), [self.statistics.instance_file])
+        self.assertEqual(self.watcher.changed(), [])
+
+    def testRun(self):
+        """
+        Check a change is detected, waited out and written by the watch loop
+        @return void
+        """
+        thread = threading.Thread(target=self.watcher.run, args=(1,))
+        thread.daemon = True
+        thread.start()
+        deadline = time.time() + 10
+        while not self.watcher.latencies and time.time() < deadline:
+            time.sleep(0.01)
+        with open(self.statistics.instance_file, "a") as instances:
+            instances.write("\n16,8,2")
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(self.watcher.latencies), 2)
+        with open(self.statistics.target_file) as target:
+            self.assertEqual(target.readline(), "HostClustering: 8, 1.00\n")
+
+    def testSkippedUpdate(self):
+        """
+        Check the watch loop skips an update whose target file can not be written and keeps running
+        @return void
+        """
+        results = []
+
+        def progress(result):
+            results.append(result)
+            # Invalid output format makes Statistics log an error and exit like an unwritable target file does
+            self.statistics.output_format = "unknown" if len(results) == 1 else "text"
+            with open(self.statistics.instance_file, "a") as instances:
+                instances.write("\n%d,8,2" % (15 + len(results)))
+
+        thread = threading.Thread(target=self.watcher.run, args=(1, progress))
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([result["ok"] for result in results], [True, False, True])
+        self.assertEqual(results[1]["changed"], [self.statistics.instance_file])
+        with open(self.statistics.target_file) as target:
+            self.assertEqual(target.readline(), "HostClustering: 8, 1.25\n")
+
+
+class TestQueryServer(unittest.TestCase):
+    """
+    Test query server
+    """
+
+    def setUp(self):
+        """
+        Start a query server on a free port
+        @return void
+        """
+        self.server = QueryServer(Statistics(), ("127.0.0.1", 0))
+        self.server.start()
+
+    def tearDown(self):
+        """
+        Stop query server
+        @return void
+        """
+        self.server.stop()
+
+    def query(self, path, data=None):
+        """
+        Send a query to the server
+        @param path
+        @param data body of the request, it is sent by POST if it is given
+        @return decoded result
+        """
+        return json.load(urllib2.urlopen("http://%s:%d%s" % (self.server.server_address + (path,)), data))
+
+    def testQueries(self):
+        """
+        Check queries are answered like Statistics.txt and per data center and customer
+        @return void
+        """
+        self.assertEqual(self.query("/statistics")[0], "HostClustering: 8, 0.75")
+        self.assertEqual(self.query("/host"), {"customer_id": 8, "fraction": 0.75})
+        self.assertEqual(self.query("/available_hosts"), [2, 5, 3, 10, 6])
+        self.assertEqual(self.query("/centers/2")["available_hosts"], [10, 6])
+        self.assertEqual(self.query("/customers/8"), {"instances": 5, "hosts": {"2": 3, "7": 1, "6": 1},
+                                                      "centers": {"0": 4, "2": 1}})
+        self.assertEqual(self.query("/reload", "")["hosts"], 8)
+        for path in ("/customers/99", "/customers/eight", "/centers", "/unknown"):
+            with self.assertRaises(urllib2.HTTPError) as context:
+                self.query(path)
+            self.assertEqual(context.exception.code, 404)
+
+    def testMethods(self):
+        """
+        Check /reload is only answered to POST and queries are only answered to GET
+        @return void
+        """
+        for path, data in (("/reload", None), ("/statistics", "")):
+            with self.assertRaises(urllib2.HTTPError) as context:
+                self.query(path, data)
+            self.assertEqual(context.exception.code, 405)
+            self.assertEqual(context.exception.headers["Allow"], "POST" if data is None else "GET")
+        self.assertEqual(self.query("/reload", "ignored body")["instances"], 15)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def testNumpyEngine(self):
+        """
+        Check results of numpy engine are encoded as JSON
+        @return void
+        """
+        self.server.statistics.engine = "numpy"
+        self.server.reload()
+        self.assertEqual(self.query("/available_hosts"), [2, 5, 3, 10, 6])
+
+    def testMalformedReload(self):
+        """
+        Check previous model is kept and malformed files are not loaded again until they change
+        @return void
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            statistics = self.server.statistics
+            shutil.copy(statistics.instance_file, directory)
+            statistics.instance_file = os.path.join(directory, os.path.basename(statistics.instance_file))
+            self.server.reload()
+            with open(statistics.instance_file, "ab") as h_file:
+                h_file.write("\n1,8\n")
+            self.assertTrue("error" in self.query("/reload", ""))
+            self.assertEqual(self.server.signatures, self.server.signature())
+            self.assertEqual(self.query("/host"), {"customer_id": 8, "fraction": 0.75})
+        finally:
+            shutil.rmtree(directory)
+
 
 def run():
-    suite = unittest.TestLoader().loadTestsFromTestCase(TestStatistics)
+    suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
     unittest.TextTestRunner(verbosity=2).run(suite)
 
 if __name__ == "__main__":
-    suite = unittest.TestLoader().loadTestsFromTestCase(TestStatistics)
+    suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
     unittest.TextTestRunner(verbosity=2).run(suite)
\ No newline at end of file